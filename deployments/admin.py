@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Deployment, DeploymentContainerEnvVar
+from .models import Deployment, DeploymentContainerEnvVar, DeploymentJob, CachedImage, DockerNode, BackupChunk, BackupPolicy, BackupUpload
 # Register your models here.
 admin.site.register(Deployment)
-admin.site.register(DeploymentContainerEnvVar)
\ No newline at end of file
+admin.site.register(DeploymentContainerEnvVar)
+admin.site.register(DeploymentJob)
+admin.site.register(CachedImage)
+admin.site.register(DockerNode)
+admin.site.register(BackupChunk)
+admin.site.register(BackupPolicy)
+admin.site.register(BackupUpload)
\ No newline at end of file
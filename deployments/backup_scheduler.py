@@ -0,0 +1,181 @@
+# deployments/backup_scheduler.py
+"""
+جدولة النسخ الاحتياطية حسب BackupPolicy وتنفيذها في عمّال طابور النشر.
+
+- كل policy لها إزاحة ثابتة (phase) داخل فترتها + jitter عشوائي صغير،
+  فلا تبدأ نسخ جميع الـ Deployments عند رأس الساعة في نفس اللحظة.
+- الأمر `python manage.py run_backup_scheduler` يضيف مهام "backup" للطابور عند حلول موعدها.
+- قبل البدء يحجز العامل slot: حد عام (BACKUP_MAX_CONCURRENT) وحد لكل Docker host
+  (BACKUP_MAX_PER_HOST) ونسخة واحدة فقط لكل Deployment، وإلا تُعاد المهمة لاحقاً.
+- بعد كل نسخة ناجحة تُحذف النسخ المنتهية حسب الاحتفاظ GFS (صفوف وملفات).
+"""
+import hashlib
+import logging
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BackupPolicy, DeploymentBackup
+
+logger = logging.getLogger(__name__)
+
+BACKUP_MAX_CONCURRENT = getattr(settings, "BACKUP_MAX_CONCURRENT", 2)
+BACKUP_MAX_PER_HOST = getattr(settings, "BACKUP_MAX_PER_HOST", 1)
+BACKUP_SCHEDULE_JITTER = getattr(settings, "BACKUP_SCHEDULE_JITTER", 300)  # ثواني، بحد أقصى 10% من الفترة
+BACKUP_SLOT_RETRY_DELAY = getattr(settings, "BACKUP_SLOT_RETRY_DELAY", 60)  # ثواني قبل إعادة محاولة الحجز
+BACKUP_STALE_TIMEOUT = getattr(settings, "BACKUP_STALE_TIMEOUT", 6 * 3600)  # نسخة pending / running أقدم من هذا تُعتبر متروكة
+BACKUP_FAILED_RETENTION = 7 * 24 * 3600  # ثواني: النسخ الفاشلة المجدولة تُحذف بعدها
+
+BACKUP_FREQUENCIES = {
+    "hourly": 3600,
+    "daily": 24 * 3600,
+    "weekly": 7 * 24 * 3600,
+}
+
+# حقل الاحتفاظ -> مفتاح الفترة (ساعة / يوم / أسبوع ISO / شهر)
+RETENTION_BUCKETS = {
+    "keep_hourly": lambda t: (t.year, t.month, t.day, t.hour),
+    "keep_daily": lambda t: (t.year, t.month, t.day),
+    "keep_weekly": lambda t: t.isocalendar()[:2],
+    "keep_monthly": lambda t: (t.year, t.month),
+}
+
+
+# ---------------- Schedule ----------------
+def get_policy_phase(policy, interval):
+    """إزاحة ثابتة لكل policy داخل الفترة (تتوزع النسخ على الفترة كاملة)"""
+    digest = hashlib.sha1(f"backup-policy-{policy.id}".encode()).hexdigest()
+    return int(digest, 16) % interval
+
+
+def get_next_run(policy, after=None):
+    """الموعد التالي بعد after: حدود الفترة + phase الخاصة بالـ policy + jitter"""
+    after = after or timezone.now()
+    interval = BACKUP_FREQUENCIES[policy.frequency]
+    phase = get_policy_phase(policy, interval)
+    ts = after.timestamp()
+    next_ts = (ts - phase) // interval * interval + phase + interval
+    next_ts += random.uniform(0, min(BACKUP_SCHEDULE_JITTER, interval / 10))
+    return datetime.fromtimestamp(next_ts, tz=dt_timezone.utc)
+
+
+def get_stale_backups_filter(now):
+    """نسخ pending / running أقدم من BACKUP_STALE_TIMEOUT (مهمة توقفت قبل الحجز أو عامل مات أثناء النسخ)"""
+    deadline = now - timedelta(seconds=BACKUP_STALE_TIMEOUT)
+    return Q(status="pending", created_at__lt=deadline) | Q(
+        Q(started_at__lt=deadline) | Q(started_at__isnull=True, created_at__lt=deadline), status="running",
+    )
+
+
+def fail_stale_backups(backups, now):
+    """تعليم النسخ المتروكة في backups كـ failed حتى لا تمنع الجدولة للأبد، ترجع عددها"""
+    count = backups.filter(get_stale_backups_filter(now)).update(
+        status="failed", finished_at=now, error_message="Backup did not finish within BACKUP_STALE_TIMEOUT",
+    )
+    if count:
+        logger.warning(f"{count} stale backups marked as failed")
+    return count
+
+
+def schedule_due_backups(now=None):
+    """
+    إضافة مهمة backup لكل policy حان موعدها، ترجع عدد النسخ المضافة.
+    policy لم تنتهِ نسختها السابقة بعد تتخطى هذه الدورة بدل تكديس النسخ،
+    إلا إذا كانت النسخة السابقة متروكة (أقدم من BACKUP_STALE_TIMEOUT) فتُعلم failed.
+    """
+    from .jobs import enqueue_backup
+
+    now = now or timezone.now()
+    scheduled = 0
+    with transaction.atomic():
+        policies = (
+            BackupPolicy.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(Q(next_run_at__lte=now) | Q(next_run_at__isnull=True), is_active=True, deployment__is_active=True)
+            .select_related("deployment")
+        )
+        for policy in policies:
+            if policy.next_run_at is not None:
+                fail_stale_backups(policy.backups.all(), now)
+                busy = policy.backups.filter(status__in=["pending", "running"]).exists()
+                if busy:
+                    logger.warning(f"Backup policy {policy.id} skipped: previous backup still in progress")
+                else:
+                    enqueue_backup(policy.deployment, policy.backup_type, policy=policy)
+                    policy.last_run_at = now
+                    scheduled += 1
+            policy.next_run_at = get_next_run(policy, now)
+            policy.save(update_fields=["next_run_at", "last_run_at"])
+    return scheduled
+
+
+# ---------------- Concurrency ----------------
+def acquire_backup_slot(backup):
+    """
+    حجز slot للنسخة (status -> running) إذا سمحت الحدود، ترجع True عند النجاح.
+    قفل النسخ pending / running يجعل عمليات الحجز المتزامنة تتم واحدة تلو الأخرى.
+    """
+    with transaction.atomic():
+        list(
+            DeploymentBackup.objects.select_for_update()
+            .filter(status__in=["pending", "running"])
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        deadline = timezone.now() - timedelta(seconds=BACKUP_STALE_TIMEOUT)
+        running = DeploymentBackup.objects.filter(status="running", started_at__gte=deadline).exclude(id=backup.id)
+
+        if running.filter(deployment_id=backup.deployment_id).exists():
+            return False
+        if running.count() >= BACKUP_MAX_CONCURRENT:
+            return False
+        if running.filter(deployment__node_id=backup.deployment.node_id).count() >= BACKUP_MAX_PER_HOST:
+            return False
+
+        backup.status = "running"
+        backup.started_at = timezone.now()
+        backup.save(update_fields=["status", "started_at"])
+    return True
+
+
+# ---------------- Retention ----------------
+def select_backups_to_keep(backups, policy):
+    """ids النسخ المحتفظ بها من backups (مكتملة ومرتبة من الأحدث)"""
+    keep = {backup.id for backup in backups[:policy.keep_last]}
+    for field, bucket in RETENTION_BUCKETS.items():
+        limit = getattr(policy, field)
+        seen = set()
+        for backup in backups:
+            if len(seen) >= limit:
+                break
+            key = bucket(timezone.localtime(backup.created_at))
+            if key not in seen:
+                seen.add(key)
+                keep.add(backup.id)
+    return keep
+
+
+def prune_backups(policy):
+    """حذف نسخ الـ policy المنتهية (الملفات ثم الصفوف)، ترجع عدد المحذوف"""
+    completed = list(policy.backups.filter(status="completed").order_by("-created_at"))
+    keep = select_backups_to_keep(completed, policy)
+    if not keep:
+        return 0  # لا نحذف كل النسخ أبداً
+
+    expired = [backup for backup in completed if backup.id not in keep]
+    failed_deadline = timezone.now() - timedelta(seconds=BACKUP_FAILED_RETENTION)
+    expired += list(policy.backups.filter(status="failed", created_at__lt=failed_deadline))
+
+    for backup in expired:
+        try:
+            backup.remove_files()
+        except Exception as e:
+            logger.warning(f"Could not remove files of expired backup {backup.id}: {e}")
+            continue
+        backup.delete()
+    if expired:
+        logger.info(f"{len(expired)} expired backups of policy {policy.id} pruned, {len(keep)} kept")
+    return len(expired)
@@ -0,0 +1,381 @@
+# deployments/backup_store.py
+"""
+مستودع نسخ احتياطية content-addressed مع إزالة التكرار على مستوى الـ chunk.
+
+- الملفات تُقسم بـ content-defined chunking (hash على نافذة متحركة يُحسب للـ buffer كاملاً)،
+  فتعديل جزء من ملف كبير لا يغير إلا الـ chunks المحيطة بالتعديل.
+- كل chunk يُخزن مرة واحدة باسم sha256 الخاص به: chunks/ab/abcdef...
+- كل snapshot له manifest JSON: المسارات، الصلاحيات، المالك (uid / gid)، mtime وقائمة الـ chunks لكل ملف.
+- snapshot جديد يقارن size / mtime مع الـ snapshot السابق: الملفات التي لم تتغير لا تُقرأ.
+- BackupChunk.refcount = عدد الـ snapshots التي تستخدم الـ chunk، و collect_garbage يحذف ما وصل إلى 0.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import stat
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BackupChunk
+
+logger = logging.getLogger(__name__)
+
+BACKUP_STORE_DIR = getattr(settings, "BACKUP_STORE_DIR", "/var/lib/containers/backups/store")
+BACKUP_CHUNK_MIN = getattr(settings, "BACKUP_CHUNK_MIN", 256 * 1024)
+BACKUP_CHUNK_AVG = getattr(settings, "BACKUP_CHUNK_AVG", 1024 * 1024)
+BACKUP_CHUNK_MAX = getattr(settings, "BACKUP_CHUNK_MAX", 4 * 1024 * 1024)
+BACKUP_STORE_COMPRESSION_LEVEL = getattr(settings, "BACKUP_STORE_COMPRESSION_LEVEL", 1)  # zlib، 0 => بدون ضغط
+BACKUP_STORE_ORPHAN_AGE = 24 * 3600  # ثواني: chunk على القرص بدون صف في القاعدة (عملية توقفت قبل التسجيل)
+DB_BATCH_SIZE = 500
+
+CHUNK_READ_SIZE = 16 * 1024 * 1024
+CHUNK_WINDOW = 64
+# hash لكل موضع على نافذة 4 بايت (tabulation hashing): لكل إزاحة جدول translate، والنتائج تُدمج
+# بـ XOR على أعداد صحيحة كبيرة، فيتم الحساب للـ buffer كاملاً بسرعة C بدل حلقة Python لكل بايت.
+# تغيير هذه الثوابت يغير حدود الـ chunks ويلغي إزالة التكرار مع النسخ السابقة.
+WINDOW_TABLES = [bytes(hashlib.sha256(bytes([k, i])).digest()[0] for i in range(256)) for k in range(4)]
+ANCHOR = b"\x00\x00"  # موضعان متتاليان بـ hash صفر (~ 1/65536 لبيانات عشوائية)
+# عند كل anchor يُحسب crc32 لآخر CHUNK_WINDOW بايت لإكمال المتوسط إلى BACKUP_CHUNK_AVG
+CRC_MASK = (1 << max(0, ((BACKUP_CHUNK_AVG - BACKUP_CHUNK_MIN) // 65536).bit_length() - 1)) - 1
+
+RAW, ZLIB = b"r", b"z"  # أول بايت في ملف الـ chunk
+
+
+# ---------------- Chunking ----------------
+def window_hashes(data):
+    """بايت hash لكل موضع i يعتمد على data[i-3:i+1] فقط (المحتوى المحلي)"""
+    acc = 0
+    for shift, table in enumerate(WINDOW_TABLES):
+        acc ^= int.from_bytes(data.translate(table), "big") >> (8 * shift)
+    return acc.to_bytes(len(data), "big")
+
+
+def iter_chunks(f):
+    """
+    content-defined chunking: القطع عند أول anchor بعد BACKUP_CHUNK_MIN يحقق crc32 & CRC_MASK == 0،
+    أو عند BACKUP_CHUNK_MAX. الحدود تعتمد على المحتوى فقط، فإدراج بايتات يغير الـ chunks المحيطة فقط.
+    """
+    buf, hashes, start, eof = b"", b"", 0, False
+    while True:
+        if not eof and len(buf) - start < BACKUP_CHUNK_MAX:
+            data = f.read(CHUNK_READ_SIZE)
+            if data:
+                buf = buf[start:] + data
+                start = 0
+                hashes = window_hashes(buf)
+                continue
+            eof = True
+        if start >= len(buf):
+            return
+
+        limit = min(start + BACKUP_CHUNK_MAX, len(buf))
+        cut = limit
+        pos = hashes.find(ANCHOR, start + BACKUP_CHUNK_MIN - len(ANCHOR), limit)
+        while pos != -1:
+            end = pos + len(ANCHOR)
+            if not zlib.crc32(buf[end - CHUNK_WINDOW:end]) & CRC_MASK:
+                cut = end
+                break
+            pos = hashes.find(ANCHOR, pos + 1, limit)
+
+        yield buf[start:cut]
+        start = cut
+
+
+# ---------------- Store ----------------
+class ChunkStore:
+    def __init__(self, root=BACKUP_STORE_DIR):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def manifest_path(self, snapshot_id):
+        return os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+
+    @contextmanager
+    def lock(self, exclusive=False):
+        """snapshots تأخذ قفلاً مشتركاً و gc قفلاً حصرياً: لا يُحذف chunk أثناء إعادة استخدامه"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def put(self, data):
+        """ترجع (digest, stored_size, is_new)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, os.path.getsize(path), False
+
+        payload = RAW + data
+        if BACKUP_STORE_COMPRESSION_LEVEL:
+            compressed = zlib.compress(data, BACKUP_STORE_COMPRESSION_LEVEL)
+            if len(compressed) < len(data):
+                payload = ZLIB + compressed
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return digest, len(payload), True
+
+    def get(self, digest):
+        with open(self.chunk_path(digest), "rb") as f:
+            payload = f.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == ZLIB else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Backup chunk {digest} is corrupted")
+        return data
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        path = self.manifest_path(manifest["id"])
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+        return path
+
+    def read_manifest(self, snapshot_id):
+        with open(self.manifest_path(snapshot_id)) as f:
+            return json.load(f)
+
+
+# ---------------- Snapshots ----------------
+def _file_entry(rel, st):
+    return {"path": rel, "mode": stat.S_IMODE(st.st_mode), "uid": st.st_uid, "gid": st.st_gid, "mtime_ns": st.st_mtime_ns}
+
+
+def _restore_owner(path, entry):
+    """إعادة uid / gid الأصليين (الحاويات غالباً لا تعمل كـ root)، manifests الإصدار 1 لا تحتويهما"""
+    if "uid" not in entry:
+        return
+    try:
+        os.lchown(path, entry["uid"], entry["gid"])
+    except PermissionError:
+        logger.warning(f"Could not restore owner of {path} ({entry['uid']}:{entry['gid']})")
+
+
+def create_snapshot(source_dir, parent_id=None, store=None):
+    """
+    snapshot لمحتوى source_dir. الملفات بنفس size و mtime في الـ snapshot الأب
+    تأخذ قائمة الـ chunks منه بدون قراءة.
+    ترجع manifest مع "stats": files, reused_files, read_bytes, total_bytes, new_chunks, new_bytes, duration
+    """
+    store = store or ChunkStore()
+    started = time.monotonic()
+    previous, chunk_sizes = {}, {}
+    if parent_id:
+        try:
+            parent = store.read_manifest(parent_id)
+            previous = {e["path"]: e for e in parent["entries"] if e["type"] == "file"}
+            chunk_sizes.update(parent["chunks"])
+        except FileNotFoundError:
+            logger.warning(f"Parent snapshot {parent_id} not found, creating a full snapshot")
+
+    stats = {"files": 0, "reused_files": 0, "read_bytes": 0, "total_bytes": 0, "new_chunks": 0, "new_bytes": 0}
+    entries, used = [], {}
+
+    with store.lock():
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            rel_root = os.path.relpath(root, source_dir)
+            if rel_root != ".":
+                entries.append({**_file_entry(rel_root, os.lstat(root)), "type": "dir"})
+
+            for name in sorted(files + [d for d in dirs if os.path.islink(os.path.join(root, d))]):
+                full_path = os.path.join(root, name)
+                rel = os.path.normpath(os.path.join(rel_root, name))
+                st = os.lstat(full_path)
+
+                if stat.S_ISLNK(st.st_mode):
+                    entries.append({**_file_entry(rel, st), "type": "symlink", "target": os.readlink(full_path)})
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue  # sockets / fifos
+
+                stats["files"] += 1
+                stats["total_bytes"] += st.st_size
+                prev = previous.get(rel)
+                if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+                    digests = prev["chunks"]
+                    stats["reused_files"] += 1
+                else:
+                    digests = []
+                    with open(full_path, "rb") as f:
+                        for data in iter_chunks(f):
+                            digest, stored_size, is_new = store.put(data)
+                            digests.append(digest)
+                            chunk_sizes[digest] = [len(data), stored_size]
+                            stats["read_bytes"] += len(data)
+                            if is_new:
+                                stats["new_chunks"] += 1
+                                stats["new_bytes"] += stored_size
+
+                for digest in digests:
+                    used[digest] = chunk_sizes[digest]
+                entries.append({**_file_entry(rel, st), "type": "file", "size": st.st_size, "chunks": digests})
+
+        stats["duration"] = round(time.monotonic() - started, 3)
+        manifest = {
+            "version": 2,
+            "id": uuid.uuid4().hex,
+            "parent": parent_id,
+            "created_at": timezone.now().isoformat(),
+            "entries": entries,
+            "chunks": used,
+            "stats": stats,
+        }
+        store.write_manifest(manifest)
+        register_chunks(manifest["chunks"])
+
+    logger.info(
+        f"Snapshot {manifest['id']}: {stats['files']} files ({stats['reused_files']} unchanged), "
+        f"{stats['new_chunks']} new chunks ({stats['new_bytes']} bytes) in {stats['duration']}s"
+    )
+    return manifest
+
+
+def _batches(items):
+    items = list(items)
+    for i in range(0, len(items), DB_BATCH_SIZE):
+        yield items[i:i + DB_BATCH_SIZE]
+
+
+def register_chunks(chunks):
+    """refcount + 1 لكل chunk يستخدمه الـ snapshot (مرة واحدة لكل snapshot)"""
+    with transaction.atomic():
+        for batch in _batches(chunks):
+            BackupChunk.objects.bulk_create(
+                [BackupChunk(digest=d, size=chunks[d][0], stored_size=chunks[d][1], refcount=0) for d in batch],
+                ignore_conflicts=True,
+            )
+            BackupChunk.objects.filter(digest__in=batch).update(refcount=F("refcount") + 1)
+
+
+def release_snapshot(snapshot_id, store=None):
+    """حذف manifest الـ snapshot وإنقاص refcount لـ chunks الخاصة به (الحذف الفعلي في collect_garbage)"""
+    store = store or ChunkStore()
+    try:
+        manifest = store.read_manifest(snapshot_id)
+    except FileNotFoundError:
+        logger.warning(f"Snapshot {snapshot_id} manifest not found")
+        return False
+
+    with transaction.atomic():
+        for batch in _batches(manifest["chunks"]):
+            BackupChunk.objects.filter(digest__in=batch).update(refcount=F("refcount") - 1)
+    os.remove(store.manifest_path(snapshot_id))
+    logger.info(f"Snapshot {snapshot_id} released")
+    return True
+
+
+def restore_snapshot(snapshot_id, dest_dir, store=None):
+    """
+    إعادة محتوى الـ snapshot إلى dest_dir (الملفات الأخرى في dest_dir تبقى كما هي).
+    dest_dir يكتب فيه المستأجر: أي symlink موجود مكان مجلد أو ملف يُستبدل ولا يُتبع أبداً.
+    """
+    store = store or ChunkStore()
+    manifest = store.read_manifest(snapshot_id)
+    os.makedirs(dest_dir, exist_ok=True)
+    dest_dir = os.path.realpath(dest_dir)
+
+    def inside(path):
+        return os.path.commonpath([dest_dir, path]) == dest_dir
+
+    def target(rel):
+        path = os.path.abspath(os.path.join(dest_dir, rel))
+        # المجلد الأب بعد حل الـ symlinks يجب أن يبقى داخل dest_dir (الحاوية قد تبدل مجلداً بـ symlink إلى /etc)
+        if path == dest_dir or not inside(path) or not inside(os.path.realpath(os.path.dirname(path))):
+            raise ValueError(f"Unsafe path in snapshot {snapshot_id}: {rel}")
+        return path
+
+    dirs = []
+    for entry in manifest["entries"]:
+        path = target(entry["path"])
+        if entry["type"] == "dir":
+            # المجلدات تسبق محتواها في الـ manifest، فاستبدال الـ symlink هنا يحمي كل ما تحته
+            if os.path.islink(path) or (os.path.lexists(path) and not os.path.isdir(path)):
+                os.remove(path)
+            os.makedirs(path, exist_ok=True)
+            dirs.append((path, entry))
+            continue
+
+        if os.path.lexists(path) and (entry["type"] == "symlink" or os.path.islink(path)):
+            os.remove(path)
+        if entry["type"] == "symlink":
+            os.symlink(entry["target"], path)
+            _restore_owner(path, entry)
+            continue
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            for digest in entry["chunks"]:
+                f.write(store.get(digest))
+        _restore_owner(path, entry)  # قبل chmod: chown يلغي setuid / setgid
+        os.chmod(path, entry["mode"])
+        os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    # المالك والصلاحيات و mtime المجلدات بعد كتابة محتواها
+    for path, entry in reversed(dirs):
+        if os.path.islink(path):
+            raise ValueError(f"Directory {path} was replaced by a symlink during restore")
+        _restore_owner(path, entry)
+        os.chmod(path, entry["mode"])
+        os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    logger.info(f"Snapshot {snapshot_id} restored to {dest_dir}")
+    return manifest
+
+
+# ---------------- Garbage collection ----------------
+def collect_garbage(store=None, dry_run=False):
+    """
+    حذف الـ chunks غير المستخدمة (refcount <= 0) والملفات اليتيمة على القرص.
+    ترجع {"chunks": عدد المحذوف، "bytes": المساحة المحررة}
+    """
+    store = store or ChunkStore()
+    result = {"chunks": 0, "bytes": 0}
+
+    with store.lock(exclusive=True):
+        unused = BackupChunk.objects.filter(refcount__lte=0)
+        for chunk in unused.iterator():
+            path = store.chunk_path(chunk.digest)
+            result["chunks"] += 1
+            result["bytes"] += chunk.stored_size
+            if not dry_run and os.path.exists(path):
+                os.remove(path)
+        if not dry_run:
+            unused.delete()
+
+        # chunks كُتبت ثم توقفت العملية قبل register_chunks، وملفات .tmp
+        known_cutoff = time.time() - BACKUP_STORE_ORPHAN_AGE
+        for root, _, files in os.walk(store.chunks_dir):
+            names = [n for n in files if not n.endswith(".tmp")]
+            known = set(BackupChunk.objects.filter(digest__in=names).values_list("digest", flat=True)) if names else set()
+            for name in files:
+                path = os.path.join(root, name)
+                if name in known or os.path.getmtime(path) > known_cutoff:
+                    continue
+                result["chunks"] += 1
+                result["bytes"] += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+
+    logger.info(f"Backup store GC: {result['chunks']} chunks, {result['bytes']} bytes {'found' if dry_run else 'removed'}")
+    return result
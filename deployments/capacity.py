@@ -0,0 +1,187 @@
+# deployments/capacity.py
+"""
+سجل السعة (capacity ledger) لكل Docker host والتحكم في قبول Deployments جديدة.
+الـ hosts هي الـ daemon المحلي (DEFAULT_HOST) وكل DockerNode مسجل.
+
+لكل مورد (cpu بالأنوية، ram و storage بالـ MB):
+- capacity:    سعة الـ host الفعلية (CAPACITY_HOSTS، حقول DockerNode أو docker info / مساحة القرص)
+- allocatable: capacity * نسبة الـ overcommit المسموحة
+- reserved:    مجموع موارد خطط الـ Deployments المقبولة (admitted_at) والنشطة على الـ host
+- used:        الاستهلاك المقاس فعلياً (آخر DeploymentUsageSnapshot)
+
+Deployment جديد يُقبل فقط إذا كان reserved + الخطة <= allocatable
+و used + الخطة <= capacity، وإلا ينتظر في الطابور أو يُرفض (CAPACITY_ADMISSION).
+"""
+import logging
+import shutil
+import time
+
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from .docker_client import get_docker_client
+from .fleet import DEFAULT_HOST, get_deployment_host
+from .models import Deployment, DockerNode
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ["cpu", "ram", "storage"]
+
+# {"local": {"cpu": 16, "ram": 65536, "storage": 1024000}} لتجاوز الاكتشاف التلقائي
+CAPACITY_HOSTS = getattr(settings, "CAPACITY_HOSTS", {})
+CAPACITY_OVERCOMMIT = getattr(settings, "CAPACITY_OVERCOMMIT", {"cpu": 4.0, "ram": 1.5, "storage": 1.0})
+CAPACITY_ADMISSION = getattr(settings, "CAPACITY_ADMISSION", "queue")  # queue | reject | off
+CAPACITY_QUEUE_DELAY = getattr(settings, "CAPACITY_QUEUE_DELAY", 120)  # ثواني بين محاولات القبول
+CAPACITY_QUEUE_TIMEOUT = getattr(settings, "CAPACITY_QUEUE_TIMEOUT", 24 * 3600)  # بعدها يُرفض الـ Deployment
+CAPACITY_DATA_DIR = getattr(settings, "CAPACITY_DATA_DIR", "/var/lib/containers")
+CAPACITY_CACHE_TTL = 300  # ثواني
+
+_capacity_cache = {}  # host -> (expires_at, capacity)
+
+
+# ---------------- السعة ----------------
+def get_host_node(host):
+    """DockerNode للـ host، أو None للـ daemon المحلي"""
+    if host == DEFAULT_HOST:
+        return None
+    return DockerNode.objects.filter(name=host).first()
+
+
+def detect_host_capacity(host):
+    """سعة الـ host من حقول DockerNode، وما لم يُحدد منها من docker info ومساحة القرص"""
+    node = get_host_node(host)
+    capacity = node.get_capacity() if node is not None else {"cpu": None, "ram": None, "storage": None}
+
+    if capacity["cpu"] is None or capacity["ram"] is None:
+        info = get_docker_client(node).info()
+        if capacity["cpu"] is None:
+            capacity["cpu"] = float(info.get("NCPU", 1))
+        if capacity["ram"] is None:
+            capacity["ram"] = int(info.get("MemTotal", 0)) // (1024 * 1024)
+
+    if capacity["storage"] is None:
+        if node is not None:
+            # مساحة قرص node بعيد لا تظهر عبر Docker API
+            logger.warning(f"Storage capacity of node {host} is not set, no storage can be reserved on it")
+            capacity["storage"] = 0
+        else:
+            try:
+                capacity["storage"] = shutil.disk_usage(CAPACITY_DATA_DIR).total // (1024 * 1024)
+            except OSError:
+                capacity["storage"] = shutil.disk_usage("/").total // (1024 * 1024)
+    return capacity
+
+
+def get_host_capacity(host):
+    if host in CAPACITY_HOSTS:
+        return dict(CAPACITY_HOSTS[host])
+    cached = _capacity_cache.get(host)
+    if cached and cached[0] > time.monotonic():
+        return dict(cached[1])
+    capacity = detect_host_capacity(host)
+    _capacity_cache[host] = (time.monotonic() + CAPACITY_CACHE_TTL, capacity)
+    return dict(capacity)
+
+
+def get_hosts():
+    """الـ daemon المحلي، الـ nodes النشطة وأي node ما زالت عليه Deployments"""
+    nodes = DockerNode.objects.filter(Q(is_active=True) | Q(deployments__is_active=True)).values_list("name", flat=True)
+    return sorted(set(CAPACITY_HOSTS) | {DEFAULT_HOST} | set(nodes))
+
+
+def get_host_deployments(host):
+    """Deployments الموضوعة على الـ host"""
+    if host == DEFAULT_HOST:
+        return Deployment.objects.filter(is_active=True, node__isnull=True)
+    return Deployment.objects.filter(is_active=True, node__name=host)
+
+
+def get_admitted_deployments(host, exclude=None):
+    """
+    Deployments التي تحجز موارد: كل Deployment نشط قُبل، مهما كانت نتيجة آخر أمر
+    (restart فاشل يضع progress=5 والحاويات والـ volume ما زالت موجودة)،
+    والتي يعمل deploy job الخاص بها الآن (قبول متزامن على نفس الـ host).
+    المنتظرة في الطابور لا تحجز شيئاً بعد.
+    """
+    qs = get_host_deployments(host).filter(
+        Q(admitted_at__isnull=False) | Q(jobs__action="deploy", jobs__status="running")
+    )
+    if exclude is not None:
+        qs = qs.exclude(id=exclude.id)
+    return Deployment.objects.filter(id__in=qs.values("id"))
+
+
+# ---------------- Ledger ----------------
+def get_reserved(host, exclude=None):
+    from plans.models import Subscription
+    totals = Subscription.objects.filter(
+        is_active=True, deployment__in=get_admitted_deployments(host, exclude)
+    ).aggregate(cpu=Sum("plan__cpu"), ram=Sum("plan__ram"), storage=Sum("plan__storage"))
+    return {
+        "cpu": float(totals["cpu"] or 0),
+        "ram": int(totals["ram"] or 0),
+        "storage": int(totals["storage"] or 0),
+        "count": get_admitted_deployments(host, exclude).count(),
+    }
+
+
+def get_measured_usage(host):
+    """الاستهلاك الفعلي من آخر snapshot لكل Deployment (cpu بالأنوية، ram / storage بالـ MB)"""
+    from monitoring.models import DeploymentUsageSnapshot
+    from plans.models import Subscription
+
+    deployments = get_host_deployments(host)
+    plans = {
+        sub.deployment_id: sub.plan
+        for sub in Subscription.objects.filter(deployment__in=deployments).select_related("plan")
+    }
+    used = {"cpu": 0.0, "ram": 0.0, "storage": 0.0}
+    for snapshot in DeploymentUsageSnapshot.objects.filter(deployment__in=deployments):
+        data = snapshot.data or {}
+        plan = plans.get(snapshot.deployment_id)
+        used["ram"] += (data.get("RAM") or {}).get("used", 0)
+        used["storage"] += (data.get("Storage") or {}).get("used", 0)
+        if plan:
+            used["cpu"] += (data.get("CPU") or {}).get("used", 0) / 100 * float(plan.cpu)
+    return {key: round(value, 2) for key, value in used.items()}
+
+
+def get_ledger(host, exclude=None):
+    """
+    {"host", "deployments", "cpu": {...}, "ram": {...}, "storage": {...}}
+    كل مورد: capacity, overcommit, allocatable, reserved, used, free
+    """
+    capacity = get_host_capacity(host)
+    reserved = get_reserved(host, exclude)
+    used = get_measured_usage(host)
+
+    ledger = {"host": host, "deployments": reserved["count"]}
+    for resource in RESOURCES:
+        ratio = float(CAPACITY_OVERCOMMIT.get(resource, 1.0))
+        allocatable = capacity[resource] * ratio
+        ledger[resource] = {
+            "capacity": capacity[resource],
+            "overcommit": ratio,
+            "allocatable": round(allocatable, 2),
+            "reserved": reserved[resource],
+            "used": used[resource],
+            "free": round(min(allocatable - reserved[resource], capacity[resource] - used[resource]), 2),
+        }
+    return ledger
+
+
+# ---------------- Admission ----------------
+def check_admission(deployment, plan=None):
+    """ترجع (fits, reason, ledger)"""
+    plan = plan or deployment.plan
+    host = get_deployment_host(deployment)
+    ledger = get_ledger(host, exclude=deployment)
+    need = {"cpu": float(plan.cpu), "ram": int(plan.ram), "storage": int(plan.storage)}
+
+    for resource in RESOURCES:
+        entry = ledger[resource]
+        if entry["reserved"] + need[resource] > entry["allocatable"]:
+            return False, f"{resource} reservations on {host} would exceed {entry['allocatable']}", ledger
+        if entry["used"] + need[resource] > entry["capacity"]:
+            return False, f"measured {resource} usage on {host} leaves no room", ledger
+    return True, None, ledger
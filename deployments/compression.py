@@ -0,0 +1,207 @@
+# deployments/compression.py
+"""
+ضغط النسخ الاحتياطية عبر أدوات خارجية متعددة الأنوية (zstd -T / pigz -p).
+
+المصدر (tar، pg_dump أو docker exec عبر الـ API) يُمرر إلى stdin الضاغط بـ buffer ثابت،
+فلا يتم الضغط داخل عملية الويب ولا يُقرأ الملف كاملاً إلى الذاكرة.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BACKUP_COMPRESSION = getattr(settings, "BACKUP_COMPRESSION", "zstd")  # zstd | pigz | gzip | none
+BACKUP_COMPRESSION_LEVEL = getattr(settings, "BACKUP_COMPRESSION_LEVEL", None)  # None => الافتراضي لكل codec
+BACKUP_COMPRESSION_THREADS = getattr(settings, "BACKUP_COMPRESSION_THREADS", 0)  # 0 => جميع الأنوية
+PIPE_CHUNK_SIZE = 1024 * 1024
+
+
+class Codec:
+    def __init__(self, name, extension, binary=None, default_level=None):
+        self.name = name
+        self.extension = extension
+        self.binary = binary
+        self.default_level = default_level
+
+    def is_available(self):
+        return self.binary is None or shutil.which(self.binary) is not None
+
+    def compress_cmd(self, level=None, threads=None):
+        if self.binary is None:
+            return None
+        level = level if level is not None else self.default_level
+        threads = threads or BACKUP_COMPRESSION_THREADS
+        if self.name == "zstd":
+            return ["zstd", f"-{level}", f"-T{threads}", "-q", "-c"]
+        if self.name == "pigz":
+            return ["pigz", f"-{level}", "-p", str(threads or os.cpu_count() or 1), "-c"]
+        return [self.binary, f"-{level}", "-c"]
+
+    def decompress_cmd(self):
+        if self.binary is None:
+            return None
+        return [self.binary, "-d", "-c"]
+
+
+CODECS = {
+    "zstd": Codec("zstd", ".zst", "zstd", 3),
+    "pigz": Codec("pigz", ".gz", "pigz", 6),
+    "gzip": Codec("gzip", ".gz", "gzip", 6),
+    "none": Codec("none", ""),
+}
+FALLBACK_ORDER = ["zstd", "pigz", "gzip", "none"]
+
+
+def get_codec(name=None):
+    """الـ codec المطلوب، أو التالي المتوفر على النظام حسب FALLBACK_ORDER"""
+    name = name or BACKUP_COMPRESSION
+    if name not in CODECS:
+        raise ValueError(f"Unknown backup compression '{name}'")
+    for candidate in FALLBACK_ORDER[FALLBACK_ORDER.index(name):]:
+        codec = CODECS[candidate]
+        if codec.is_available():
+            if candidate != name:
+                logger.warning(f"{name} is not installed, compressing backups with {candidate}")
+            return codec
+    return CODECS["none"]
+
+
+def codec_for_path(path):
+    """الـ codec المناسب لفك ضغط ملف حسب امتداده (.gz يُفك بـ pigz إذا كان متوفراً)"""
+    if path.endswith(".zst"):
+        return CODECS["zstd"]
+    if path.endswith(".gz") or path.endswith(".tgz"):
+        return get_codec("pigz")
+    return CODECS["none"]
+
+
+# ---------------- Pipelines ----------------
+def _popen(command, **kwargs):
+    # stderr في ملف مؤقت: pipe ممتلئ لا يقرأه أحد يوقف العملية
+    stderr = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stderr=stderr, **kwargs)
+    process.stderr_file = stderr
+    return process
+
+
+def _check(process, command):
+    process.stderr_file.seek(0)
+    stderr = process.stderr_file.read().decode(errors="ignore").strip()
+    process.stderr_file.close()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+def _close(stream):
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def copy_stream(src, dst):
+    """نسخ src إلى dst بـ buffer ثابت (PIPE_CHUNK_SIZE)، ترجع عدد البايتات"""
+    total = 0
+    while True:
+        chunk = src.read(PIPE_CHUNK_SIZE)
+        if not chunk:
+            return total
+        dst.write(chunk)
+        total += len(chunk)
+
+
+class CountingWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.raw_bytes = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.raw_bytes += len(data)
+
+
+@contextmanager
+def compress_writer(dest_path, codec=None, level=None, threads=None):
+    """
+    file-like للكتابة: ما يُكتب فيه يُضغط إلى dest_path عبر الضاغط الخارجي.
+    بعد الخروج: writer.stats = {"codec", "raw_bytes", "size_bytes", "duration"}
+    """
+    codec = codec or get_codec()
+    compress_cmd = codec.compress_cmd(level, threads)
+    started = time.monotonic()
+
+    with open(dest_path, "wb") as out:
+        if compress_cmd is None:
+            writer = CountingWriter(out)
+            yield writer
+        else:
+            compressor = _popen(compress_cmd, stdin=subprocess.PIPE, stdout=out)
+            writer = CountingWriter(compressor.stdin)
+            try:
+                yield writer
+            finally:
+                _close(compressor.stdin)
+                compressor.wait()
+            _check(compressor, compress_cmd)
+
+    writer.stats = {
+        "codec": codec.name,
+        "raw_bytes": writer.raw_bytes,
+        "size_bytes": os.path.getsize(dest_path),
+        "duration": time.monotonic() - started,
+    }
+
+
+@contextmanager
+def decompress_reader(src_path):
+    """file-like للقراءة من src_path بعد فك الضغط (حسب الامتداد)"""
+    decompress_cmd = codec_for_path(src_path).decompress_cmd()
+    with open(src_path, "rb") as f:
+        if decompress_cmd is None:
+            yield f
+            return
+        decompressor = _popen(decompress_cmd, stdin=f, stdout=subprocess.PIPE)
+        try:
+            yield decompressor.stdout
+        finally:
+            _close(decompressor.stdout)
+            decompressor.wait()
+        _check(decompressor, decompress_cmd)
+
+
+def compress_command(command, dest_path, codec=None, level=None, threads=None, env=None):
+    """
+    تشغيل command وضغط stdout إلى dest_path.
+    ترجع {"codec", "raw_bytes", "size_bytes", "duration"}
+    """
+    with compress_writer(dest_path, codec, level, threads) as writer:
+        source = _popen(command, stdout=subprocess.PIPE, env=env)
+        try:
+            copy_stream(source.stdout, writer)
+        finally:
+            source.stdout.close()
+            source.wait()
+        _check(source, command)
+    return writer.stats
+
+
+def decompress_command(src_path, command, env=None):
+    """فك ضغط src_path وتمريره إلى stdin الخاص بـ command، ترجع عدد البايتات"""
+    with decompress_reader(src_path) as reader:
+        target = _popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, env=env)
+        try:
+            total = copy_stream(reader, target.stdin)
+        except BrokenPipeError:
+            total = None  # الأمر توقف مبكراً: الخطأ يظهر في _check
+        finally:
+            _close(target.stdin)
+            target.wait()
+        _check(target, command)
+    return total
@@ -0,0 +1,210 @@
+# deployments/db_backup.py
+"""
+نسخ واستعادة قاعدة بيانات PostgreSQL بشكل متدفق (streaming).
+
+- داخل حاوية الـ Deployment: exec عبر Docker API وقراءة stdout من socket الـ attach
+  مباشرة إلى الضاغط (يعمل أيضاً مع DockerNode بعيد، بدون docker CLI ولا shell على الـ host).
+- قاعدة بيانات خارجية: pg_dump / pg_restore كعملية فرعية مع PGPASSWORD.
+
+الذاكرة ثابتة مهما كان حجم القاعدة: البيانات تمر بـ buffers محدودة فقط.
+
+الصيغ (BACKUP_DB_FORMAT):
+- plain:     SQL نصي، يُستعاد بـ psql (صيغة النسخ القديمة .sql.gz)
+- custom:    pg_dump -Fc، يُستعاد بـ pg_restore من stdin
+- directory: pg_dump -Fd -j N في مجلد مؤقت ثم يُمرر كـ tar، ويُستعاد بـ pg_restore -j N.
+             لقاعدة خارجية فقط: داخل الحاوية يعني نسخة كاملة غير مضغوطة على قرص Docker في الـ host،
+             لذلك تُنسخ قواعد الحاويات بصيغة custom المتدفقة دائماً.
+"""
+import logging
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+
+from django.conf import settings
+from docker.utils.socket import STDERR, STDOUT, frames_iter
+
+from .compression import (
+    PIPE_CHUNK_SIZE, CODECS, codec_for_path, compress_command, compress_writer,
+    decompress_command, decompress_reader,
+)
+from .docker_client import get_deployment_client
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DB_FORMAT = getattr(settings, "BACKUP_DB_FORMAT", "custom")  # plain | custom | directory
+BACKUP_DB_JOBS = getattr(settings, "BACKUP_DB_JOBS", 4)  # jobs لـ pg_dump / pg_restore بصيغة directory
+EXEC_STDERR_LIMIT = 64 * 1024  # آخر ما يُحتفظ به من stderr لرسالة الخطأ
+
+DB_EXTENSIONS = {
+    "plain": ".sql",
+    "custom": ".dump",
+    "directory": ".dir.tar",
+}
+
+# مجلد مؤقت داخل الحاوية لاستعادة أرشيف directory، يُحذف دائماً عند الخروج
+_CONTAINER_TMP = 'set -e; d=$(mktemp -d); trap \'rm -rf "$d"\' EXIT; '
+
+
+def get_db_format(name=None, in_container=False):
+    name = name or BACKUP_DB_FORMAT
+    if name not in DB_EXTENSIONS:
+        logger.warning(f"Unknown database backup format {name}, using custom")
+        return "custom"
+    if name == "directory" and in_container:
+        return "custom"  # بدون نسخة كاملة على قرص الحاوية
+    return name
+
+
+def detect_format(path):
+    """صيغة الـ dump من اسم الملف، النسخ القديمة (.sql.gz) تعتبر plain"""
+    name = os.path.basename(path)
+    for codec in CODECS.values():
+        if codec.extension and name.endswith(codec.extension):
+            name = name[:-len(codec.extension)]
+            break
+    for fmt, extension in DB_EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return "plain"
+
+
+# ---------------- Docker exec ----------------
+def exec_stream(container, cmd, stdin=None, stdout=None, environment=None):
+    """
+    تشغيل cmd داخل الحاوية عبر socket الـ attach:
+    stdin (file-like) يُكتب في thread منفصل، وstdout يُكتب في stdout (file-like) frame بعد frame.
+    ترفع CalledProcessError إذا فشل الأمر.
+    """
+    api = container.client.api
+    exec_id = api.exec_create(
+        container.id, cmd, stdin=stdin is not None, stdout=True, stderr=True, environment=environment,
+    )["Id"]
+    sock = api.exec_start(exec_id, socket=True)
+    raw = getattr(sock, "_sock", sock)
+    raw.settimeout(None)  # pg_restore لا يكتب شيئاً إلى stdout حتى ينتهي
+
+    feed_errors = []
+
+    def feed():
+        try:
+            while True:
+                chunk = stdin.read(PIPE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                raw.sendall(chunk)
+        except OSError as e:
+            feed_errors.append(e)
+        finally:
+            try:
+                raw.shutdown(socket.SHUT_WR)  # EOF على stdin داخل الحاوية
+            except OSError:
+                pass
+
+    feeder = None
+    if stdin is not None:
+        feeder = threading.Thread(target=feed, name="exec-stdin", daemon=True)
+        feeder.start()
+
+    stderr = b""
+    try:
+        for stream, data in frames_iter(sock, tty=False):
+            if stream == STDOUT and stdout is not None:
+                stdout.write(data)
+            elif stream == STDERR:
+                stderr = (stderr + data)[-EXEC_STDERR_LIMIT:]
+    finally:
+        if feeder is not None:
+            feeder.join()
+        sock.close()
+
+    exit_code = api.exec_inspect(exec_id)["ExitCode"]
+    if exit_code != 0 or feed_errors:
+        stderr = stderr.decode(errors="ignore").strip() or str(feed_errors[0] if feed_errors else "")
+        raise subprocess.CalledProcessError(exit_code or 1, cmd, stderr=stderr)
+
+
+# ---------------- Commands ----------------
+def dump_cmd(fmt, db, host=None, port=None):
+    connection = ["-U", db["db_user"]] + (["-h", host, "-p", str(port)] if host else [])
+    if fmt == "plain":
+        return ["pg_dump"] + connection + [db["db_name"]]
+    # -Z0: الضغط يتم خارجياً بـ zstd / pigz متعدد الأنوية
+    return ["pg_dump", "-Fc", "-Z0"] + connection + [db["db_name"]]
+
+
+def restore_cmd(fmt, db, host=None, port=None):
+    connection = ["-U", db["db_user"]] + (["-h", host, "-p", str(port)] if host else [])
+    if fmt == "plain":
+        return ["psql"] + connection + ["-d", db["db_name"]]
+    # stdin غير قابل لـ seek: pg_restore -j يحتاج صيغة directory
+    return ["pg_restore", "--clean", "--if-exists", "--no-owner"] + connection + ["-d", db["db_name"]]
+
+
+def _directory_restore_script(jobs):
+    return (
+        _CONTAINER_TMP + 'mkdir "$d/db"; tar -C "$d/db" -xf -; '
+        f'pg_restore --clean --if-exists --no-owner -j {int(jobs)} -U "$1" -d "$2" "$d/db"'
+    )
+
+
+# ---------------- Dump ----------------
+def dump_database(deployment, db, dest_path, codec, fmt=None, jobs=None):
+    """
+    نسخ قاعدة البيانات إلى dest_path مضغوطة بـ codec.
+    db: ناتج DeploymentBackup._get_db_env، ترجع إحصائيات الضغط.
+    """
+    fmt = get_db_format(fmt, db["in_container"])
+    jobs = jobs or BACKUP_DB_JOBS
+
+    if db["in_container"]:
+        container = get_deployment_client(deployment).containers.get(db["container_name"])
+        cmd = dump_cmd(fmt, db)
+        logger.info(f"Streaming {fmt} dump from {db['container_name']}: {' '.join(cmd)}")
+        with compress_writer(dest_path, codec) as writer:
+            exec_stream(container, cmd, stdout=writer, environment={"PGPASSWORD": db["db_password"] or ""})
+        return writer.stats
+
+    env = dict(os.environ, PGPASSWORD=db["db_password"] or "")
+    if fmt != "directory":
+        cmd = dump_cmd(fmt, db, db["db_host"], db["db_port"])
+        logger.info(f"Streaming {fmt} dump: {' '.join(cmd)}")
+        return compress_command(cmd, dest_path, codec, env=env)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(dest_path)) as tmp_dir:
+        dump_dir = os.path.join(tmp_dir, "db")
+        cmd = ["pg_dump", "-Fd", "-Z0", "-j", str(jobs), "-U", db["db_user"],
+               "-h", db["db_host"], "-p", str(db["db_port"]), "-f", dump_dir, db["db_name"]]
+        logger.info(f"Running parallel dump: {' '.join(cmd)}")
+        subprocess.run(cmd, env=env, check=True, capture_output=True)
+        return compress_command(["tar", "-C", dump_dir, "-cf", "-", "."], dest_path, codec)
+
+
+# ---------------- Restore ----------------
+def restore_database(deployment, db, src_path, jobs=None):
+    """استعادة dump (أي صيغة، مضغوط أو لا) إلى قاعدة البيانات بشكل متدفق"""
+    fmt = detect_format(src_path)
+    jobs = jobs or BACKUP_DB_JOBS
+    logger.info(f"Restoring {fmt} dump {src_path} ({codec_for_path(src_path).name})")
+
+    if db["in_container"]:
+        container = get_deployment_client(deployment).containers.get(db["container_name"])
+        if fmt == "directory":
+            cmd = ["sh", "-c", _directory_restore_script(jobs), "sh", db["db_user"], db["db_name"]]
+        else:
+            cmd = restore_cmd(fmt, db)
+        with decompress_reader(src_path) as reader:
+            exec_stream(container, cmd, stdin=reader, environment={"PGPASSWORD": db["db_password"] or ""})
+        return
+
+    env = dict(os.environ, PGPASSWORD=db["db_password"] or "")
+    if fmt != "directory":
+        decompress_command(src_path, restore_cmd(fmt, db, db["db_host"], db["db_port"]), env=env)
+        return
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(src_path)) as tmp_dir:
+        decompress_command(src_path, ["tar", "-C", tmp_dir, "-xf", "-"])
+        cmd = ["pg_restore", "--clean", "--if-exists", "--no-owner", "-j", str(jobs), "-U", db["db_user"],
+               "-h", db["db_host"], "-p", str(db["db_port"]), "-d", db["db_name"], tmp_dir]
+        subprocess.run(cmd, env=env, check=True, capture_output=True)
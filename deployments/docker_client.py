@@ -0,0 +1,134 @@
+# deployments/docker_client.py
+"""
+عملاء Docker مشتركون على مستوى العملية (process-wide).
+
+بدلاً من docker.from_env() في كل دالة (اتصال HTTP جديد على Docker socket في كل مرة)
+نستخدم عميل واحد بـ connection pool (keep-alive) مع فحص صحة دوري،
+وعميلاً مماثلاً لكل DockerNode مسجل (Deployments موزعة على عدة hosts).
+"""
+import logging
+import os
+import threading
+import time
+
+import docker
+from docker.errors import DockerException
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DOCKER_BASE_URL = getattr(settings, "DOCKER_BASE_URL", None)  # None => DOCKER_HOST أو الـ socket الافتراضي
+DOCKER_CLIENT_TIMEOUT = getattr(settings, "DOCKER_CLIENT_TIMEOUT", 60)  # ثواني
+DOCKER_MAX_POOL_SIZE = getattr(settings, "DOCKER_MAX_POOL_SIZE", 10)
+DOCKER_HEALTHCHECK_INTERVAL = getattr(settings, "DOCKER_HEALTHCHECK_INTERVAL", 30)  # ثواني
+# مسار dotted لدالة (base_url, timeout, max_pool_size, tls) => client، مثلاً fake engine في الاختبارات
+DOCKER_CLIENT_FACTORY = getattr(settings, "DOCKER_CLIENT_FACTORY", None)
+
+_lock = threading.Lock()
+_clients = {}  # None (الـ daemon المحلي) أو اسم الـ node -> {"client", "pid", "base_url", "checked"}
+
+
+def _build_client(base_url, timeout, max_pool_size, tls=None):
+    if DOCKER_CLIENT_FACTORY:
+        factory = import_string(DOCKER_CLIENT_FACTORY)
+        return factory(base_url=base_url, timeout=timeout, max_pool_size=max_pool_size, tls=tls)
+    if base_url:
+        return docker.DockerClient(base_url=base_url, timeout=timeout, max_pool_size=max_pool_size, tls=tls or False)
+    return docker.from_env(timeout=timeout, max_pool_size=max_pool_size)
+
+
+def create_docker_client(max_pool_size=DOCKER_MAX_POOL_SIZE, timeout=DOCKER_CLIENT_TIMEOUT, node=None):
+    """
+    إنشاء عميل مستقل (مثلاً للاتصالات الطويلة مثل stats/logs streaming
+    حتى لا تحجز اتصالات الـ pool المشترك).
+    node: DockerNode، أو None للـ daemon المحلي
+    """
+    if node is not None:
+        client = _build_client(node.base_url, timeout, max_pool_size, node.get_tls_config())
+    else:
+        client = _build_client(DOCKER_BASE_URL, timeout, max_pool_size)
+    target = node.name if node is not None else "local"
+    logger.info(f"Docker client created for {target} (pool size={max_pool_size}, timeout={timeout}s)")
+    return client
+
+
+def _close_client(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def get_docker_client(node=None):
+    """
+    ترجع عميل Docker المشترك للـ daemon المحلي أو للـ node.
+    يُعاد إنشاؤه بعد fork (pid مختلف)، عند تغيير base_url أو إذا فشل فحص الصحة الدوري.
+    """
+    key = node.name if node is not None else None
+    base_url = node.base_url if node is not None else DOCKER_BASE_URL
+
+    with _lock:
+        pid = os.getpid()
+        entry = _clients.get(key)
+        if entry is None or entry["pid"] != pid or entry["base_url"] != base_url:
+            # الاتصالات لا تُشارك بين العمليات بعد fork
+            if entry is not None and entry["pid"] == pid:
+                _close_client(entry["client"])
+            entry = {
+                "client": create_docker_client(node=node),
+                "pid": pid,
+                "base_url": base_url,
+                "checked": time.monotonic(),
+            }
+            _clients[key] = entry
+            return entry["client"]
+
+        now = time.monotonic()
+        if DOCKER_HEALTHCHECK_INTERVAL and now - entry["checked"] >= DOCKER_HEALTHCHECK_INTERVAL:
+            entry["checked"] = now
+            try:
+                entry["client"].ping()
+            except (DockerException, OSError) as e:
+                logger.warning(f"Docker client health check failed for {key or 'local'}, reconnecting: {e}")
+                _close_client(entry["client"])
+                entry["client"] = create_docker_client(node=node)
+
+        return entry["client"]
+
+
+def get_deployment_client(deployment=None):
+    """عميل الـ Docker host الذي وُضع عليه الـ Deployment (المحلي إذا لم يُحدد node)"""
+    return get_docker_client(deployment.node if deployment is not None else None)
+
+
+def get_docker_env(node=None):
+    """متغيرات البيئة لأوامر docker / docker compose عبر subprocess لتستهدف الـ node"""
+    env = os.environ.copy()
+    if node is None:
+        return env
+    env["DOCKER_HOST"] = node.base_url
+    if node.tls_verify:
+        env["DOCKER_TLS_VERIFY"] = "1"
+        env["DOCKER_CERT_PATH"] = node.cert_path or ""
+    else:
+        env.pop("DOCKER_TLS_VERIFY", None)
+        env.pop("DOCKER_CERT_PATH", None)
+    return env
+
+
+def check_docker_health(node=None):
+    """True إذا كان Docker daemon يستجيب"""
+    try:
+        return bool(get_docker_client(node).ping())
+    except (DockerException, OSError) as e:
+        logger.error(f"Docker daemon {node.name if node is not None else 'local'} is not reachable: {e}")
+        return False
+
+
+def reset_docker_client():
+    """إغلاق جميع العملاء المشتركين (تُنشأ من جديد عند الطلب التالي)"""
+    with _lock:
+        for entry in _clients.values():
+            _close_client(entry["client"])
+        _clients.clear()
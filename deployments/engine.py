@@ -0,0 +1,421 @@
+# deployments/engine.py
+"""
+تطبيق compose المُولّد (compose_template) مباشرة عبر Docker Engine API.
+
+بدل تشغيل `docker compose` كعملية جديدة في كل start/stop/restart (تحميل YAML من
+القرص + عميل API جديد في كل مرة) نستخدم العميل المشترك get_docker_client().
+الحاويات والشبكات تحمل نفس labels الخاصة بـ compose (com.docker.compose.*)
+لذلك يبقى الـ CLI قادراً على إدارتها كـ fallback.
+
+config-hash الخاص بالـ CLI (hash لبنية Go داخل compose) لا يمكن حسابه هنا، لذلك يُكتب hash
+الـ engine في label منفصل (ENGINE_HASH_LABEL). حاوية أنشأها الـ CLI تُقارن بـ applied_services
+الخاصة بالـ Deployment (نفس صيغة الـ hash) فلا يُعاد إنشاء كل الحاويات عند أول up عبر الـ API.
+
+أي خيار compose غير مدعوم هنا يرفع UnsupportedComposeOption ويُنفذ الأمر عبر الـ CLI،
+ويتم التحقق من كل الـ services قبل لمس أي حاوية.
+"""
+import hashlib
+import json
+import logging
+import re
+
+from docker.errors import ImageNotFound, NotFound
+
+from .docker_client import get_docker_client
+
+logger = logging.getLogger(__name__)
+
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+NETWORK_LABEL = "com.docker.compose.network"
+CONFIG_HASH_LABEL = "com.docker.compose.config-hash"
+ENGINE_HASH_LABEL = "com.softmsg.engine.config-hash"
+ONEOFF_LABEL = "com.docker.compose.oneoff"
+
+# expose غير مدعوم: docker-py لا يضيف ExposedPorts بدون نشر المنفذ على الـ host
+SUPPORTED_SERVICE_KEYS = {
+    "image", "container_name", "environment", "command", "entrypoint", "labels",
+    "ports", "restart", "volumes", "networks", "depends_on", "healthcheck",
+    "deploy", "working_dir", "user", "hostname", "tty", "stdin_open", "privileged",
+    "cap_add", "cap_drop", "extra_hosts", "shm_size", "sysctls", "tmpfs", "dns",
+    "logging", "service_name",
+}
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ns|us|ms|s|m|h)")
+_DURATION_NS = {"ns": 1, "us": 1_000, "ms": 1_000_000, "s": 1_000_000_000, "m": 60_000_000_000, "h": 3_600_000_000_000}
+
+
+class UnsupportedComposeOption(Exception):
+    """خيار compose لا يدعمه الـ engine (يُنفذ الأمر عبر الـ CLI بدلاً منه)"""
+
+
+# ---------------- Parsers ----------------
+def parse_duration(value):
+    """"1m30s" / "500ms" / 10 -> nanoseconds"""
+    if isinstance(value, (int, float)):
+        return int(value * 1_000_000_000)
+    total = 0
+    for amount, unit in _DURATION_RE.findall(str(value)):
+        total += int(float(amount) * _DURATION_NS[unit])
+    return total
+
+
+def parse_key_values(value):
+    """["A=1", "B"] أو {"A": 1} -> {"A": "1", "B": ""}"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {str(k): "" if v is None else str(v) for k, v in value.items()}
+    result = {}
+    for item in value:
+        key, _, val = str(item).partition("=")
+        result[key] = val
+    return result
+
+
+def parse_ports(ports):
+    """صيغ compose للمنافذ -> ports بصيغة docker-py {"80/tcp": 8080}"""
+    result = {}
+    for port in ports or []:
+        if isinstance(port, dict):
+            target = f"{port['target']}/{port.get('protocol', 'tcp')}"
+            published = port.get("published")
+            host_ip = port.get("host_ip")
+            result[target] = (host_ip, int(published)) if host_ip and published else (int(published) if published else None)
+            continue
+
+        spec, _, protocol = str(port).partition("/")
+        parts = spec.split(":")
+        if any("-" in p for p in parts):
+            raise UnsupportedComposeOption(f"port ranges are not supported: {port}")
+        target = f"{parts[-1]}/{protocol or 'tcp'}"
+        if len(parts) == 1:
+            result[target] = None
+        elif len(parts) == 2:
+            result[target] = int(parts[0]) if parts[0] else None
+        else:
+            host_ip = ":".join(parts[:-2])
+            result[target] = (host_ip, int(parts[-2])) if parts[-2] else (host_ip,)
+    return result
+
+
+def parse_volumes(volumes):
+    """["/host:/path:ro"] -> {"/host": {"bind": "/path", "mode": "ro"}}"""
+    result = {}
+    for vol in volumes or []:
+        if isinstance(vol, dict):
+            if vol.get("type", "volume") not in ("bind", "volume"):
+                raise UnsupportedComposeOption(f"volume type {vol.get('type')} is not supported")
+            result[vol["source"]] = {"bind": vol["target"], "mode": "ro" if vol.get("read_only") else "rw"}
+            continue
+
+        parts = str(vol).split(":")
+        if len(parts) == 1:
+            raise UnsupportedComposeOption(f"anonymous volumes are not supported: {vol}")
+        mode = parts[2] if len(parts) > 2 else "rw"
+        result[parts[0]] = {"bind": parts[1], "mode": mode}
+    return result
+
+
+def parse_restart(value):
+    if not value or value == "no":
+        return None
+    name, _, retries = str(value).partition(":")
+    policy = {"Name": name}
+    if retries:
+        policy["MaximumRetryCount"] = int(retries)
+    return policy
+
+
+def parse_healthcheck(value):
+    if not value:
+        return None
+    if value.get("disable"):
+        return {"test": ["NONE"]}
+    test = value.get("test")
+    if isinstance(test, str):
+        test = ["CMD-SHELL", test]
+    healthcheck = {"test": test}
+    for key in ("interval", "timeout", "start_period"):
+        if key in value:
+            healthcheck[key] = parse_duration(value[key])
+    if "retries" in value:
+        healthcheck["retries"] = int(value["retries"])
+    return healthcheck
+
+
+def config_hash(config):
+    raw = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ---------------- Engine ----------------
+class ComposeEngine:
+    def __init__(self, project_name, compose, client=None, applied=None):
+        self.project_name = project_name
+        self.compose = compose or {}
+        self.services = self.compose.get("services") or {}
+        self.networks = self.compose.get("networks") or {}
+        self.client = client or get_docker_client()
+        self.applied = applied or {}  # {service: hash} لآخر إعدادات طُبقت (Deployment.applied_services)
+
+    # ---------------- Names ----------------
+    def network_name(self, key):
+        conf = self.networks.get(key) or {}
+        if conf.get("external"):
+            return conf.get("name", key)
+        return conf.get("name") or f"{self.project_name}_{key}"
+
+    def container_name(self, service):
+        return self.services[service].get("container_name") or f"{self.project_name}-{service}-1"
+
+    def service_networks(self, config):
+        networks = config.get("networks") or ["default"]
+        if isinstance(networks, dict):
+            return [(key, (opts or {}).get("aliases") or []) for key, opts in networks.items()]
+        return [(key, []) for key in networks]
+
+    def service_depends_on(self, config):
+        depends_on = config.get("depends_on") or []
+        return list(depends_on.keys()) if isinstance(depends_on, dict) else list(depends_on)
+
+    def service_order(self, services=None, with_deps=True):
+        """ترتيب الـ services حسب depends_on (التبعيات أولاً)"""
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered or name not in self.services:
+                return
+            if name in visiting:
+                raise UnsupportedComposeOption(f"circular depends_on at service {name}")
+            visiting.add(name)
+            if with_deps or services is None:
+                for dep in self.service_depends_on(self.services[name]):
+                    visit(dep)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in (services if services is not None else self.services):
+            visit(name)
+        if services is not None and not with_deps:
+            ordered = [name for name in ordered if name in services]
+        return ordered
+
+    # ---------------- Create kwargs ----------------
+    def container_kwargs(self, service):
+        config = self.services[service]
+        unsupported = set(config) - SUPPORTED_SERVICE_KEYS
+        if unsupported:
+            raise UnsupportedComposeOption(f"service {service} uses {', '.join(sorted(unsupported))}")
+
+        labels = parse_key_values(config.get("labels"))
+        labels.update({
+            PROJECT_LABEL: self.project_name,
+            SERVICE_LABEL: service,
+            ONEOFF_LABEL: "False",
+            ENGINE_HASH_LABEL: config_hash(config),
+        })
+
+        kwargs = {
+            "image": config["image"],
+            "name": self.container_name(service),
+            "detach": True,
+            "labels": labels,
+            "environment": parse_key_values(config.get("environment")),
+        }
+
+        for key, kwarg in (("command", "command"), ("entrypoint", "entrypoint"), ("working_dir", "working_dir"),
+                           ("user", "user"), ("hostname", "hostname"), ("tty", "tty"), ("stdin_open", "stdin_open"),
+                           ("privileged", "privileged"), ("cap_add", "cap_add"), ("cap_drop", "cap_drop"),
+                           ("shm_size", "shm_size"), ("sysctls", "sysctls"), ("dns", "dns")):
+            if config.get(key) is not None:
+                kwargs[kwarg] = config[key]
+
+        if config.get("extra_hosts"):
+            kwargs["extra_hosts"] = parse_key_values(
+                [h.replace(":", "=", 1) for h in config["extra_hosts"]]
+                if isinstance(config["extra_hosts"], list) else config["extra_hosts"]
+            )
+        if config.get("tmpfs"):
+            tmpfs = config["tmpfs"]
+            kwargs["tmpfs"] = {path: "" for path in ([tmpfs] if isinstance(tmpfs, str) else tmpfs)}
+        if config.get("ports"):
+            kwargs["ports"] = parse_ports(config["ports"])
+        if config.get("volumes"):
+            kwargs["volumes"] = parse_volumes(config["volumes"])
+
+        restart_policy = parse_restart(config.get("restart"))
+        if restart_policy:
+            kwargs["restart_policy"] = restart_policy
+
+        healthcheck = parse_healthcheck(config.get("healthcheck"))
+        if healthcheck:
+            kwargs["healthcheck"] = healthcheck
+
+        if config.get("logging"):
+            kwargs["log_config"] = {
+                "Type": config["logging"].get("driver", "json-file"),
+                "Config": config["logging"].get("options") or {},
+            }
+
+        # ---- الموارد (نفس ما يكتبه render_dc_compose في deploy.resources.limits) ----
+        deploy = config.get("deploy") or {}
+        if int(deploy.get("replicas", 1)) != 1:
+            raise UnsupportedComposeOption(f"service {service} uses replicas")
+        limits = (deploy.get("resources") or {}).get("limits") or {}
+        if limits.get("cpus"):
+            kwargs["nano_cpus"] = int(float(limits["cpus"]) * 1_000_000_000)
+        if limits.get("memory"):
+            kwargs["mem_limit"] = str(limits["memory"]).lower()
+        reservations = (deploy.get("resources") or {}).get("reservations") or {}
+        if reservations.get("memory"):
+            kwargs["mem_reservation"] = str(reservations["memory"]).lower()
+
+        # ---- الشبكة الأولى عند الإنشاء والباقي بعده ----
+        networks = self.service_networks(config)
+        first, aliases = networks[0]
+        kwargs["network"] = self.network_name(first)
+        kwargs["networking_config"] = {
+            kwargs["network"]: self.client.api.create_endpoint_config(aliases=[service, *aliases])
+        }
+        return kwargs, networks[1:]
+
+    # ---------------- State ----------------
+    def existing_containers(self):
+        """{service: Container} لجميع حاويات المشروع (بما فيها المتوقفة)"""
+        containers = self.client.containers.list(all=True, filters={"label": f"{PROJECT_LABEL}={self.project_name}"})
+        return {c.labels.get(SERVICE_LABEL): c for c in containers}
+
+    def is_current(self, service, container):
+        """هل الحاوية مطابقة لإعدادات الـ service الحالية (لا تحتاج إعادة إنشاء)"""
+        expected = config_hash(self.services[service])
+        labels = container.labels or {}
+        if ENGINE_HASH_LABEL in labels:
+            return labels[ENGINE_HASH_LABEL] == expected
+        # أنشأها الـ CLI (أو نسخة أقدم من الـ engine كتبت hash الخاص بها في config-hash)
+        return expected in (labels.get(CONFIG_HASH_LABEL), self.applied.get(service))
+
+    def ensure_image(self, image):
+        try:
+            self.client.images.get(image)
+        except ImageNotFound:
+            logger.info(f"Pulling image {image}")
+            self.client.images.pull(image)
+
+    def ensure_networks(self):
+        used = {key for config in self.services.values() for key, _ in self.service_networks(config)}
+        for key in used:
+            name = self.network_name(key)
+            conf = self.networks.get(key) or {}
+            try:
+                self.client.networks.get(name)
+                continue
+            except NotFound:
+                if conf.get("external"):
+                    raise
+            self.client.networks.create(
+                name,
+                driver=conf.get("driver", "bridge"),
+                labels={PROJECT_LABEL: self.project_name, NETWORK_LABEL: key},
+            )
+            logger.info(f"Network {name} created")
+
+    def remove_networks(self):
+        for key, conf in self.networks.items():
+            if (conf or {}).get("external"):
+                continue
+            try:
+                self.client.networks.get(self.network_name(key)).remove()
+            except NotFound:
+                pass
+
+    def create_container(self, service, prepared=None):
+        kwargs, extra_networks = prepared or self.container_kwargs(service)
+        try:
+            container = self.client.containers.create(**kwargs)
+        except ImageNotFound:
+            logger.info(f"Pulling image {kwargs['image']}")
+            self.client.images.pull(kwargs["image"])
+            container = self.client.containers.create(**kwargs)
+
+        for key, aliases in extra_networks:
+            self.client.api.connect_container_to_network(
+                container.id, self.network_name(key), aliases=[service, *aliases]
+            )
+        return container
+
+    # ---------------- Commands ----------------
+    def up(self, services=None, no_deps=False, remove_orphans=False):
+        """إنشاء/تحديث الحاويات: لا يُعاد إنشاء إلا ما تغير config-hash الخاص به"""
+        order = self.service_order(services, with_deps=not no_deps)
+        existing = self.existing_containers()
+
+        # بناء kwargs لكل الـ services قبل لمس أي حاوية: خيار غير مدعوم يرفع الخطأ هنا
+        # فينفذ الـ CLI الأمر كاملاً والحاويات الحالية ما زالت تعمل
+        prepared = {service: self.container_kwargs(service) for service in order}
+        recreate = [
+            service for service in order
+            if existing.get(service) is None or not self.is_current(service, existing[service])
+        ]
+        for service in recreate:
+            self.ensure_image(prepared[service][0]["image"])
+        self.ensure_networks()
+
+        for service in order:
+            container = existing.get(service)
+            if service not in recreate:
+                if container.status != "running":
+                    container.start()
+                continue
+            if container is not None:
+                container.remove(force=True)
+                logger.info(f"Container {container.name} recreated")
+            self.create_container(service, prepared[service]).start()
+
+        if remove_orphans:
+            for service, container in existing.items():
+                if service not in self.services:
+                    container.remove(force=True)
+                    logger.info(f"Orphan container {container.name} removed")
+
+    def start(self):
+        existing = self.existing_containers()
+        for service in self.service_order():
+            if service in existing:
+                existing[service].start()
+
+    def stop(self):
+        existing = self.existing_containers()
+        for service in reversed(self.service_order()):
+            if service in existing:
+                existing[service].stop()
+
+    def restart(self):
+        existing = self.existing_containers()
+        for service in self.service_order():
+            if service in existing:
+                existing[service].restart()
+
+    def down(self):
+        existing = self.existing_containers()
+        order = self.service_order()
+        for service in reversed(order + [s for s in existing if s not in order]):
+            if service in existing:
+                existing[service].remove(force=True)
+        self.remove_networks()
+
+    def run(self, command):
+        """تنفيذ نفس قائمة الوسائط التي تُمرر لـ docker compose (مثلاً ["up", "-d"])"""
+        action, args = command[0], command[1:]
+        flags = {a for a in args if a.startswith("-")}
+        services = [a for a in args if not a.startswith("-")] or None
+
+        if action == "up" and flags <= {"-d", "--detach", "--no-deps", "--remove-orphans"}:
+            return self.up(services, no_deps="--no-deps" in flags, remove_orphans="--remove-orphans" in flags)
+        if action == "down" and flags <= {"-v", "--volumes"} and services is None:
+            # الـ volumes هي bind mounts داخل صورة XFS الخاصة بالـ Deployment، لا volumes مسماة
+            return self.down()
+        if action in ("start", "stop", "restart") and not flags and services is None:
+            return getattr(self, action)()
+        raise UnsupportedComposeOption(f"compose command {' '.join(command)}")
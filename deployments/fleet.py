@@ -0,0 +1,102 @@
+# deployments/fleet.py
+"""
+عمليات جماعية (fleet) على عدة Deployments بالتوازي.
+
+كل أمر compose يحجب thread واحد حتى ينتهي، لذلك نستخدم ThreadPoolExecutor
+بحد أقصى FLEET_MAX_WORKERS، مع حد إضافي لكل Docker host (FLEET_PER_HOST_CONCURRENCY)
+حتى لا يُغرق daemon واحد بعشرات عمليات up/down في نفس اللحظة.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .utils import (
+    run_docker, start_docker, stop_docker, restart_docker,
+    hard_restart, reconcile_docker,
+)
+from .limits import reconcile_limits
+
+logger = logging.getLogger(__name__)
+
+FLEET_MAX_WORKERS = getattr(settings, "FLEET_MAX_WORKERS", 16)
+FLEET_PER_HOST_CONCURRENCY = getattr(settings, "FLEET_PER_HOST_CONCURRENCY", 8)
+DEFAULT_HOST = "local"
+
+FLEET_ACTIONS = {
+    "up": run_docker,
+    "start": start_docker,
+    "stop": stop_docker,
+    "restart": restart_docker,
+    "hard_restart": hard_restart,
+    "reconcile": reconcile_docker,
+    "limits": lambda deployment: not reconcile_limits(deployment)["failed"],
+}
+
+
+def get_deployment_host(deployment):
+    """Docker host الذي يعمل عليه الـ Deployment: اسم الـ DockerNode أو DEFAULT_HOST للـ daemon المحلي"""
+    return deployment.node.name if deployment.node_id else DEFAULT_HOST
+
+
+def run_fleet(deployments, action, max_workers=FLEET_MAX_WORKERS, per_host=FLEET_PER_HOST_CONCURRENCY,
+              refresh=False, on_result=None):
+    """
+    تنفيذ action على كل Deployment في deployments (queryset أو list).
+    on_result(result) يُستدعى فور انتهاء كل Deployment (لعرض التقدم).
+    ترجع قائمة النتائج:
+    {"deployment_id", "name", "host", "success", "error", "duration"}
+    """
+    if action not in FLEET_ACTIONS:
+        raise ValueError(f"Unknown fleet action '{action}'")
+    func = FLEET_ACTIONS[action]
+
+    deployments = list(deployments)
+    semaphores = defaultdict(lambda: threading.Semaphore(max(1, per_host)))
+    hosts = {deployment.id: get_deployment_host(deployment) for deployment in deployments}
+    for host in set(hosts.values()):
+        semaphores[host]  # إنشاء مسبق حتى لا تتسابق الـ threads على defaultdict
+
+    def task(deployment):
+        host = hosts[deployment.id]
+        error = None
+        with semaphores[host]:
+            started = time.monotonic()
+            try:
+                if refresh:
+                    deployment.refresh_compose_template()
+                success = bool(func(deployment))
+            except Exception as e:
+                logger.exception(f"Fleet {action} failed for deployment {deployment.id}: {e}")
+                success = False
+                error = str(e)
+            finally:
+                close_old_connections()
+        return {
+            "deployment_id": deployment.id,
+            "name": deployment.deployment_name,
+            "host": host,
+            "success": success,
+            "error": error,
+            "duration": round(time.monotonic() - started, 2),
+        }
+
+    results = []
+    if not deployments:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(deployments))), thread_name_prefix="fleet") as pool:
+        futures = [pool.submit(task, deployment) for deployment in deployments]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    failed = sum(1 for r in results if not r["success"])
+    logger.info(f"Fleet {action}: {len(results) - failed} succeeded, {failed} failed")
+    return results
@@ -0,0 +1,191 @@
+# deployments/images.py
+"""
+سحب صور المشاريع مسبقاً (image warm cache).
+
+يقرأ docker_compose_template لكل AvailableProject ويسحب الصور بالتوازي في الخلفية
+على كل host يمكن وضع Deployment عليه (المحلي و DockerNodes النشطة)
+حتى يبدأ `docker compose up` لأي Deployment جديد من صور محلية على الـ host الخاص به.
+CachedImage يُسجل لكل (صورة، node)، والصور غير المستخدمة تُحذف بترتيب LRU
+عند تجاوز IMAGE_CACHE_DISK_BUDGET على كل host على حدة.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from docker.errors import APIError, DockerException, ImageNotFound
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from projects.models import AvailableProject
+from .docker_client import get_docker_client
+from .fleet import DEFAULT_HOST
+from .models import CachedImage, DockerNode
+from .placement import get_candidate_hosts
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PULL_WORKERS = getattr(settings, "IMAGE_PULL_WORKERS", 4)
+IMAGE_CACHE_DISK_BUDGET = getattr(settings, "IMAGE_CACHE_DISK_BUDGET", 50 * 1024 ** 3)  # بايت
+
+
+def get_project_images(project):
+    """أسماء الصور المستخدمة في قالب المشروع (بدون القيم التي تحتوي placeholders)"""
+    if not project.docker_compose_template:
+        return set()
+    try:
+        compose = yaml.safe_load(project.docker_compose_template) or {}
+    except yaml.YAMLError as e:
+        logger.warning(f"Invalid compose template for project {project.id}: {e}")
+        return set()
+
+    images = set()
+    for config in (compose.get("services") or {}).values():
+        image = (config or {}).get("image")
+        if image and "{" not in image:
+            images.add(image if ":" in image.rsplit("/", 1)[-1] else f"{image}:latest")
+    return images
+
+
+def get_catalog_images(projects=None):
+    """جميع الصور في الكتالوج (أو في projects فقط)"""
+    if projects is None:
+        projects = AvailableProject.objects.exclude(docker_compose_template=None)
+    images = set()
+    for project in projects:
+        images |= get_project_images(project)
+    return images
+
+
+def get_image_hosts():
+    """DockerNodes التي تُسحب إليها الصور (None => المحلي): نفس الـ hosts المتاحة للـ placement"""
+    return list(get_candidate_hosts().values())
+
+
+def get_host_name(node):
+    return node.name if node is not None else DEFAULT_HOST
+
+
+def touch_images(references, node=None):
+    """تحديث last_used_at (ترتيب LRU) عند استخدام الصور في Deployment على node"""
+    CachedImage.objects.filter(reference__in=list(references), node=node).update(last_used_at=timezone.now())
+
+
+# ---------------- Pull ----------------
+def pull_image(reference, node=None):
+    """سحب صورة واحدة على node وتسجيل digest والحجم، ترجع CachedImage"""
+    host = get_host_name(node)
+    cached, _ = CachedImage.objects.get_or_create(reference=reference, node=node)
+    try:
+        image = get_docker_client(node).images.pull(reference)
+    except (DockerException, OSError) as e:
+        logger.error(f"Failed to pull image {reference} on {host}: {e}")
+        cached.status = "failed"
+        cached.error_message = str(e)
+        cached.save(update_fields=["status", "error_message"])
+        return cached
+
+    repo_digests = image.attrs.get("RepoDigests") or []
+    changed = cached.image_id != image.id
+    cached.digest = repo_digests[0] if repo_digests else None
+    cached.image_id = image.id
+    cached.size_bytes = image.attrs.get("Size", 0)
+    cached.status = "pulled"
+    cached.error_message = None
+    cached.pulled_at = timezone.now()
+    cached.save(update_fields=["digest", "image_id", "size_bytes", "status", "error_message", "pulled_at"])
+
+    if changed:
+        logger.info(f"Image {reference} pulled on {host} ({cached.digest or image.id})")
+    return cached
+
+
+def warm_images(references=None, workers=IMAGE_PULL_WORKERS, nodes=None):
+    """
+    سحب الصور بالتوازي على كل host في nodes (افتراضياً get_image_hosts).
+    إعادة السحب لصورة موجودة رخيصة (فحص manifest فقط) وتلتقط تحديث الـ tag إلى digest جديد.
+    """
+    references = sorted(get_catalog_images() if references is None else set(references))
+    if nodes is None:
+        nodes = get_image_hosts()
+    pairs = [(reference, node) for node in nodes for reference in references]
+    if not pairs:
+        return []
+
+    def task(pair):
+        try:
+            return pull_image(*pair)
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pairs))), thread_name_prefix="image-pull") as pool:
+        results = list(pool.map(task, pairs))
+
+    failed = [c.reference for c in results if c.status == "failed"]
+    logger.info(f"Image warm: {len(results) - len(failed)} pulled, {len(failed)} failed")
+    return results
+
+
+# ---------------- Eviction ----------------
+def get_images_in_use(node=None):
+    """image ids المستخدمة من أي حاوية (حتى المتوقفة) على node - لا تُحذف أبداً"""
+    return {c.attrs.get("Image") for c in get_docker_client(node).containers.list(all=True)}
+
+
+def evict_images(budget=IMAGE_CACHE_DISK_BUDGET):
+    """
+    تطبيق budget على كل host لديه صور مسحوبة (حتى الـ nodes غير النشطة التي ما زالت تشغل Deployments).
+    ترجع CachedImage المحذوفة.
+    """
+    node_ids = set(CachedImage.objects.filter(status="pulled").values_list("node_id", flat=True))
+    nodes = [None] if None in node_ids else []
+    nodes += list(DockerNode.objects.filter(id__in=node_ids - {None}))
+
+    catalog = get_catalog_images()
+    evicted = []
+    for node in nodes:
+        try:
+            evicted += evict_host_images(node, budget, catalog)
+        except DockerException as e:
+            logger.warning(f"Image eviction skipped on {get_host_name(node)}: {e}")
+    return evicted
+
+
+def evict_host_images(node, budget, catalog):
+    """حذف الصور الأقل استخداماً مؤخراً (LRU) على node حتى يصبح حجمها ضمن budget"""
+    pulled = CachedImage.objects.filter(status="pulled", node=node)
+    total = pulled.aggregate(total=Sum("size_bytes"))["total"] or 0
+    if total <= budget:
+        return []
+
+    host = get_host_name(node)
+    in_use = get_images_in_use(node)
+    client = get_docker_client(node)
+    evicted = []
+
+    # الصور التي لم تعد في الكتالوج أولاً، ثم الأقدم استخداماً
+    candidates = sorted(
+        pulled.order_by(F("last_used_at").asc(nulls_first=True), "pulled_at"),
+        key=lambda c: c.reference in catalog,
+    )
+    for cached in candidates:
+        if total <= budget:
+            break
+        if cached.image_id in in_use:
+            continue
+        try:
+            client.images.remove(cached.reference)
+        except ImageNotFound:
+            pass
+        except APIError as e:
+            logger.warning(f"Could not evict image {cached.reference} on {host}: {e}")
+            continue
+
+        total -= cached.size_bytes
+        cached.status = "evicted"
+        cached.save(update_fields=["status"])
+        evicted.append(cached)
+        logger.info(f"Image {cached.reference} evicted on {host} ({cached.size_bytes} bytes)")
+
+    return evicted
@@ -0,0 +1,301 @@
+# deployments/jobs.py
+"""
+طابور مهام النشر (Deployment Job Queue).
+
+الـ views تضيف مهمة في جدول DeploymentJob وترجع فوراً،
+وعمّال الأمر `python manage.py run_deployment_workers` يسحبون المهام وينفذونها.
+"""
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from datetime import datetime, timedelta
+
+from .models import DeploymentBackup, DeploymentJob
+from .utils import run_docker, update_deployment, mark_limits_applied
+from .images import get_project_images, touch_images, warm_images, evict_images
+from .volume_pool import refill_pools
+from .capacity import CAPACITY_ADMISSION, CAPACITY_QUEUE_DELAY, CAPACITY_QUEUE_TIMEOUT, check_admission
+from .placement import place_deployment
+from .backup_scheduler import BACKUP_SLOT_RETRY_DELAY, acquire_backup_slot, prune_backups
+from projects.models import AvailableProject
+from monitoring.rebalance import rebalance_deployment
+
+logger = logging.getLogger(__name__)
+
+JOB_RETRY_DELAY = getattr(settings, "DEPLOYMENT_JOB_RETRY_DELAY", 30)  # ثواني
+JOB_STALE_TIMEOUT = getattr(settings, "DEPLOYMENT_JOB_STALE_TIMEOUT", 60 * 60)  # ثواني
+
+# action -> handler(job)
+JOB_HANDLERS = {}
+
+
+def job_handler(action):
+    """تسجيل دالة كـ handler لنوع مهمة معين"""
+    def decorator(func):
+        JOB_HANDLERS[action] = func
+        return func
+    return decorator
+
+
+def get_worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+# ---------------- Queue API ----------------
+def enqueue_job(action, deployment=None, payload=None, delay=0, max_attempts=3):
+    """إضافة مهمة للطابور (تظهر للعمّال بعد commit الـ transaction الحالية)"""
+    if action not in JOB_HANDLERS:
+        raise ValueError(f"Unknown deployment job action: {action}")
+
+    job = DeploymentJob.objects.create(
+        deployment=deployment,
+        action=action,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    logger.info(f"Job {job.id} ({action}) queued for deployment {getattr(deployment, 'id', None)}")
+    return job
+
+
+def get_latest_job(deployment, action=None):
+    jobs = DeploymentJob.objects.filter(deployment=deployment)
+    if action:
+        jobs = jobs.filter(action=action)
+    return jobs.order_by("-created_at").first()
+
+
+def claim_next_job(worker_name):
+    """
+    سحب أقدم مهمة جاهزة وقفلها لهذا العامل.
+    skip_locked يسمح لعدة عمّال بالسحب بالتوازي بدون تعارض.
+    """
+    with transaction.atomic():
+        job = (
+            DeploymentJob.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", run_after__lte=timezone.now())
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = "running"
+        job.attempts = F("attempts") + 1
+        job.worker = worker_name
+        job.started_at = timezone.now()
+        job.finished_at = None
+        job.save(update_fields=["status", "attempts", "worker", "started_at", "finished_at"])
+
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale_jobs(timeout=JOB_STALE_TIMEOUT):
+    """إرجاع المهام العالقة في running (عامل مات أثناء التنفيذ) إلى الطابور"""
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    count = DeploymentJob.objects.filter(status="running", started_at__lt=deadline).update(
+        status="queued", worker=None, run_after=timezone.now()
+    )
+    if count:
+        logger.warning(f"{count} stale deployment jobs requeued")
+    return count
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.action)
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler registered for action '{job.action}'")
+        handler(job)
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.action}) failed on attempt {job.attempts}: {e}")
+        job.error_message = str(e)
+        if job.attempts < job.max_attempts:
+            # إعادة المحاولة مع backoff تصاعدي
+            job.status = "queued"
+            job.run_after = timezone.now() + timedelta(seconds=JOB_RETRY_DELAY * (2 ** (job.attempts - 1)))
+        else:
+            job.status = "failed"
+            job.finished_at = timezone.now()
+            if job.deployment_id:
+                update_deployment(job.deployment, progress=5, status=3)
+        job.save(update_fields=["status", "run_after", "error_message", "finished_at"])
+        return False
+
+    job.status = "completed"
+    job.error_message = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error_message", "finished_at"])
+    logger.info(f"Job {job.id} ({job.action}) completed")
+    return True
+
+
+def worker_loop(worker_name, poll_interval=2, stop_event=None, max_jobs=None):
+    """حلقة عامل واحد: يسحب وينفذ المهام حتى يُطلب منه التوقف"""
+    logger.info(f"Deployment worker {worker_name} started")
+    processed = 0
+    while not (stop_event and stop_event.is_set()):
+        close_old_connections()
+        try:
+            job = claim_next_job(worker_name)
+        except Exception as e:
+            logger.exception(f"Worker {worker_name} failed to claim job: {e}")
+            job = None
+
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+        processed += 1
+        if max_jobs and processed >= max_jobs:
+            break
+
+    close_old_connections()
+    logger.info(f"Deployment worker {worker_name} stopped after {processed} jobs")
+
+
+# ---------------- Handlers ----------------
+def mark_admitted(deployment):
+    deployment.admitted_at = timezone.now()
+    deployment.save(update_fields=["admitted_at"])
+
+
+def admit_deployment(job):
+    """
+    اختيار الـ host (placement) ثم التحقق من وجود سعة كافية عليه قبل النشر.
+    عند عدم وجود سعة: إعادة المحاولة لاحقاً (queue) أو الرفض (reject).
+    """
+    deployment = job.deployment
+    if deployment.admitted_at:
+        return True  # إعادة محاولة: الموارد محجوزة له منذ القبول
+
+    host, reason = place_deployment(deployment, require_fit=CAPACITY_ADMISSION != "off")
+    if CAPACITY_ADMISSION == "off":
+        mark_admitted(deployment)
+        return True
+
+    if host is not None:
+        fits, reason, _ = check_admission(deployment)
+        if fits:
+            mark_admitted(deployment)
+            return True
+
+    waiting_since = job.payload.get("waiting_since") or job.created_at.isoformat()
+    waited = (timezone.now() - datetime.fromisoformat(waiting_since)).total_seconds()
+
+    if CAPACITY_ADMISSION == "queue" and waited < CAPACITY_QUEUE_TIMEOUT:
+        enqueue_job("deploy", deployment=deployment, payload={"waiting_since": waiting_since}, delay=CAPACITY_QUEUE_DELAY)
+        logger.warning(f"Deployment {deployment.id} waiting for capacity: {reason}")
+        return False
+
+    deployment.notes = f"Rejected by admission control: {reason}"
+    deployment.save(update_fields=["notes"])
+    update_deployment(deployment, progress=5, status=3)
+    logger.error(f"Deployment {deployment.id} rejected: {reason}")
+    return False
+
+
+@job_handler("deploy")
+def deploy_job(job):
+    """إنشاء الـ volume، توليد compose وتشغيل الحاويات لـ Deployment جديد"""
+    deployment = job.deployment
+    if not admit_deployment(job):
+        return
+    update_deployment(deployment, progress=3, status=deployment.status or 1)
+
+    deployment.create_xfs_volume(deployment.plan.storage)
+    enqueue_refill_volume_pool()
+    deployment.refresh_compose_template()
+    touch_images(get_project_images(deployment.project), deployment.node)
+
+    if not run_docker(deployment):
+        raise RuntimeError(f"docker compose up failed for deployment {deployment.id}")
+
+    AvailableProject.objects.filter(id=deployment.project_id).update(installs=F("installs") + 1)
+    logger.info(f"Docker containers for deployment {deployment.id} started successfully")
+
+
+@job_handler("warm_images")
+def warm_images_job(job):
+    """سحب صور مشروع واحد (payload.project_id) أو الكتالوج كاملاً، ثم تطبيق الـ disk budget"""
+    project_id = job.payload.get("project_id")
+    references = None
+    if project_id:
+        project = AvailableProject.objects.filter(id=project_id).first()
+        references = get_project_images(project) if project else set()
+
+    results = warm_images(references)
+    evict_images()
+
+    failed = [c.reference for c in results if c.status == "failed"]
+    if failed:
+        raise RuntimeError(f"Failed to pull images: {', '.join(failed)}")
+
+
+def enqueue_refill_volume_pool():
+    """مهمة refill واحدة فقط في الطابور في أي وقت"""
+    if not DeploymentJob.objects.filter(action="refill_volume_pool", status__in=["queued", "running"]).exists():
+        enqueue_job("refill_volume_pool", max_attempts=1)
+
+
+@job_handler("refill_volume_pool")
+def refill_volume_pool_job(job):
+    """تهيئة صور XFS جديدة بدل التي سُحبت من الـ pool"""
+    refill_pools(job.payload.get("sizes"))
+
+
+@job_handler("upgrade_plan")
+def upgrade_plan_job(job):
+    """تطبيق الخطة الجديدة على Deployment يعمل: تكبير الـ volume وتحديث الحدود live"""
+    deployment = job.deployment
+    plan = deployment.plan
+
+    deployment.resize_xfs_volume(plan.storage)
+    # الوضع التكيفي يعيد توزيع الخطة الجديدة حسب الاستهلاك، وإلا الأوزان الثابتة
+    result = rebalance_deployment(deployment, plan)
+
+    # الحاويات التي تغيرت حدودها فقط لا تحتاج إعادة إنشاء لاحقاً، الباقي يبقى لـ reconcile_docker
+    previous_services = deployment.render_deployment_compose().get("services") or {}
+    deployment.refresh_compose_template()
+    if deployment.applied_services:
+        live = set(result["updated"]) | set(result["unchanged"])
+        marked = mark_limits_applied(deployment, previous_services, live)
+        logger.info(f"Deployment {deployment.id}: limits applied live to {marked}")
+    if result["failed"] or result["missing"]:
+        logger.warning(
+            f"Deployment {deployment.id}: limits not applied to {result['failed'] + result['missing']}, "
+            "left for reconcile"
+        )
+    logger.info(f"Plan {plan.id} applied to deployment {deployment.id} without restart")
+
+
+def enqueue_backup(deployment, backup_type, policy=None, delay=0):
+    """إنشاء DeploymentBackup بحالة pending وإضافة مهمة تنفيذه للطابور"""
+    backup = DeploymentBackup.objects.create(deployment=deployment, backup_type=backup_type, policy=policy)
+    enqueue_job("backup", deployment=deployment, payload={"backup_id": backup.id}, delay=delay, max_attempts=1)
+    return backup
+
+
+@job_handler("backup")
+def backup_job(job):
+    """تنفيذ نسخة احتياطية ضمن حدود التزامن، ثم حذف النسخ المنتهية لنفس الـ policy"""
+    backup = DeploymentBackup.objects.select_related("deployment", "policy").filter(id=job.payload.get("backup_id")).first()
+    if backup is None or backup.status in ["completed", "failed"]:
+        return
+
+    if not acquire_backup_slot(backup):
+        enqueue_job("backup", deployment=job.deployment, payload=job.payload, delay=BACKUP_SLOT_RETRY_DELAY, max_attempts=1)
+        logger.info(f"Backup {backup.id} waiting for a free slot")
+        return
+
+    backup.create_backup()
+    if backup.policy is not None and backup.status == "completed":
+        prune_backups(backup.policy)
@@ -0,0 +1,136 @@
+# deployments/limits.py
+"""
+حدود CPU / RAM لكل حاوية وتطبيقها أثناء التشغيل عبر Docker update API
+(بدون إعادة إنشاء الحاوية).
+
+ميزانية الخطة تُقسم على حاويات الـ Deployment حسب وزن نوع كل حاوية
+(backend 2، frontend 1، الباقي 0.5). نفس القيم تُكتب في compose
+(render_dc_compose) وتُطبق live بـ reconcile_limits، لذلك لا تحتاج
+إعادة إنشاء الحاوية عند تغير الخطة.
+
+الحاويات تُنشأ بـ NanoCpus (deploy.resources.limits.cpus)، و container.update()
+في docker-py لا يدعم NanoCpus، لذلك نستدعي POST /containers/{id}/update مباشرة.
+"""
+import logging
+
+from django.conf import settings
+from docker.errors import APIError, NotFound
+
+from .docker_client import get_deployment_client
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_WEIGHTS = getattr(settings, "RESOURCE_WEIGHTS", {"backend": 2, "backfront": 2, "frontend": 1})
+RESOURCE_DEFAULT_WEIGHT = getattr(settings, "RESOURCE_DEFAULT_WEIGHT", 0.5)
+RESOURCE_MIN_MEMORY_MB = getattr(settings, "RESOURCE_MIN_MEMORY_MB", 16)  # Docker يرفض أقل من 6MB
+
+
+def get_container_weight(dc):
+    container_type = dc.project_container.type if dc.project_container_id else None
+    return RESOURCE_WEIGHTS.get(container_type, RESOURCE_DEFAULT_WEIGHT)
+
+
+def split_plan(plan, shares, memory_shares=None):
+    """
+    shares: {container_name: نسبة من الخطة (مجموعها 1)}
+    memory_shares: نسب مختلفة للذاكرة (افتراضياً نفس shares)
+    -> {container_name: {"nano_cpus", "memory"}}
+    """
+    memory_shares = memory_shares or shares
+    # تقريب إلى 0.001 CPU و 1MB حتى تطابق القيم المكتوبة في compose ما يطبقه Docker
+    plan_milli_cpus = float(plan.cpu) * 1000
+    return {
+        name: {
+            "nano_cpus": max(1, int(plan_milli_cpus * share)) * 1_000_000,
+            "memory": max(RESOURCE_MIN_MEMORY_MB, int(int(plan.ram) * memory_shares[name])) * 1024 * 1024,
+        }
+        for name, share in shares.items()
+    }
+
+
+def to_compose_limits(target):
+    """{"nano_cpus", "memory"} -> قيم deploy.resources.limits في compose"""
+    return {
+        "cpus": f"{target['nano_cpus'] / 1_000_000_000:.3f}",
+        "memory": f"{target['memory'] // (1024 * 1024)}m",
+    }
+
+
+def calculate_target_limits(deployment, plan=None, containers=None):
+    """
+    {container_name: {"nano_cpus", "memory"}} حسب أوزان أنواع الحاويات.
+    containers: قائمة DeploymentContainer (مع project_container) لتجنب استعلامات إضافية.
+    """
+    plan = plan or deployment.plan
+    if containers is None:
+        containers = deployment.containers.select_related("project_container")
+    containers = list(containers)
+
+    weights = {dc.container_name: get_container_weight(dc) for dc in containers}
+    total_weight = sum(weights.values()) or 1
+    return split_plan(plan, {name: weight / total_weight for name, weight in weights.items()})
+
+
+# ---------------- Docker ----------------
+def get_current_limits(container):
+    host_config = container.attrs.get("HostConfig") or {}
+    return {"nano_cpus": host_config.get("NanoCpus") or 0, "memory": host_config.get("Memory") or 0}
+
+
+def update_container_resources(container, nano_cpus=None, memory=None):
+    """تطبيق NanoCpus / Memory على حاوية تعمل"""
+    data = {}
+    if nano_cpus is not None:
+        data["NanoCpus"] = int(nano_cpus)
+    if memory is not None:
+        data["Memory"] = int(memory)
+        # نفس الافتراضي في Docker: swap بقدر الذاكرة
+        data["MemorySwap"] = int(memory) * 2
+    if not data:
+        return
+
+    api = container.client.api
+    response = api._post_json(api._url("/containers/{0}/update", container.id), data=data)
+    api._result(response, True)
+
+
+def reconcile_limits(deployment, targets=None):
+    """
+    مقارنة الحدود الحالية (HostConfig) بالمطلوبة وتحديث المختلف فقط.
+    ترجع {"updated": [...], "unchanged": [...], "missing": [...], "failed": [...]}
+    """
+    if targets is None:
+        targets = calculate_target_limits(deployment)
+
+    client = get_deployment_client(deployment)
+    result = {"updated": [], "unchanged": [], "missing": [], "failed": []}
+
+    for name, target in targets.items():
+        try:
+            container = client.containers.get(name)
+        except NotFound:
+            result["missing"].append(name)
+            continue
+
+        current = get_current_limits(container)
+        changes = {key: value for key, value in target.items() if current.get(key) != value}
+        if not changes:
+            result["unchanged"].append(name)
+            continue
+
+        try:
+            update_container_resources(container, **changes)
+        except APIError as e:
+            logger.error(f"Failed to update limits of {name}: {e}")
+            result["failed"].append(name)
+            continue
+
+        result["updated"].append(name)
+        logger.info(f"Limits of {name} updated live: {current} -> {target}")
+
+    return result
+
+
+def apply_plan_limits(deployment, plan=None):
+    """تطبيق حدود الخطة على حاويات الـ Deployment العاملة، ترجع أسماء الحاويات المحدثة"""
+    return reconcile_limits(deployment, calculate_target_limits(deployment, plan))["updated"]
@@ -0,0 +1,175 @@
+# deployments/logstream.py
+"""
+بث سجلات (logs) جميع حاويات Deployment في stream واحد (Server-Sent Events).
+
+لكل حاوية thread يقرأ container.logs(stream=True, follow=True) ويضع الأسطر
+في queue محدود الحجم: إذا كان العميل بطيئاً يمتلئ الـ queue ويتوقف القراء
+عن السحب من Docker (backpressure) بدل تكديس الأسطر في الذاكرة.
+"""
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .docker_client import create_docker_client
+
+logger = logging.getLogger(__name__)
+
+LOG_STREAM_QUEUE_SIZE = getattr(settings, "LOG_STREAM_QUEUE_SIZE", 1000)
+LOG_STREAM_HEARTBEAT = getattr(settings, "LOG_STREAM_HEARTBEAT", 15)  # ثواني
+
+_DONE = object()
+
+
+def parse_log_timestamp(value):
+    """RFC3339 (بدقة nanoseconds من Docker) -> unix timestamp أو None"""
+    try:
+        value = value.rstrip("Z")
+        if "." in value:
+            base, fraction = value.split(".", 1)
+            value = f"{base}.{fraction[:6]}"
+        return datetime.fromisoformat(value).replace(tzinfo=dt_timezone.utc).timestamp()
+    except (ValueError, AttributeError):
+        return None
+
+
+class LogMultiplexer:
+    def __init__(self, container_names, since=None, tail=100, follow=True, node=None):
+        self.container_names = list(container_names)
+        self.node = node  # DockerNode الذي تعمل عليه الحاويات (None => المحلي)
+        self.since = since
+        self.tail = tail
+        self.follow = follow
+        self.queue = queue.Queue(maxsize=LOG_STREAM_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.streams = []
+        self.remaining = len(self.container_names)
+        self.client = None
+
+    def start(self):
+        # عميل مستقل: كل stream يحجز اتصالاً طوال مدة المتابعة
+        self.client = create_docker_client(max_pool_size=max(1, len(self.container_names)), node=self.node)
+        for name in self.container_names:
+            threading.Thread(target=self._follow, args=(name,), name=f"logs-{name}", daemon=True).start()
+        if not self.container_names:
+            self._put(_DONE)
+
+    def _follow(self, name):
+        try:
+            container = self.client.containers.get(name)
+            kwargs = {"stream": True, "follow": self.follow, "timestamps": True}
+            if self.since:
+                kwargs["since"] = self.since
+            else:
+                kwargs["tail"] = self.tail
+
+            stream = container.logs(**kwargs)
+            with self.lock:
+                self.streams.append(stream)
+
+            pending = b""
+            for chunk in stream:
+                if self.stop_event.is_set():
+                    break
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for raw in lines:
+                    self._put_line(name, raw)
+            if pending:
+                self._put_line(name, pending)
+
+        except Exception as e:
+            if not self.stop_event.is_set():
+                logger.warning(f"Log stream for {name} failed: {e}")
+                self._put({"container": name, "error": str(e)})
+        finally:
+            with self.lock:
+                self.remaining -= 1
+                done = self.remaining == 0
+            if done:
+                self._put(_DONE)
+
+    def _put_line(self, name, raw):
+        text = raw.decode(errors="ignore")
+        ts, _, line = text.partition(" ")
+        self._put({"container": name, "ts": ts, "line": line})
+
+    def _put(self, item):
+        # يحجب عند امتلاء الـ queue (backpressure) مع التحقق الدوري من الإيقاف
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, timeout=LOG_STREAM_HEARTBEAT):
+        """العنصر التالي، None عند انتهاء المهلة، _DONE عند انتهاء كل الـ streams"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            streams = list(self.streams)
+        for stream in streams:
+            try:
+                stream.close()
+            except Exception:
+                pass
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+
+# ---------------- SSE ----------------
+def format_sse(item):
+    if "error" in item:
+        return f"event: error\ndata: {json.dumps(item)}\n\n"
+    return f"id: {item['ts']}\ndata: {json.dumps(item)}\n\n"
+
+
+def sse_events(mux, heartbeat=LOG_STREAM_HEARTBEAT):
+    """generator متزامن (WSGI). إغلاقه عند انقطاع العميل يغلق الـ streams"""
+    try:
+        mux.start()
+        yield "retry: 3000\n\n"
+        while True:
+            item = mux.get(heartbeat)
+            if item is None:
+                yield ": keep-alive\n\n"
+            elif item is _DONE:
+                yield "event: end\ndata: {}\n\n"
+                break
+            else:
+                yield format_sse(item)
+    finally:
+        mux.close()
+
+
+async def asse_events(mux, heartbeat=LOG_STREAM_HEARTBEAT):
+    """نفس sse_events لكن async حتى لا يقوم Django بتجميع الـ stream كاملاً تحت ASGI"""
+    get = sync_to_async(mux.get, thread_sensitive=False)
+    try:
+        await sync_to_async(mux.start, thread_sensitive=False)()
+        yield "retry: 3000\n\n"
+        while True:
+            item = await get(heartbeat)
+            if item is None:
+                yield ": keep-alive\n\n"
+            elif item is _DONE:
+                yield "event: end\ndata: {}\n\n"
+                break
+            else:
+                yield format_sse(item)
+    finally:
+        mux.close()
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from deployments.models import Deployment
+
+
+class Command(BaseCommand):
+    help = "قياس عدد استعلامات قاعدة البيانات والزمن لكل render_dc_compose"
+
+    def add_arguments(self, parser):
+        parser.add_argument("deployment_ids", nargs="+", type=int)
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        iterations = max(1, options["iterations"])
+        self.stdout.write(f"{'deployment':>10} {'services':>8} {'queries/render':>15} {'ms/render':>10}")
+
+        for deployment_id in options["deployment_ids"]:
+            try:
+                Deployment.objects.get(id=deployment_id)
+            except Deployment.DoesNotExist:
+                raise CommandError(f"Deployment {deployment_id} not found")
+
+            queries = 0
+            elapsed = 0.0
+            services = 0
+            for _ in range(iterations):
+                # instance جديد في كل مرة حتى لا تُحسب الـ caches الخاصة بالـ instance
+                deployment = Deployment.objects.get(id=deployment_id)
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    compose = deployment.render_dc_compose()
+                    elapsed += time.perf_counter() - started
+                queries += len(ctx.captured_queries)
+                services = len(compose.get("services", {}))
+
+            self.stdout.write(
+                f"{deployment_id:>10} {services:>8} {queries / iterations:>15.1f} {elapsed * 1000 / iterations:>10.2f}"
+            )
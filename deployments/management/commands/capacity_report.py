@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from deployments.capacity import RESOURCES, get_hosts, get_ledger
+
+
+class Command(BaseCommand):
+    help = "تقرير سعة كل Docker host: السعة، المحجوز من الخطط والاستهلاك الفعلي"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="إخراج JSON")
+
+    def handle(self, *args, **options):
+        ledgers = [get_ledger(host) for host in get_hosts()]
+        if options["json"]:
+            self.stdout.write(json.dumps(ledgers, indent=2))
+            return
+
+        units = {"cpu": "cores", "ram": "MB", "storage": "MB"}
+        for ledger in ledgers:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{ledger['host']} ({ledger['deployments']} deployments)"))
+            self.stdout.write(f"  {'':<8} {'capacity':>12} {'allocatable':>12} {'reserved':>12} {'used':>12} {'free':>12}")
+            for resource in RESOURCES:
+                entry = ledger[resource]
+                line = (
+                    f"  {resource:<8} {entry['capacity']:>12} {entry['allocatable']:>12} "
+                    f"{entry['reserved']:>12} {entry['used']:>12} {entry['free']:>12} {units[resource]}"
+                )
+                self.stdout.write(self.style.WARNING(line) if entry["free"] < 0 else line)
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from deployments.fleet import FLEET_ACTIONS, FLEET_MAX_WORKERS, FLEET_PER_HOST_CONCURRENCY, run_fleet
+from deployments.models import Deployment
+
+
+class Command(BaseCommand):
+    help = "تنفيذ أمر compose على مجموعة Deployments بالتوازي"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=sorted(FLEET_ACTIONS))
+        parser.add_argument("--ids", nargs="+", type=int, help="أرقام Deployments محددة")
+        parser.add_argument("--project", type=int, help="كل Deployments مشروع معين")
+        parser.add_argument("--user", type=int, help="كل Deployments مستخدم معين")
+        parser.add_argument("--expired", action="store_true", help="فقط الاشتراكات المنتهية")
+        parser.add_argument("--workers", type=int, default=FLEET_MAX_WORKERS, help="أقصى عدد عمليات متزامنة")
+        parser.add_argument("--per-host", type=int, default=FLEET_PER_HOST_CONCURRENCY, help="أقصى عدد عمليات متزامنة لكل Docker host")
+        parser.add_argument("--refresh", action="store_true", help="إعادة توليد compose (إن تغير) قبل التنفيذ")
+        parser.add_argument("--dry-run", action="store_true", help="عرض الـ Deployments فقط بدون تنفيذ")
+
+    def get_queryset(self, options):
+        qs = Deployment.objects.filter(is_active=True).exclude(compose_template=None)
+        if options["ids"]:
+            qs = qs.filter(id__in=options["ids"])
+        if options["project"]:
+            qs = qs.filter(project_id=options["project"])
+        if options["user"]:
+            qs = qs.filter(user_id=options["user"])
+        if options["expired"]:
+            qs = qs.filter(subscription__end_date__lt=timezone.now())
+        return qs.select_related("project", "node").order_by("id")
+
+    def handle(self, *args, **options):
+        deployments = list(self.get_queryset(options))
+        if not deployments:
+            raise CommandError("No deployments matched")
+
+        if options["dry_run"]:
+            for deployment in deployments:
+                self.stdout.write(f"{deployment.id:>6} {deployment.deployment_name}")
+            self.stdout.write(f"{len(deployments)} deployments would be processed")
+            return
+
+        total = len(deployments)
+        done = [0]
+
+        def on_result(result):
+            done[0] += 1
+            status = self.style.SUCCESS("OK  ") if result["success"] else self.style.ERROR("FAIL")
+            line = f"[{done[0]}/{total}] {status} {result['deployment_id']:>6} {result['name']} ({result['duration']}s)"
+            if result["error"]:
+                line += f" {result['error']}"
+            self.stdout.write(line)
+
+        started = time.monotonic()
+        results = run_fleet(
+            deployments, options["action"],
+            max_workers=options["workers"], per_host=options["per_host"],
+            refresh=options["refresh"], on_result=on_result,
+        )
+
+        failed = [r for r in results if not r["success"]]
+        summary = f"{options['action']}: {total - len(failed)}/{total} succeeded in {time.monotonic() - started:.1f}s"
+        if failed:
+            self.stdout.write(self.style.WARNING(summary))
+            self.stdout.write("Failed: " + ", ".join(str(r["deployment_id"]) for r in failed))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from deployments.backup_store import collect_garbage
+from deployments.models import BackupChunk
+
+
+class Command(BaseCommand):
+    help = "حذف الـ chunks غير المستخدمة من مستودع النسخ الاحتياطية التزايدية"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="عرض ما سيُحذف فقط")
+
+    def handle(self, *args, **options):
+        result = collect_garbage(dry_run=options["dry_run"])
+        action = "would be removed" if options["dry_run"] else "removed"
+        self.stdout.write(f"{result['chunks']} chunks ({result['bytes'] / (1024 * 1024):.1f} MB) {action}")
+
+        totals = BackupChunk.objects.filter(refcount__gt=0).aggregate(
+            chunks=Count("id"), size=Sum("size"), stored=Sum("stored_size")
+        )
+        self.stdout.write(
+            f"Store: {totals['chunks']} chunks, {(totals['stored'] or 0) / (1024 * 1024):.1f} MB on disk "
+            f"for {(totals['size'] or 0) / (1024 * 1024):.1f} MB of unique data"
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from deployments.limits import reconcile_limits
+from deployments.models import Deployment
+
+
+class Command(BaseCommand):
+    help = "مطابقة حدود CPU / RAM للحاويات العاملة مع الخطة بدون إعادة تشغيلها"
+
+    def add_arguments(self, parser):
+        parser.add_argument("deployment_ids", nargs="*", type=int)
+        parser.add_argument("--all", action="store_true", help="كل الـ Deployments النشطة")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            deployments = Deployment.objects.filter(is_active=True)
+        elif options["deployment_ids"]:
+            deployments = Deployment.objects.filter(id__in=options["deployment_ids"])
+        else:
+            raise CommandError("Pass deployment ids or --all")
+
+        for deployment in deployments.order_by("id"):
+            if deployment.subscription is None:
+                self.stdout.write(self.style.WARNING(f"{deployment.id:>6} no subscription, skipped"))
+                continue
+            result = reconcile_limits(deployment)
+            line = (
+                f"{deployment.id:>6} updated={len(result['updated'])} unchanged={len(result['unchanged'])} "
+                f"missing={len(result['missing'])} failed={len(result['failed'])}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result["failed"] else line)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from deployments.volume_pool import VOLUME_POOL_TARGET, pool_status, refill_pools
+
+
+class Command(BaseCommand):
+    help = "تهيئة صور XFS مسبقاً لكل حجم تخزين في الخطط"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", nargs="+", type=int, help="أحجام محددة بالـ MB (افتراضياً كل أحجام الخطط)")
+        parser.add_argument("--target", type=int, default=VOLUME_POOL_TARGET, help="عدد الصور الجاهزة لكل حجم")
+        parser.add_argument("--status", action="store_true", help="عرض حالة الـ pool فقط")
+
+    def handle(self, *args, **options):
+        if not options["status"]:
+            for size, added in refill_pools(options["size"], options["target"]).items():
+                self.stdout.write(f"{size} MB: {added} images added")
+
+        for size, ready in pool_status(options["size"]).items():
+            self.stdout.write(f"{size:>8} MB  {ready} ready")
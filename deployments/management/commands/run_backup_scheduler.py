@@ -0,0 +1,42 @@
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from deployments.backup_scheduler import schedule_due_backups
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "جدولة النسخ الاحتياطية حسب BackupPolicy (التنفيذ يتم في run_deployment_workers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=60, help="ثواني بين كل فحص للمواعيد")
+        parser.add_argument("--once", action="store_true", help="فحص واحد ثم الخروج (للتشغيل من cron)")
+
+    def handle(self, *args, **options):
+        stopping = []
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping backup scheduler...")
+            stopping.append(signum)
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        while not stopping:
+            close_old_connections()
+            try:
+                scheduled = schedule_due_backups()
+                if scheduled:
+                    self.stdout.write(f"{scheduled} backups queued")
+            except Exception as e:
+                logger.exception(f"Backup scheduling failed: {e}")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Backup scheduler stopped"))
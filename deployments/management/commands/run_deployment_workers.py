@@ -0,0 +1,69 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from deployments.jobs import get_worker_name, requeue_stale_jobs, worker_loop
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(index, poll_interval, stop_event):
+    # كل عملية تفتح اتصالاتها الخاصة بقاعدة البيانات
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_loop(get_worker_name(index), poll_interval=poll_interval, stop_event=stop_event)
+
+
+class Command(BaseCommand):
+    help = "تشغيل مجموعة عمّال (processes) لتنفيذ مهام طابور النشر DeploymentJob"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="عدد العمليات")
+        parser.add_argument("--poll-interval", type=float, default=2, help="ثواني الانتظار عند فراغ الطابور")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        poll_interval = options["poll_interval"]
+
+        requeue_stale_jobs()
+        # عدم توريث اتصال قاعدة البيانات للعمليات الفرعية
+        connections.close_all()
+
+        stop_event = multiprocessing.Event()
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping deployment workers...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        processes = {}
+        for index in range(workers):
+            processes[index] = self._spawn(index, poll_interval, stop_event)
+        self.stdout.write(self.style.SUCCESS(f"{workers} deployment workers started"))
+
+        # مراقبة العمّال وإعادة تشغيل من يموت منهم
+        while not stop_event.is_set():
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    logger.warning(f"Deployment worker {index} exited with code {process.exitcode}, restarting")
+                    processes[index] = self._spawn(index, poll_interval, stop_event)
+            time.sleep(1)
+
+        for process in processes.values():
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Deployment workers stopped"))
+
+    def _spawn(self, index, poll_interval, stop_event):
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(index, poll_interval, stop_event),
+            name=f"deployment-worker-{index}",
+        )
+        process.start()
+        return process
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from deployments.images import (
+    IMAGE_CACHE_DISK_BUDGET, IMAGE_PULL_WORKERS,
+    evict_images, get_catalog_images, get_host_name, get_image_hosts, warm_images,
+)
+from projects.models import AvailableProject
+
+
+class Command(BaseCommand):
+    help = "سحب صور مشاريع الكتالوج مسبقاً وحذف الصور الأقل استخداماً عند تجاوز الـ disk budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", nargs="+", type=int, help="مشاريع محددة فقط")
+        parser.add_argument("--workers", type=int, default=IMAGE_PULL_WORKERS, help="عدد عمليات السحب المتوازية")
+        parser.add_argument("--budget", type=int, default=IMAGE_CACHE_DISK_BUDGET // 1024 ** 2, help="الحد الأقصى بالـ MB")
+        parser.add_argument("--no-evict", action="store_true", help="بدون حذف أي صورة")
+        parser.add_argument("--evict-only", action="store_true", help="تطبيق الـ budget فقط بدون سحب")
+
+    def handle(self, *args, **options):
+        if not options["evict_only"]:
+            projects = None
+            if options["project"]:
+                projects = AvailableProject.objects.filter(id__in=options["project"])
+            references = get_catalog_images(projects)
+            nodes = get_image_hosts()
+            self.stdout.write(
+                f"Pulling {len(references)} images on {len(nodes)} hosts with {options['workers']} workers"
+            )
+
+            for cached in warm_images(references, workers=options["workers"], nodes=nodes):
+                host = get_host_name(cached.node)
+                if cached.status == "pulled":
+                    self.stdout.write(self.style.SUCCESS(
+                        f"OK   {host} {cached.reference} {cached.size_bytes // 1024 ** 2} MB"
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f"FAIL {host} {cached.reference} {cached.error_message}"))
+
+        if not options["no_evict"]:
+            evicted = evict_images(options["budget"] * 1024 ** 2)
+            self.stdout.write(f"{len(evicted)} images evicted")
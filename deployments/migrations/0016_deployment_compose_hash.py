@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0015_deploymentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='compose_hash',
+            field=models.CharField(blank=True, help_text='sha256 لمدخلات آخر render لـ compose_template', max_length=64, null=True),
+        ),
+    ]
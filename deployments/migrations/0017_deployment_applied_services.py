@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0016_deployment_compose_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='applied_services',
+            field=models.JSONField(blank=True, default=dict, help_text='{service: sha256} لآخر إعدادات طُبقت فعلياً على Docker'),
+        ),
+    ]
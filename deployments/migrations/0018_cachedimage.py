@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0017_deployment_applied_services'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(help_text='image:tag كما في docker_compose_template', max_length=255, unique=True)),
+                ('digest', models.CharField(blank=True, max_length=255, null=True)),
+                ('image_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('pulled', 'Pulled'), ('failed', 'Failed'), ('evicted', 'Evicted')], default='pending', max_length=20)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('pulled_at', models.DateTimeField(blank=True, null=True)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['reference'],
+                'indexes': [models.Index(fields=['status', 'last_used_at'], name='deployments_status_982092_idx')],
+            },
+        ),
+    ]
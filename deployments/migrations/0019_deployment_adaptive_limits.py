@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0018_cachedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='adaptive_limits',
+            field=models.BooleanField(default=False, help_text='توزيع موارد الخطة بين الحاويات حسب الاستهلاك الفعلي'),
+        ),
+    ]
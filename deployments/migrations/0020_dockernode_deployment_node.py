@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0019_deployment_adaptive_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DockerNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='اسم الـ host في fleet و capacity', max_length=100, unique=True)),
+                ('base_url', models.CharField(help_text='tcp://10.0.0.5:2376 أو ssh://user@host أو unix:///path/docker.sock', max_length=255)),
+                ('tls_verify', models.BooleanField(default=False)),
+                ('cert_path', models.CharField(blank=True, help_text='مجلد ca.pem / cert.pem / key.pem', max_length=255, null=True)),
+                ('cpu', models.DecimalField(blank=True, decimal_places=1, help_text='عدد الأنوية', max_digits=5, null=True)),
+                ('ram', models.PositiveIntegerField(blank=True, help_text='RAM بالـ MB', null=True)),
+                ('storage', models.PositiveIntegerField(blank=True, help_text='Storage بالـ MB', null=True)),
+                ('is_active', models.BooleanField(default=True, help_text='الـ nodes غير النشطة لا تستقبل Deployments جديدة')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='deployment',
+            name='node',
+            field=models.ForeignKey(blank=True, help_text='Docker host الذي وُضع عليه الـ Deployment (فارغ => الـ daemon المحلي)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deployments', to='deployments.dockernode'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0020_dockernode_deployment_node'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deploymentbackup',
+            name='compression',
+            field=models.CharField(blank=True, help_text='zstd / pigz / gzip / none', max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='deploymentbackup',
+            name='uncompressed_size_mb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deploymentbackup',
+            name='throughput_mb_s',
+            field=models.FloatField(blank=True, help_text='سرعة النسخ (MB/s من البيانات قبل الضغط)', null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0021_deploymentbackup_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='sha256 لمحتوى الـ chunk', max_length=64, unique=True)),
+                ('size', models.PositiveIntegerField(help_text='الحجم قبل الضغط بالبايت')),
+                ('stored_size', models.PositiveIntegerField(help_text='الحجم على القرص بالبايت')),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount'], name='deployments_refcoun_748141_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='deploymentbackup',
+            name='snapshot',
+            field=models.CharField(blank=True, help_text='معرف الـ snapshot في مستودع الـ chunks', max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='deploymentbackup',
+            name='backup_type',
+            field=models.CharField(choices=[('full', 'Full (Files + Database)'), ('files', 'Files Only'), ('db', 'Database Only'), ('snapshot', 'Incremental Files (deduplicated)')], default='full', max_length=10),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0022_backupchunk_deploymentbackup_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backup_type', models.CharField(choices=[('full', 'Full (Files + Database)'), ('files', 'Files Only'), ('db', 'Database Only'), ('snapshot', 'Incremental Files (deduplicated)')], default='snapshot', max_length=10)),
+                ('frequency', models.CharField(choices=[('hourly', 'Hourly'), ('daily', 'Daily'), ('weekly', 'Weekly')], default='daily', max_length=10)),
+                ('keep_last', models.PositiveIntegerField(default=3)),
+                ('keep_hourly', models.PositiveIntegerField(default=0)),
+                ('keep_daily', models.PositiveIntegerField(default=7)),
+                ('keep_weekly', models.PositiveIntegerField(default=4)),
+                ('keep_monthly', models.PositiveIntegerField(default=6)),
+                ('is_active', models.BooleanField(default=True)),
+                ('next_run_at', models.DateTimeField(blank=True, help_text='يُحسب تلقائياً بإزاحة ثابتة لكل policy + jitter', null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backup_policies', to='deployments.deployment')),
+            ],
+            options={
+                'ordering': ['deployment_id', 'frequency'],
+                'indexes': [models.Index(fields=['is_active', 'next_run_at'], name='deployments_is_acti_46ab88_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='deploymentbackup',
+            name='policy',
+            field=models.ForeignKey(blank=True, help_text='الـ policy التي أنشأت النسخة (فارغ للنسخ اليدوية التي لا تُحذف تلقائياً)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='backups', to='deployments.backuppolicy'),
+        ),
+    ]
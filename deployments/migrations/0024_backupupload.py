@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0023_backuppolicy_deploymentbackup_policy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackupUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('backup_type', models.CharField(choices=[('full', 'Full (Files + Database)'), ('files', 'Files Only'), ('db', 'Database Only'), ('snapshot', 'Incremental Files (deduplicated)')], default='full', max_length=10)),
+                ('size', models.BigIntegerField(help_text='الحجم الكامل بالبايت كما أعلنه العميل')),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('received', models.BigIntegerField(default=0, help_text='عدد البايتات المكتوبة والمؤكدة')),
+                ('chunk_digests', models.JSONField(blank=True, default=list, help_text='sha256 لكل chunk مكتوب')),
+                ('file_path', models.CharField(max_length=512)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='deployments.deployment')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='deployments_status_e40c05_idx')],
+            },
+        ),
+    ]
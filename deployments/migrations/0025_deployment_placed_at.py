@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def mark_existing_placements(apps, schema_editor):
+    # Deployments بدأ نشرها (أو لها node) موجودة فعلاً على host ولا يُعاد وضعها
+    Deployment = apps.get_model('deployments', 'Deployment')
+    Deployment.objects.filter(Q(node__isnull=False) | Q(progress__in=[3, 4, 5])).update(placed_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0024_backupupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='placed_at',
+            field=models.DateTimeField(blank=True, help_text='وقت اختيار الـ host، بعدها لا يتغير node (حتى إذا كان المحلي)', null=True),
+        ),
+        migrations.RunPython(mark_existing_placements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0025_deployment_placed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deployment',
+            name='node',
+            field=models.ForeignKey(blank=True, help_text='Docker host الذي وُضع عليه الـ Deployment (فارغ => الـ daemon المحلي)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='deployments', to='deployments.dockernode'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0026_alter_deployment_node'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dockernode',
+            name='shared_storage',
+            field=models.BooleanField(default=False, help_text='/var/lib/containers و /mnt على هذا الـ host هي نفس مسارات العامل (قرص محلي أو block device مشترك، ليس NFS)'),
+        ),
+    ]
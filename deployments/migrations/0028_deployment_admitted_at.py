@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_admissions(apps, schema_editor):
+    # Deployments موضوعة على host ولم يرفضها admission control تحجز مواردها كما كانت
+    Deployment = apps.get_model('deployments', 'Deployment')
+    (
+        Deployment.objects.filter(placed_at__isnull=False, progress__in=[3, 4, 5])
+        .exclude(notes__startswith='Rejected by admission control')
+        .update(admitted_at=F('placed_at'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0027_dockernode_shared_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='admitted_at',
+            field=models.DateTimeField(blank=True, help_text='وقت القبول في admission control، من بعده يحجز موارد خطته ما دام نشطاً', null=True),
+        ),
+        migrations.RunPython(mark_existing_admissions, migrations.RunPython.noop),
+    ]
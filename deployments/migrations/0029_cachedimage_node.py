@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0028_deployment_admitted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedimage',
+            name='node',
+            field=models.ForeignKey(blank=True, help_text='فارغ => الـ daemon المحلي', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='cached_images', to='deployments.dockernode'),
+        ),
+        migrations.AlterField(
+            model_name='cachedimage',
+            name='reference',
+            field=models.CharField(help_text='image:tag كما في docker_compose_template', max_length=255),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cachedimage',
+            unique_together={('reference', 'node')},
+        ),
+    ]
@@ -13,6 +13,13 @@ import logging
 import yaml
 import shutil
 import uuid
+import hashlib
+import json
+from .docker_client import get_deployment_client
+from .storage import apply_project_quota, get_project_id, grow_xfs_image
+from .placeholders import PlaceholderResolver, render_template
+from .volume_pool import claim_image
+from .limits import calculate_target_limits, to_compose_limits
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
@@ -30,6 +37,60 @@ SERVICE_STATUS = [
     (3, 'Undefined'),
 ]
 
+# حقول Deployment التي لا تؤثر على ناتج الـ compose (لا تدخل في compose_hash)
+COMPOSE_HASH_EXCLUDE = {
+    "compose_template", "compose_hash", "applied_services", "adaptive_limits", "progress", "status", "is_active",
+    "used_ram", "used_storage", "used_cpu", "notes", "created_at", "updated_at", "node_id", "placed_at",
+    "admitted_at",
+}
+# يُزاد عند تغيير منطق render_dc_compose: كل compose_hash المخزنة تصبح قديمة ويُعاد توليد القوالب
+COMPOSE_RENDER_VERSION = 2
+
+
+class DockerNode(models.Model):
+    """Docker host يمكن وضع Deployments عليه (انظر deployments.placement)"""
+    name = models.CharField(max_length=100, unique=True, help_text="اسم الـ host في fleet و capacity")
+    base_url = models.CharField(max_length=255, help_text="tcp://10.0.0.5:2376 أو ssh://user@host أو unix:///path/docker.sock")
+    tls_verify = models.BooleanField(default=False)
+    cert_path = models.CharField(max_length=255, blank=True, null=True, help_text="مجلد ca.pem / cert.pem / key.pem")
+
+    # فارغ => من docker info (storage لا يمكن قياسه عبر Docker API للـ nodes البعيدة)
+    cpu = models.DecimalField(max_digits=5, decimal_places=1, blank=True, null=True, help_text="عدد الأنوية")
+    ram = models.PositiveIntegerField(blank=True, null=True, help_text="RAM بالـ MB")
+    storage = models.PositiveIntegerField(blank=True, null=True, help_text="Storage بالـ MB")
+
+    is_active = models.BooleanField(default=True, help_text="الـ nodes غير النشطة لا تستقبل Deployments جديدة")
+    # صور XFS و project quota و mount_dir والنسخ الاحتياطية تُدار على filesystem العامل
+    shared_storage = models.BooleanField(
+        default=False,
+        help_text="/var/lib/containers و /mnt على هذا الـ host هي نفس مسارات العامل (قرص محلي أو block device مشترك، ليس NFS)",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return f"{self.name} ({self.base_url})"
+
+    def get_tls_config(self):
+        if not self.tls_verify:
+            return None
+        cert_path = self.cert_path or ""
+        return docker.tls.TLSConfig(
+            client_cert=(os.path.join(cert_path, "cert.pem"), os.path.join(cert_path, "key.pem")),
+            ca_cert=os.path.join(cert_path, "ca.pem"),
+            verify=True,
+        )
+
+    def get_capacity(self):
+        """السعة المحددة يدوياً فقط {"cpu", "ram", "storage"} (None => يُكتشف تلقائياً)"""
+        return {
+            "cpu": float(self.cpu) if self.cpu is not None else None,
+            "ram": self.ram,
+            "storage": self.storage,
+        }
+
 
 class Deployment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -37,6 +98,20 @@ class Deployment(models.Model):
     deployment_name = models.CharField(max_length=50, blank=True, null=True)
     compose_template = models.TextField(null=True, blank=True)
     uuid_cache = models.JSONField(default=dict, blank=True)
+    compose_hash = models.CharField(max_length=64, blank=True, null=True, help_text="sha256 لمدخلات آخر render لـ compose_template")
+    applied_services = models.JSONField(default=dict, blank=True, help_text="{service: sha256} لآخر إعدادات طُبقت فعلياً على Docker")
+    adaptive_limits = models.BooleanField(default=False, help_text="توزيع موارد الخطة بين الحاويات حسب الاستهلاك الفعلي")
+    # PROTECT: حذف node عليه Deployments كان سينقلها بصمت إلى الـ daemon المحلي (بدون حاوياتها)
+    node = models.ForeignKey(
+        DockerNode, on_delete=models.PROTECT, blank=True, null=True, related_name="deployments",
+        help_text="Docker host الذي وُضع عليه الـ Deployment (فارغ => الـ daemon المحلي)"
+    )
+    placed_at = models.DateTimeField(
+        blank=True, null=True, help_text="وقت اختيار الـ host، بعدها لا يتغير node (حتى إذا كان المحلي)"
+    )
+    admitted_at = models.DateTimeField(
+        blank=True, null=True, help_text="وقت القبول في admission control، من بعده يحجز موارد خطته ما دام نشطاً"
+    )
 
     ip_address = models.GenericIPAddressField(blank=True, null=True)
     version = models.CharField(max_length=50, default="1.0")
@@ -63,7 +138,7 @@ class Deployment(models.Model):
         """ترجع الاشتراك المرتبط بهذا الـ Deployment أو None"""
         from plans.models import Subscription
         try:
-            return Subscription.objects.get(deployment=self)
+            return Subscription.objects.select_related("plan").get(deployment=self)
         except Subscription.DoesNotExist:
             return None
         
@@ -114,8 +189,17 @@ class Deployment(models.Model):
             "system": system
         }
 
+    def check_storage_access(self):
+        """خطوات الـ volume تعمل على filesystem العامل: الـ node يجب أن يشاركه بنفس المسارات"""
+        if self.node_id and not self.node.shared_storage:
+            raise RuntimeError(
+                f"Node {self.node.name} does not share /var/lib/containers with this worker, "
+                f"the volume of deployment {self.id} cannot be managed"
+            )
+
     def create_xfs_volume(self, size_mb=1024):
         """إنشاء volume مركزي لكل Deployment مع تسجيل الأحداث"""
+        self.check_storage_access()
 
         storage_data = self.get_volume_storage_data
         volume_name = storage_data["volume_name"]
@@ -126,21 +210,22 @@ class Deployment(models.Model):
         logger.info(f"Creating XFS volume '{volume_name}' for deployment {self.id} on {system}")
 
         os.makedirs(os.path.dirname(img_path), exist_ok=True)
-        client = docker.from_env()
-        existing_volumes = [v.name for v in client.volumes.list()]
+        client = get_deployment_client(self)
 
         try:
+            try:
+                volume = client.volumes.get(volume_name)
+            except docker.errors.NotFound:
+                volume = None
+
             if system != "Windows":
                 logger.info(f"Preparing XFS file at {img_path} ({size_mb} MB)")
                 if not os.path.exists(img_path) or os.path.getsize(img_path) == 0:
-                    with open(img_path, "wb") as f:
-                        f.truncate(size_mb * 1024 * 1024)
-                    logger.info(f"File {img_path} created, formatting XFS")
-                    subprocess.run(["mkfs.xfs", "-f", img_path], check=True)
-                    logger.info(f"XFS formatting completed for {img_path}")
-
-                if volume_name in existing_volumes:
-                    volume = client.volumes.get(volume_name)
+                    # صورة مُهيأة مسبقاً من الـ pool، وإلا التهيئة المباشرة
+                    if not claim_image(size_mb, img_path):
+                        self._format_xfs_image(img_path, size_mb)
+
+                if volume is not None:
                     logger.info(f"Volume '{volume_name}' already exists, using existing")
                 else:
                     volume = client.volumes.create(
@@ -150,11 +235,14 @@ class Deployment(models.Model):
                     )
                     logger.info(f"Volume '{volume_name}' created successfully with XFS")
 
+                # مجلدات الحاويات تُربط من mount_dir: نفرض حد الخطة عليه بـ XFS project quota
+                os.makedirs(mount_dir, exist_ok=True)
+                apply_project_quota(mount_dir, get_project_id(self.id), size_mb)
+
             else:
                 logger.info(f"Windows detected, using directory {img_path}")
                 os.makedirs(img_path, exist_ok=True)
-                if volume_name in existing_volumes:
-                    volume = client.volumes.get(volume_name)
+                if volume is not None:
                     logger.info(f"Volume '{volume_name}' already exists, using existing")
                 else:
                     volume = client.volumes.create(name=volume_name, driver="local")
@@ -166,6 +254,24 @@ class Deployment(models.Model):
             logger.exception(f"Failed to create volume '{volume_name}': {e}")
             raise
 
+    def resize_xfs_volume(self, size_mb):
+        """تكبير صورة الـ volume ورفع حد XFS project quota بدون إيقاف الحاويات"""
+        storage_data = self.get_volume_storage_data
+        if storage_data["system"] == "Windows":
+            return False
+        self.check_storage_access()
+
+        grown = grow_xfs_image(storage_data["img_path"], size_mb)
+        apply_project_quota(storage_data["mount_dir"], get_project_id(self.id), size_mb)
+        return grown
+
+    def _format_xfs_image(self, img_path, size_mb):
+        with open(img_path, "wb") as f:
+            f.truncate(size_mb * 1024 * 1024)
+        logger.info(f"File {img_path} created, formatting XFS")
+        subprocess.run(["mkfs.xfs", "-f", img_path], check=True)
+        logger.info(f"XFS formatting completed for {img_path}")
+
     def remove_xfs_volume(self):
         """حذف volume مركزي للـ Deployment مع تسجيل الأحداث"""
 
@@ -177,7 +283,7 @@ class Deployment(models.Model):
 
         logger.info(f"Removing XFS volume '{volume_name}' for deployment {self.id} on {system}")
 
-        client = docker.from_env()
+        client = get_deployment_client(self)
 
         # حذف Docker volume
         try:
@@ -214,9 +320,23 @@ class Deployment(models.Model):
             return yaml.safe_load(self.compose_template) 
         return {}   
         
-    def render_dc_compose(self):
-        """Render docker-compose مع volumes فريدة لكل Deployment"""
+    def get_containers_index(self):
+        """{service_name: DeploymentContainer} باستعلام واحد"""
+        return {dc.service_name: dc for dc in self.containers.select_related("project_container")}
+
+    def render_dc_compose(self, containers=None, plan=None):
+        """
+        Render docker-compose مع volumes فريدة لكل Deployment
+        containers / plan يُجلبان مرة واحدة فقط (عدد الاستعلامات ثابت مهما كان عدد الـ services)
+        """
         logger = logging.getLogger(__name__)
+        if containers is None:
+            containers = self.get_containers_index()
+        if plan is None:
+            plan = self.plan
+        # نصيب كل حاوية من الخطة (نفس ما يطبقه reconcile_limits على الحاويات العاملة)
+        targets = calculate_target_limits(self, plan, containers.values())
+
         storage_data = self.get_volume_storage_data
         volume_base_path = storage_data["mount_dir"]
         os.makedirs(volume_base_path, exist_ok=True)
@@ -230,7 +350,9 @@ class Deployment(models.Model):
 
         for name, config in services.items():
             # الحصول على container_name و dc_name من DeploymentContainer
-            dc = DeploymentContainer.objects.get(deployment=self, service_name=name)
+            dc = containers.get(name)
+            if dc is None:
+                raise DeploymentContainer.DoesNotExist(f"No DeploymentContainer for service '{name}' in deployment {self.id}")
             new_name = dc.dc_name
             container_name = dc.container_name
             config["container_name"] = container_name
@@ -241,16 +363,14 @@ class Deployment(models.Model):
                 config["deploy"] = {"resources": {"limits": {}}}
             if "limits" not in config["deploy"]["resources"]:
                 config["deploy"]["resources"]["limits"] = {}
-            config["deploy"]["resources"]["limits"]["cpus"] = str(float(self.plan.cpu))
-            config["deploy"]["resources"]["limits"]["memory"] = f"{self.plan.ram}m"
+            config["deploy"]["resources"]["limits"].update(to_compose_limits(targets[container_name]))
 
             # depends_on محسّن باستخدام dc_name الصحيح
             if "depends_on" in config:
-                dcs = DeploymentContainer.objects.filter(deployment=self)
                 config["depends_on"] = [
-                    dcs.get(service_name=dep).dc_name
+                    containers[dep].dc_name
                     for dep in config["depends_on"]
-                    if dcs.filter(service_name=dep).exists()
+                    if dep in containers
                 ]
 
             # الشبكة: كل Deployment لديه شبكة واحدة + Traefik
@@ -293,166 +413,53 @@ class Deployment(models.Model):
 
 
 
-    def resolve_placeholders(self, value, context=None):
+    def get_placeholder_resolver(self, compose=None, containers=None):
+        """resolver واحد لكل render: الحاويات والـ compose يُجلبان مرة واحدة"""
+        if containers is None:
+            containers = self.get_containers_index()
+        if compose is None:
+            compose = self.render_dc_compose(containers=containers)
+        return PlaceholderResolver(self, compose, containers, self.uuid_cache)
+
+    def save_uuid_cache(self, resolver):
+        """حفظ uuid_cache مرة واحدة فقط إذا أُضيفت قيم جديدة أثناء الـ render"""
+        if resolver.uuid_cache_changed and self.uuid_cache != resolver.uuid_cache:
+            self.uuid_cache = dict(resolver.uuid_cache)
+            self.save(update_fields=["uuid_cache"])
+        resolver.uuid_cache_changed = False
+
+    def resolve_placeholders(self, value, resolver=None):
         """
         يدعم:
         {container.<service_name>.<field>}
         {deployment.<field>}
         {dc.<service_name>.<field>}
         {uuid.<cache_id>.<length>}
-        """
 
-        # تهيئة context لأول مرة
-        if context is None:
-            if not self.uuid_cache:
-                self.uuid_cache = {}
-            context = {
-                "deployment": self,
-                "compose": self.render_dc_compose(),
-                "_uuid_cache": dict(self.uuid_cache)  # نسخة آمنة
-            }
-
-        # recursive handling
-        if isinstance(value, dict):
-            return {
-                self.resolve_placeholders(k, context): self.resolve_placeholders(v, context)
-                for k, v in value.items()
-            }
-        if isinstance(value, list):
-            return [self.resolve_placeholders(v, context) for v in value]
-        if not isinstance(value, str):
-            return value
+        كل string يُترجم مرة واحدة (compile_string) وكل مرجع مختلف يُحل مرة واحدة.
+        عند تمرير resolver لا يتم الحفظ هنا، بل يتولاه من أنشأ الـ resolver.
+        """
+        owns_resolver = resolver is None
+        if owns_resolver:
+            resolver = self.get_placeholder_resolver()
 
-        pattern = re.compile(r"\{([^{}]+)\}")
+        resolved = render_template(value, resolver)
 
-        def replacer(match):
-            expr = match.group(1).strip()
-            parts = expr.split(".")
-            logger.debug("resolve_placeholder: expr=%s parts=%s", expr, parts)
+        if owns_resolver:
+            self.save_uuid_cache(resolver)
+        return resolved
 
-            try:
-                # ---- uuid.<cache_id>.<length> ----
-                if parts[0] == "uuid":
-                    cache_id = "default"
-                    length = 32
-
-                    if len(parts) == 2:
-                        if parts[1].isdigit():
-                            length = int(parts[1])
-                        else:
-                            cache_id = parts[1]
-                    elif len(parts) >= 3:
-                        cache_id = parts[1]
-                        if parts[2].isdigit():
-                            length = int(parts[2])
-
-                    if "_uuid_cache" not in context:
-                        context["_uuid_cache"] = {}
-
-                    cache_key = f"uuid.{cache_id}.{length}"
-
-                    # استخدم القديم إذا موجود، وإلا خزّن جديد
-                    if cache_key not in context["_uuid_cache"]:
-                        raw_uuid = uuid.uuid4().hex
-                        context["_uuid_cache"][cache_key] = raw_uuid[:length]
-
-                    result = context["_uuid_cache"][cache_key]
-                    logger.debug("uuid resolved: %s -> %s", expr, result)
-                    return result
-
-                # ---- dc.<service_name>.<field> ----
-                if parts[0] == "dc" and len(parts) >= 3:
-                    service_name = parts[1]
-                    subkeys = parts[2:]
-
-                    dc_obj = DeploymentContainer.objects.filter(
-                        deployment=self, service_name=service_name
-                    ).first()
-                    if not dc_obj:
-                        logger.debug("dc not found: deployment=%s service_name=%s", self.id, service_name)
-                        return match.group(0)
-
-                    node = dc_obj
-                    for k in subkeys:
-                        node = getattr(node, k, None)
-                        if node is None:
-                            logger.debug("dc field not found: %s on %s", k, dc_obj)
-                            return match.group(0)
-
-                    return str(node)
-
-                # ---- container.<service_name>.<field> ----
-                if parts[0] == "container" and len(parts) >= 2:
-                    service_name = parts[1]
-                    subkeys = parts[2:]
-
-                    services = context.get("compose", {}).get("services", {})
-                    node = None
-                    new_service_name = None
-                    for svc_name, svc_conf in services.items():
-                        if svc_conf.get("service_name") == service_name:
-                            node = svc_conf
-                            new_service_name = svc_name
-                            break
-
-                    if node is None:
-                        logger.debug("container with service_name %s not found", service_name)
-                        return match.group(0)
-
-                    if not subkeys:
-                        return new_service_name
-
-                    for k in subkeys:
-                        node = node.get(k) if isinstance(node, dict) else None
-                        if node is None:
-                            logger.debug("field %s not found in container %s", k, service_name)
-                            return match.group(0)
-
-                    return str(node)
-
-                # ---- deployment.<field> ----
-                if parts[0] == "deployment" and len(parts) >= 2:
-                    node = self
-                    for k in parts[1:]:
-                        node = getattr(node, k, None)
-                        if node is None:
-                            logger.debug("deployment field not found: %s", k)
-                            return match.group(0)
-                    return str(node)
-
-                return match.group(0)
-
-            except Exception as e:
-                logger.exception("Error while resolving placeholder %s: %s", expr, e)
-                return match.group(0)
-
-        # كرر الاستبدال عدة مرات (عشان nested placeholders)
-        prev = value
-        for _ in range(5):
-            new = pattern.sub(replacer, prev)
-            if new == prev:
-                break
-            prev = new
-
-        # تحديث uuid_cache وحفظه إذا تغير
-        if "_uuid_cache" in context:
-            if self.uuid_cache != context["_uuid_cache"]:
-                self.uuid_cache = context["_uuid_cache"]
-                self.save(update_fields=["uuid_cache"])
-
-        return prev
-
-
-
-
-    def get_resolved_compose(self):
+    def get_resolved_compose(self, containers=None, plan=None):
         """
-        نحصل على compose المعد (render_dc_compose) ثم نمرره كـ context
-        ثم نستدعي resolve_placeholders مرة واحدة على whole structure (recursive)
+        نحصل على compose المعد (render_dc_compose) ثم نترجمه كقالب واحد
+        ونحل جميع الـ placeholders في مرور واحد مع حفظ uuid_cache مرة واحدة على الأكثر
         """
-        compose = self.render_dc_compose()
-        context = {"deployment": self, "compose": compose, "_uuid_cache": dict(self.uuid_cache) or {}}
-        resolved = self.resolve_placeholders(compose, context=context)
+        if containers is None:
+            containers = self.get_containers_index()
+        compose = self.render_dc_compose(containers=containers, plan=plan)
+        resolver = self.get_placeholder_resolver(compose=compose, containers=containers)
+        resolved = render_template(compose, resolver)
+        self.save_uuid_cache(resolver)
         return resolved
 
 
@@ -465,8 +472,8 @@ class Deployment(models.Model):
         resolved_compose = self.get_resolved_compose()
         return resolved_compose
 
-    def render_docker_resolved_compose_template(self):
-        resolved = self.get_resolved_compose()
+    def render_docker_resolved_compose_template(self, containers=None, plan=None):
+        resolved = self.get_resolved_compose(containers=containers, plan=plan)
 
         # فلترة recursive لحذف أي service_name
         def remove_service_name(d):
@@ -482,6 +489,77 @@ class Deployment(models.Model):
         cleaned = remove_service_name(resolved)
         return yaml.dump(cleaned, sort_keys=False, default_flow_style=False)
 
+    # ------------------- Compose Cache -------------------
+    def get_compose_hash(self, containers=None, plan=None):
+        """
+        sha256 لكل ما يؤثر على ناتج render_docker_resolved_compose_template:
+        قالب المشروع، صفوف الحاويات، قيم متغيرات البيئة، الخطة، uuid_cache،
+        حدود الموارد المحسوبة (أوزان أنواع الحاويات) وإصدار الـ render
+        """
+        if containers is None:
+            containers = self.get_containers_index()
+        if plan is None:
+            plan = self.plan
+
+        env_values = list(
+            DeploymentContainerEnvVar.objects.filter(container__deployment=self)
+            .order_by("container_id", "var_id", "id")
+            .values_list("container_id", "var_id", "value")
+        )
+        payload = {
+            "template": self.project.docker_compose_template,
+            "deployment": {
+                f.attname: getattr(self, f.attname)
+                for f in self._meta.concrete_fields
+                if f.attname not in COMPOSE_HASH_EXCLUDE
+            },
+            "containers": [
+                {f.attname: getattr(dc, f.attname) for f in dc._meta.concrete_fields if f.attname != "status"}
+                for dc in sorted(containers.values(), key=lambda dc: dc.id)
+            ],
+            "env": env_values,
+            "plan": [plan.id, str(plan.cpu), plan.ram, plan.storage],
+            "targets": calculate_target_limits(self, plan, containers.values()),
+            "renderer": COMPOSE_RENDER_VERSION,
+        }
+        raw = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def refresh_compose_template(self, force=False):
+        """
+        إعادة توليد compose_template فقط إذا تغيرت مدخلاته.
+        ترجع True إذا تم التوليد من جديد.
+        """
+        containers = self.get_containers_index()
+        plan = self.plan
+
+        if not force and self.compose_template and self.compose_hash == self.get_compose_hash(containers, plan):
+            logger.info(f"Compose for deployment {self.id} is up to date, render skipped")
+            return False
+
+        self.compose_template = self.render_docker_resolved_compose_template(containers=containers, plan=plan)
+        # الـ hash بعد الـ render لأن uuid_cache قد يتغير أثناءه
+        self.compose_hash = self.get_compose_hash(containers, plan)
+        self.save(update_fields=["compose_template", "compose_hash", "updated_at"])
+        return True
+
+    def get_service_hashes(self):
+        """{service: sha256} لإعدادات كل service في compose_template الحالي"""
+        compose = self.render_deployment_compose()
+        hashes = {}
+        for name, config in (compose.get("services") or {}).items():
+            raw = json.dumps(config, sort_keys=True, default=str)
+            hashes[name] = hashlib.sha256(raw.encode()).hexdigest()
+        return hashes
+
+    def get_changed_services(self):
+        """(changed, removed) مقارنة بـ applied_services"""
+        hashes = self.get_service_hashes()
+        applied = self.applied_services or {}
+        changed = [name for name, digest in hashes.items() if applied.get(name) != digest]
+        removed = [name for name in applied if name not in hashes]
+        return changed, removed
+
 
 class DeploymentContainer(models.Model):
     STATUS_CHOICES = [(1,'Pending'),(2,'Running'),(3,'Error')]
@@ -537,35 +615,12 @@ class DeploymentContainer(models.Model):
 
     # ---------------- حساب تقسيم الموارد ----------------
     def calculate_resource_limits(self):
-        deployment = self.deployment
-        plan_ram_mb = float(getattr(deployment.plan, "ram", 512))
-        plan_cpu = float(getattr(deployment.plan, "cpu", 0.5))
-        containers = list(deployment.containers.all())
-        limits = {}
-
-        # تصنيف حسب النوع
-        backends = [c for c in containers if c.project_container.type in ("backend", "backfront")]
-        frontends = [c for c in containers if c.project_container.type == "frontend"]
-        redis_containers = [c for c in containers if c.project_container.type == "redis"]
-
-        total_weight = len(backends)*2 + len(frontends)*1 + len(redis_containers)*0.5
-
-        for c in containers:
-            if c.project_container.type in ("backend", "backfront"):
-                weight = 2
-            elif c.project_container.type == "frontend":
-                weight = 1
-            else:  # redis أو غيره
-                weight = 0.5
-
-            ram_for_container = int(plan_ram_mb * (weight/total_weight))
-            cpu_for_container = plan_cpu * (weight/total_weight)
-            limits[c.container_name] = {
-                "mem": f"{ram_for_container}m",
-                "cpu": int(cpu_for_container)
-            }
-
-        return limits
+        """{container_name: {"mem": "256m", "cpu": 0.5}} لكل حاويات الـ Deployment (أوزان limits.py)"""
+        targets = calculate_target_limits(self.deployment)
+        return {
+            name: {"mem": to_compose_limits(target)["memory"], "cpu": target["nano_cpus"] / 1_000_000_000}
+            for name, target in targets.items()
+        }
 
     def filter_labels(self):
         """
@@ -613,7 +668,7 @@ class DeploymentContainer(models.Model):
         """
         تُرجع dict جاهز للاستخدام مع docker-py:
         
-        docker.from_env().containers.run(**config)
+        get_deployment_client(self.deployment).containers.run(**config)
         """
         if not self.project_container:
             raise ValueError("لا يوجد ProjectContainer مرتبط بهذا الـ DeploymentContainer")
@@ -650,7 +705,9 @@ class DeploymentContainer(models.Model):
         env_vars = {**env_vars, **self.get_env_vars()}
 
         # حل جميع المتغيرات، بما فيها الرجوع للكونتينرات الأخرى
-        final_env = {k: self.resolve_placeholders(v) for k, v in env_vars.items()}
+        resolver = deployment.get_placeholder_resolver()
+        final_env = deployment.resolve_placeholders(env_vars, resolver)
+        deployment.save_uuid_cache(resolver)
         
         config["environment"] = final_env
         
@@ -816,7 +873,45 @@ class DeploymentContainerEnvVar(models.Model):
 
 
 # deployments/models.py
+import io
 import tarfile
+import tempfile
+from .compression import compress_command, decompress_command, get_codec
+from .db_backup import DB_EXTENSIONS, dump_database, get_db_format, restore_database
+
+BACKUP_MANIFEST = "manifest.json"
+
+
+def read_backup_manifest(path):
+    """manifest الخاص بـ full backup (tar بدون ضغط)، أو None لأي صيغة أخرى"""
+    try:
+        with tarfile.open(path, "r:") as tar:
+            member = tar.next()
+            if member is None or member.name != BACKUP_MANIFEST:
+                return None
+            return json.load(tar.extractfile(member))
+    except (tarfile.ReadError, ValueError):
+        return None
+
+
+def extract_backup_member(tar, name, dest_dir):
+    """
+    نسخ ملف واحد من أرشيف full backup إلى dest_dir/name.
+    name يأتي من manifest مرفوع من المستخدم: اسم ملف فقط (بدون مجلدات أو ..) ولملف عادي فقط.
+    """
+    if not isinstance(name, str) or name in ("", ".", "..") or name != os.path.basename(name) or "\\" in name:
+        raise RuntimeError(f"Invalid backup member name {name!r}")
+    try:
+        member = tar.getmember(name)
+    except KeyError:
+        raise RuntimeError(f"Backup member {name!r} not found")
+    if not member.isfile():
+        raise RuntimeError(f"Backup member {name!r} is not a regular file")
+
+    path = os.path.join(dest_dir, name)
+    with tar.extractfile(member) as src, open(path, "xb") as dst:
+        shutil.copyfileobj(src, dst)
+    return path
 
 
 
@@ -827,6 +922,7 @@ class DeploymentBackup(models.Model):
         ("full", "Full (Files + Database)"),
         ("files", "Files Only"),
         ("db", "Database Only"),
+        ("snapshot", "Incremental Files (deduplicated)"),
     ]
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -846,6 +942,14 @@ class DeploymentBackup(models.Model):
     restored = models.BooleanField(default=False)
     error_message = models.TextField(blank=True, null=True)
     backup_summary = models.CharField(max_length=255, blank=True, null=True, help_text="Summary of what was backed up")
+    compression = models.CharField(max_length=10, blank=True, null=True, help_text="zstd / pigz / gzip / none")
+    uncompressed_size_mb = models.PositiveIntegerField(null=True, blank=True)
+    throughput_mb_s = models.FloatField(null=True, blank=True, help_text="سرعة النسخ (MB/s من البيانات قبل الضغط)")
+    snapshot = models.CharField(max_length=32, blank=True, null=True, help_text="معرف الـ snapshot في مستودع الـ chunks")
+    policy = models.ForeignKey(
+        "BackupPolicy", on_delete=models.SET_NULL, null=True, blank=True, related_name="backups",
+        help_text="الـ policy التي أنشأت النسخة (فارغ للنسخ اليدوية التي لا تُحذف تلقائياً)",
+    )
 
     class Meta:
         ordering = ["-created_at"]
@@ -866,6 +970,7 @@ class DeploymentBackup(models.Model):
         files_backed_up = False
         db_backed_up = False
         backup_file = None
+        self._compression_stats = []
 
         try:
             os.makedirs("/var/lib/containers/backups", exist_ok=True)
@@ -877,6 +982,13 @@ class DeploymentBackup(models.Model):
                 except Exception as e:
                     logger.warning(f"Files backup failed: {e}")
 
+            if self.backup_type == "snapshot":
+                try:
+                    backup_file = self._backup_snapshot()
+                    files_backed_up = True
+                except Exception as e:
+                    logger.warning(f"Snapshot backup failed: {e}")
+
             if self.backup_type in ["full", "db"]:
                 try:
                     backup_file_db = self._backup_database()
@@ -886,15 +998,12 @@ class DeploymentBackup(models.Model):
                 except Exception as e:
                     logger.error(f"Database backup failed: {e}", exc_info=True)
 
-            # دمج الملفات في حالة full backup
+            # full backup: الأجزاء مضغوطة مسبقاً فتُجمع في tar بدون ضغط مع manifest
             if self.backup_type == "full":
-                timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-                backup_file = f"/var/lib/containers/backups/deployment_{self.deployment.id}_full_{timestamp}.tar.gz"
-                with tarfile.open(backup_file, "w:gz") as tar:
-                    if files_backed_up and os.path.exists(backup_file_files):
-                        tar.add(backup_file_files, arcname=os.path.basename(backup_file_files))
-                    if db_backed_up and os.path.exists(backup_file_db):
-                        tar.add(backup_file_db, arcname=os.path.basename(backup_file_db))
+                backup_file = self._bundle_full(
+                    files_path=backup_file_files if files_backed_up else None,
+                    db_path=backup_file_db if db_backed_up else None,
+                )
             elif self.backup_type == "files":
                 backup_file = backup_file_files
             elif self.backup_type == "db":
@@ -920,7 +1029,11 @@ class DeploymentBackup(models.Model):
             if backup_file and os.path.exists(backup_file):
                 self.file_path = backup_file
                 self.size_mb = int(os.path.getsize(backup_file) / (1024 * 1024))
-                logger.info(f"Backup completed: {backup_file} ({self.size_mb} MB)")
+                self._record_throughput()
+                logger.info(
+                    f"Backup completed: {backup_file} ({self.size_mb} MB, {self.compression}, "
+                    f"{self.throughput_mb_s or 0} MB/s)"
+                )
             else:
                 if self.status != "failed":
                     self.status = "failed"
@@ -937,6 +1050,33 @@ class DeploymentBackup(models.Model):
 
         return self.file_path
 
+    def _record_throughput(self):
+        """الحجم قبل الضغط وسرعة الضغط (MB/s من البيانات الأصلية)"""
+        if self.snapshot:
+            # size_mb = البيانات الجديدة فعلياً في المستودع، وليس حجم الـ manifest
+            stats = self._snapshot_stats
+            self.compression = "chunks"
+            self.size_mb = int(stats["new_bytes"] / (1024 * 1024))
+            self.uncompressed_size_mb = int(stats["total_bytes"] / (1024 * 1024))
+            self.throughput_mb_s = round(stats["total_bytes"] / (1024 * 1024) / stats["duration"], 2) if stats["duration"] else None
+            self.backup_summary += f" ({stats['files'] - stats['reused_files']} of {stats['files']} files changed)"
+            return
+
+        stats = self._compression_stats
+        if not stats:
+            return
+        raw_bytes = sum(s["raw_bytes"] for s in stats)
+        duration = sum(s["duration"] for s in stats)
+        self.compression = stats[0]["codec"]
+        self.uncompressed_size_mb = int(raw_bytes / (1024 * 1024))
+        self.throughput_mb_s = round(raw_bytes / (1024 * 1024) / duration, 2) if duration else None
+
+    def remove_files(self):
+        """حذف ملف النسخة (الـ snapshot يُحرر عند حذف الصف، انظر signals.release_backup_snapshot)"""
+        if not self.snapshot and self.file_path and os.path.exists(self.file_path):
+            os.remove(self.file_path)
+            logger.info(f"Backup file deleted: {self.file_path}")
+
     # ---------------------------
     # Restore النسخة الاحتياطية
     # ---------------------------
@@ -962,47 +1102,89 @@ class DeploymentBackup(models.Model):
     def _backup_files(self):
         storage_data = self.deployment.get_volume_storage_data
         mount_dir = storage_data["mount_dir"]
+        codec = get_codec()
         timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-        backup_file = f"/var/lib/containers/backups/deployment_{self.deployment.id}_files_{timestamp}.tar.gz"
+        backup_file = f"/var/lib/containers/backups/deployment_{self.deployment.id}_files_{timestamp}.tar{codec.extension}"
 
-        logger.info(f"Backing up files to {backup_file}")
-        with tarfile.open(backup_file, "w:gz") as tar:
-            if os.path.exists(mount_dir):
-                tar.add(mount_dir, arcname=f"deployment_{self.deployment.id}_data")
+        logger.info(f"Backing up files to {backup_file} ({codec.name})")
+        if os.path.exists(mount_dir):
+            cmd = ["tar", "-C", mount_dir, "-cf", "-", "."]
+        else:
+            cmd = ["tar", "-cf", "-", "-T", "/dev/null"]  # أرشيف فارغ كما في السابق
+        self._compression_stats.append(compress_command(cmd, backup_file, codec))
         return backup_file
 
+    # ---------------------------
+    # نسخ تزايدي إلى مستودع الـ chunks
+    # ---------------------------
+    def _backup_snapshot(self):
+        """
+        snapshot لـ mount_dir: الملفات التي لم يتغير حجمها و mtime منذ آخر snapshot لا تُقرأ،
+        والـ chunks الموجودة مسبقاً لا تُكتب. ترجع مسار الـ manifest.
+        """
+        from .backup_store import ChunkStore, create_snapshot
+
+        mount_dir = self.deployment.get_volume_storage_data["mount_dir"]
+        if not os.path.exists(mount_dir):
+            raise RuntimeError(f"Mount directory {mount_dir} does not exist")
+
+        parent = (
+            self.deployment.backups.filter(backup_type="snapshot", status="completed")
+            .exclude(snapshot=None).exclude(id=self.id).first()
+        )
+        store = ChunkStore()
+        manifest = create_snapshot(mount_dir, parent_id=parent.snapshot if parent else None, store=store)
+        self.snapshot = manifest["id"]
+        self._snapshot_stats = manifest["stats"]
+        return store.manifest_path(manifest["id"])
+
     # ---------------------------
     # نسخ قاعدة البيانات فقط
     # ---------------------------
     def _backup_database(self):
         env = self._get_db_env()
-        db_name = env["db_name"]
-        db_user = env["db_user"]
-        db_password = env["db_password"]
-        db_host = env["db_host"]
-        db_port = env["db_port"]
-        container_name = env["container_name"]
+        db_format = get_db_format(in_container=env["in_container"])
 
+        codec = get_codec()
         timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
-        backup_file = f"/var/lib/containers/backups/{db_name}_{timestamp}.sql.gz"
-        logger.info(f"Backing up database to {backup_file}")
+        backup_file = f"/var/lib/containers/backups/{env['db_name']}_{timestamp}{DB_EXTENSIONS[db_format]}{codec.extension}"
+        logger.info(f"Backing up database to {backup_file} ({db_format}, {codec.name})")
 
         os.makedirs(os.path.dirname(backup_file), exist_ok=True)
+        self._compression_stats.append(dump_database(self.deployment, env, backup_file, codec, db_format))
+        return backup_file
 
-        if db_host in [c.container_name for c in self.deployment.containers.all()]:
-            cmd = f"docker exec {container_name} pg_dump -U {db_user} {db_name} | gzip > {backup_file}"
-            logger.info(f"Running command: {cmd}")
-            subprocess.run(cmd, shell=True, check=True)
-        else:
-            env_vars = os.environ.copy()
-            env_vars["PGPASSWORD"] = db_password
-            temp_file = backup_file.replace(".gz", "")
-            with open(temp_file, "wb") as f:
-                cmd = ["pg_dump", "-h", db_host, "-p", str(db_port), "-U", db_user, "-d", db_name]
-                logger.info(f"Running command: {' '.join(cmd)}")
-                subprocess.run(cmd, stdout=f, check=True, env=env_vars)
-            subprocess.run(["gzip", "-f", temp_file], check=True)
+    # ---------------------------
+    # تجميع full backup
+    # ---------------------------
+    def _bundle_full(self, files_path=None, db_path=None):
+        """
+        tar بدون ضغط يحتوي manifest.json أولاً ثم الأجزاء المضغوطة كما هي
+        (بدل tar.gz فوق ملفات مضغوطة أصلاً).
+        """
+        parts = [path for path in (files_path, db_path) if path and os.path.exists(path)]
+        if not parts:
+            return None
 
+        timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
+        backup_file = f"/var/lib/containers/backups/deployment_{self.deployment.id}_full_{timestamp}.tar"
+        manifest = json.dumps({
+            "version": 1,
+            "deployment": self.deployment.id,
+            "files": os.path.basename(files_path) if files_path in parts else None,
+            "database": os.path.basename(db_path) if db_path in parts else None,
+        }).encode()
+
+        with tarfile.open(backup_file, "w") as tar:
+            info = tarfile.TarInfo(BACKUP_MANIFEST)
+            info.size = len(manifest)
+            info.mtime = int(timezone.now().timestamp())
+            tar.addfile(info, io.BytesIO(manifest))
+            for path in parts:
+                tar.add(path, arcname=os.path.basename(path))
+
+        for path in parts:
+            os.remove(path)
         return backup_file
 
     # ---------------------------
@@ -1013,39 +1195,40 @@ class DeploymentBackup(models.Model):
         mount_dir = storage_data["mount_dir"]
         os.makedirs(mount_dir, exist_ok=True)
 
+        if self.snapshot:
+            from .backup_store import restore_snapshot
+            logger.info(f"Restoring snapshot {self.snapshot} to {mount_dir}")
+            restore_snapshot(self.snapshot, mount_dir)
+            return
+
         logger.info(f"Restoring full backup from {self.file_path} to {mount_dir}")
-        with tarfile.open(self.file_path, "r:gz") as tar:
-            tar.extractall(path=mount_dir)
+        manifest = read_backup_manifest(self.file_path)
+        if manifest is None:
+            # أرشيف ملفات مضغوط (zstd / gzip) أو نسخة قديمة بصيغة tar.gz
+            decompress_command(self.file_path, ["tar", "-C", mount_dir, "-xf", "-"])
+            logger.info("Full restore completed")
+            return
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(self.file_path)) as tmp_dir:
+            with tarfile.open(self.file_path, "r:") as tar:
+                files_path = extract_backup_member(tar, manifest["files"], tmp_dir) if manifest.get("files") else None
+                db_path = extract_backup_member(tar, manifest["database"], tmp_dir) if manifest.get("database") else None
+
+            if files_path:
+                decompress_command(files_path, ["tar", "-C", mount_dir, "-xf", "-"])
+            if db_path:
+                self._restore_database(db_path)
         logger.info("Full restore completed")
 
     # ---------------------------
     # Restore Database
     # ---------------------------
-    def _restore_database(self):
+    def _restore_database(self, dump_path=None):
         env = self._get_db_env()
-        db_name = env["db_name"]
-        db_user = env["db_user"]
-        db_password = env["db_password"]
-        db_host = env["db_host"]
-        db_port = env["db_port"]
-        container_name = env["container_name"]
-
-        logger.info(f"Restoring database {db_name} from {self.file_path}")
-
-        if db_host in [c.container_name for c in self.deployment.containers.all()]:
-            cmd = f"gunzip -c {self.file_path} | docker exec -i {container_name} psql -U {db_user} -d {db_name}"
-            logger.info(f"Running command: {cmd}")
-            subprocess.run(cmd, shell=True, check=True)
-        else:
-            env_vars = os.environ.copy()
-            env_vars["PGPASSWORD"] = db_password
-            with open(self.file_path, "rb") as f:
-                subprocess.run(
-                    ["psql", "-h", db_host, "-p", str(db_port), "-U", db_user, "-d", db_name],
-                    input=f.read(),
-                    check=True,
-                    env=env_vars
-                )
+        dump_path = dump_path or self.file_path
+
+        logger.info(f"Restoring database {env['db_name']} from {dump_path}")
+        restore_database(self.deployment, env, dump_path)
         logger.info("Database restore completed")
 
     # ---------------------------
@@ -1063,11 +1246,178 @@ class DeploymentBackup(models.Model):
             raise RuntimeError("No database container found for this deployment")
 
         env = db_container.get_resolved_env_vars()
+        db_host = db_container.container_name
         return {
             "db_name": env.get(db_config.db_name),
             "db_user": env.get(db_config.db_user),
             "db_password": env.get(db_config.db_password),
-            "db_host": db_container.container_name,
+            "db_host": db_host,
             "db_port": env.get(db_config.db_port, "5432"),
-            "container_name": db_container.container_name
-        }
\ No newline at end of file
+            "container_name": db_container.container_name,
+            # pg_dump داخل الحاوية عبر Docker API، وإلا pg_dump خارجي
+            "in_container": db_host in [c.container_name for c in self.deployment.containers.all()],
+        }
+
+
+class DeploymentJob(models.Model):
+    """
+    مهمة في طابور النشر: تُنفَّذ خارج طلب HTTP بواسطة عمّال run_deployment_workers
+    """
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    deployment = models.ForeignKey("Deployment", on_delete=models.CASCADE, null=True, blank=True, related_name="jobs")
+    action = models.CharField(max_length=50, help_text="اسم الـ handler المسجل في deployments.jobs")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+
+    def __str__(self):
+        return f"Job {self.action} #{self.id} ({self.status}) for {self.deployment_id}"
+
+
+class CachedImage(models.Model):
+    """
+    صورة Docker مسحوبة مسبقاً (warm cache) من قوالب المشاريع في الكتالوج على host واحد
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("pulled", "Pulled"),
+        ("failed", "Failed"),
+        ("evicted", "Evicted"),
+    ]
+
+    reference = models.CharField(max_length=255, help_text="image:tag كما في docker_compose_template")
+    node = models.ForeignKey(
+        DockerNode, on_delete=models.CASCADE, null=True, blank=True, related_name="cached_images",
+        help_text="فارغ => الـ daemon المحلي",
+    )
+    digest = models.CharField(max_length=255, blank=True, null=True)
+    image_id = models.CharField(max_length=100, blank=True, null=True)
+    size_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    error_message = models.TextField(blank=True, null=True)
+    pulled_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["reference"]
+        unique_together = ("reference", "node")
+        indexes = [
+            models.Index(fields=["status", "last_used_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.reference} on {self.node.name if self.node_id else 'local'} ({self.status})"
+
+
+class BackupChunk(models.Model):
+    """
+    chunk واحد في مستودع النسخ التزايدية (deployments.backup_store)،
+    refcount = عدد الـ snapshots التي تستخدمه
+    """
+    digest = models.CharField(max_length=64, unique=True, help_text="sha256 لمحتوى الـ chunk")
+    size = models.PositiveIntegerField(help_text="الحجم قبل الضغط بالبايت")
+    stored_size = models.PositiveIntegerField(help_text="الحجم على القرص بالبايت")
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["refcount"]),
+        ]
+
+    def __str__(self):
+        return f"{self.digest[:12]} x{self.refcount}"
+
+
+class BackupPolicy(models.Model):
+    """
+    نسخ احتياطي مجدول لـ Deployment (deployments.backup_scheduler).
+    الاحتفاظ بأسلوب GFS: آخر keep_last نسخ + أحدث نسخة في كل ساعة / يوم / أسبوع / شهر
+    لعدد keep_* من الفترات، وما عدا ذلك يُحذف تلقائياً بعد كل نسخة ناجحة.
+    """
+    FREQUENCY_CHOICES = [
+        ("hourly", "Hourly"),
+        ("daily", "Daily"),
+        ("weekly", "Weekly"),
+    ]
+
+    deployment = models.ForeignKey("Deployment", on_delete=models.CASCADE, related_name="backup_policies")
+    backup_type = models.CharField(max_length=10, choices=DeploymentBackup.BACKUP_TYPE_CHOICES, default="snapshot")
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default="daily")
+    keep_last = models.PositiveIntegerField(default=3)
+    keep_hourly = models.PositiveIntegerField(default=0)
+    keep_daily = models.PositiveIntegerField(default=7)
+    keep_weekly = models.PositiveIntegerField(default=4)
+    keep_monthly = models.PositiveIntegerField(default=6)
+    is_active = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, help_text="يُحسب تلقائياً بإزاحة ثابتة لكل policy + jitter")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["deployment_id", "frequency"]
+        indexes = [
+            models.Index(fields=["is_active", "next_run_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.frequency} {self.backup_type} backups for {self.deployment_id}"
+
+
+class BackupUpload(models.Model):
+    """
+    رفع نسخة احتياطية على أجزاء قابل للاستكمال (deployments.transfers).
+    الأجزاء تُكتب في file_path + ".part" وتُنقل إلى file_path بعد التحقق من sha256.
+    """
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    deployment = models.ForeignKey("Deployment", on_delete=models.CASCADE, related_name="uploads")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    backup_type = models.CharField(max_length=10, choices=DeploymentBackup.BACKUP_TYPE_CHOICES, default="full")
+    size = models.BigIntegerField(help_text="الحجم الكامل بالبايت كما أعلنه العميل")
+    chunk_size = models.PositiveIntegerField()
+    received = models.BigIntegerField(default=0, help_text="عدد البايتات المكتوبة والمؤكدة")
+    chunk_digests = models.JSONField(default=list, blank=True, help_text="sha256 لكل chunk مكتوب")
+    file_path = models.CharField(max_length=512)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.received}/{self.size}) for {self.deployment_id}"
+
+    @property
+    def part_path(self):
+        return f"{self.file_path}.part"
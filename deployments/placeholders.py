@@ -0,0 +1,175 @@
+# deployments/placeholders.py
+"""
+ترجمة placeholders قالب docker-compose: كل string مختلف يُقسم مرة واحدة (compile_string في cache)
+بدل regex في كل استدعاء، وكل مرجع مختلف يُحل مرة واحدة في الـ render.
+
+يدعم:
+{container.<service_name>.<field>}
+{deployment.<field>}
+{dc.<service_name>.<field>}
+{uuid.<cache_id>.<length>}
+"""
+import logging
+import re
+import uuid
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_RE = re.compile(r"\{([^{}]+)\}")
+MAX_PASSES = 5  # لدعم nested placeholders (قيمة placeholder تحتوي placeholder آخر)
+
+
+class Ref:
+    """مرجع placeholder واحد داخل string"""
+    __slots__ = ("raw", "expr", "parts")
+
+    def __init__(self, raw, expr):
+        self.raw = raw            # "{dc.db.domain}" كما هو في القالب
+        self.expr = expr          # "dc.db.domain"
+        self.parts = tuple(expr.split("."))
+
+
+@lru_cache(maxsize=8192)
+def compile_string(value):
+    """
+    تقسيم string إلى segments: نص ثابت أو Ref.
+    النتيجة immutable ومخزنة في cache لكل string مختلف.
+    """
+    segments = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(value):
+        if match.start() > position:
+            segments.append(value[position:match.start()])
+        segments.append(Ref(match.group(0), match.group(1).strip()))
+        position = match.end()
+    if position < len(value):
+        segments.append(value[position:])
+    return tuple(segments)
+
+
+def _has_refs(segments):
+    return any(isinstance(s, Ref) for s in segments)
+
+
+def render_template(value, resolver):
+    """
+    نسخة من شجرة dict / list / str مع حل الـ placeholders في مرور واحد.
+    الـ compose المُولّد يختلف لكل Deployment، لذلك لا تُخزن الشجرة نفسها بل الـ strings المترجمة فقط.
+    """
+    if isinstance(value, dict):
+        return {render_template(k, resolver): render_template(v, resolver) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render_template(v, resolver) for v in value]
+    if isinstance(value, str) and "{" in value and _has_refs(compile_string(value)):
+        return resolver.render_string(value)
+    return value
+
+
+class PlaceholderResolver:
+    """
+    يحل كل مرجع مختلف مرة واحدة فقط في الـ render (memo)،
+    وبدون أي استعلام: الحاويات والـ compose تُمرر جاهزة.
+    """
+    def __init__(self, deployment, compose, containers, uuid_cache=None):
+        self.deployment = deployment
+        self.containers = containers  # {service_name: DeploymentContainer}
+        self.uuid_cache = dict(uuid_cache or {})
+        self.uuid_cache_changed = False
+        self.memo = {}
+
+        # {original service_name: (new service key, config)}
+        self.services = {}
+        for svc_name, svc_conf in (compose or {}).get("services", {}).items():
+            original = svc_conf.get("service_name") if isinstance(svc_conf, dict) else None
+            if original is not None and original not in self.services:
+                self.services[original] = (svc_name, svc_conf)
+
+    # ---------------- Rendering ----------------
+    def render_string(self, value):
+        prev = value
+        for _ in range(MAX_PASSES):
+            segments = compile_string(prev)
+            if not _has_refs(segments):
+                break
+            new = "".join(s if isinstance(s, str) else self.resolve(s) for s in segments)
+            if new == prev:
+                break
+            prev = new
+        return prev
+
+    def resolve(self, ref):
+        """قيمة المرجع كنص، أو النص الأصلي إذا تعذر الحل"""
+        if ref.expr not in self.memo:
+            try:
+                result = self._resolve(ref.parts)
+            except Exception as e:
+                logger.exception("Error while resolving placeholder %s: %s", ref.expr, e)
+                result = None
+            self.memo[ref.expr] = ref.raw if result is None else result
+        return self.memo[ref.expr]
+
+    def _resolve(self, parts):
+        kind = parts[0]
+        if kind == "uuid":
+            return self._resolve_uuid(parts)
+        if kind == "dc" and len(parts) >= 3:
+            return self._resolve_attr(self.containers.get(parts[1]), parts[2:])
+        if kind == "container" and len(parts) >= 2:
+            return self._resolve_container(parts[1], parts[2:])
+        if kind == "deployment" and len(parts) >= 2:
+            return self._resolve_attr(self.deployment, parts[1:])
+        return None
+
+    # ---------------- Kinds ----------------
+    def _resolve_uuid(self, parts):
+        # ---- uuid.<cache_id>.<length> ----
+        cache_id = "default"
+        length = 32
+
+        if len(parts) == 2:
+            if parts[1].isdigit():
+                length = int(parts[1])
+            else:
+                cache_id = parts[1]
+        elif len(parts) >= 3:
+            cache_id = parts[1]
+            if parts[2].isdigit():
+                length = int(parts[2])
+
+        cache_key = f"uuid.{cache_id}.{length}"
+
+        # استخدم القديم إذا موجود، وإلا خزّن جديد
+        if cache_key not in self.uuid_cache:
+            self.uuid_cache[cache_key] = uuid.uuid4().hex[:length]
+            self.uuid_cache_changed = True
+        return self.uuid_cache[cache_key]
+
+    def _resolve_attr(self, node, fields):
+        # ---- dc.<service_name>.<field> / deployment.<field> ----
+        if node is None:
+            return None
+        for field in fields:
+            node = getattr(node, field, None)
+            if node is None:
+                logger.debug("field not found: %s", field)
+                return None
+        return str(node)
+
+    def _resolve_container(self, service_name, subkeys):
+        # ---- container.<service_name>.<field> ----
+        found = self.services.get(service_name)
+        if found is None:
+            logger.debug("container with service_name %s not found", service_name)
+            return None
+
+        new_service_name, node = found
+        if not subkeys:
+            return new_service_name
+
+        for key in subkeys:
+            node = node.get(key) if isinstance(node, dict) else None
+            if node is None:
+                logger.debug("field %s not found in container %s", key, service_name)
+                return None
+        return str(node)
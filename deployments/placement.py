@@ -0,0 +1,131 @@
+# deployments/placement.py
+"""
+اختيار Docker host لكل Deployment جديد (bin-packing على موارد الخطة).
+
+best_fit: الـ host الذي يبقى فيه أقل مساحة حرة بعد الوضع، فتمتلئ الـ nodes واحداً تلو الآخر
+وتبقى nodes فارغة للخطط الكبيرة. spread: العكس (أكثر مساحة حرة) لتوزيع الحمل.
+
+بعد الوضع يبقى الـ Deployment على نفس الـ node: الـ volume والحاويات موجودة هناك.
+الـ nodes بدون shared_storage لا تُرشح: صورة XFS والـ quota تُنشأ على filesystem العامل.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from docker.errors import DockerException
+
+from .capacity import RESOURCES, get_ledger
+from .fleet import DEFAULT_HOST, get_deployment_host
+from .models import Deployment, DockerNode
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_STRATEGY = getattr(settings, "PLACEMENT_STRATEGY", "best_fit")  # best_fit | spread
+PLACEMENT_USE_LOCAL = getattr(settings, "PLACEMENT_USE_LOCAL", True)  # الـ daemon المحلي مرشح مع الـ nodes
+
+
+def get_candidate_hosts(nodes=None):
+    """{host: DockerNode أو None للمحلي}"""
+    if nodes is None:
+        nodes = DockerNode.objects.filter(is_active=True)
+    hosts = {}
+    for node in nodes:
+        if node.shared_storage:
+            hosts[node.name] = node
+        else:
+            logger.debug(f"Node {node.name} skipped for placement: storage is not shared with this worker")
+    if PLACEMENT_USE_LOCAL or not hosts:
+        hosts[DEFAULT_HOST] = None
+    return hosts
+
+
+def get_plan_need(plan):
+    return {"cpu": float(plan.cpu), "ram": int(plan.ram), "storage": int(plan.storage)}
+
+
+def score_host(ledger, need):
+    """
+    (fits, leftover): leftover متوسط نسبة المساحة الحرة المتبقية بعد الوضع لكل مورد
+    (سالبة إذا لم يتسع الـ host)
+    """
+    fits = True
+    ratios = []
+    for resource in RESOURCES:
+        entry = ledger[resource]
+        remaining = entry["free"] - need[resource]
+        fits = fits and remaining >= 0
+        ratios.append(remaining / entry["allocatable"] if entry["allocatable"] else -1.0)
+    return fits, sum(ratios) / len(ratios)
+
+
+def rank_hosts(deployment, plan=None, hosts=None):
+    """
+    [{"host", "fits", "leftover", "ledger"}] مرتبة حسب PLACEMENT_STRATEGY، المتسعة أولاً.
+    الـ hosts التي لا يمكن الوصول إليها تُتجاهل.
+    """
+    plan = plan or deployment.plan
+    need = get_plan_need(plan)
+    ranked = []
+    for host in (hosts if hosts is not None else get_candidate_hosts()):
+        try:
+            ledger = get_ledger(host, exclude=deployment)
+        except (DockerException, OSError) as e:
+            logger.warning(f"Host {host} skipped for placement: {e}")
+            continue
+        fits, leftover = score_host(ledger, need)
+        ranked.append({"host": host, "fits": fits, "leftover": round(leftover, 4), "ledger": ledger})
+
+    spread = PLACEMENT_STRATEGY == "spread"
+    ranked.sort(key=lambda item: (
+        not item["fits"],
+        -item["leftover"] if spread or not item["fits"] else item["leftover"],
+        item["host"],
+    ))
+    return ranked
+
+
+def _record_placement(deployment, node):
+    deployment.node = node
+    deployment.placed_at = timezone.now()
+    deployment.save(update_fields=["node", "placed_at"])
+
+
+def place_deployment(deployment, plan=None, require_fit=True):
+    """
+    تحديد host للـ Deployment وتسجيله مع placed_at (مرة واحدة فقط).
+    إعادة محاولة الـ deploy job أو انتظار السعة ترجع نفس الـ host دائماً، حتى المحلي.
+    ترجع (host, reason): host None إذا لم يتسع أي host و require_fit.
+    بدون require_fit يُختار الـ host الأقرب للاتساع.
+    """
+    if deployment.placed_at:
+        return get_deployment_host(deployment), None
+
+    plan = plan or deployment.plan
+    with transaction.atomic():
+        # قفل الـ Deployment: job آخر لنفس الـ Deployment قد يكون وضعه للتو
+        current = Deployment.objects.select_for_update().get(id=deployment.id)
+        if current.placed_at:
+            deployment.node, deployment.placed_at = current.node, current.placed_at
+            return get_deployment_host(deployment), None
+
+        # قفل الـ nodes: عمليتا وضع متزامنتان لا تحجزان نفس المساحة الحرة
+        hosts = get_candidate_hosts(DockerNode.objects.select_for_update().filter(is_active=True))
+        if list(hosts) == [DEFAULT_HOST]:
+            _record_placement(deployment, None)  # لا nodes مسجلة: الـ daemon المحلي كما كان
+            return DEFAULT_HOST, None
+
+        ranked = rank_hosts(deployment, plan, hosts)
+        if not ranked:
+            return None, "no Docker host is reachable"
+        best = ranked[0]
+        if not best["fits"] and require_fit:
+            return None, f"no Docker host has room for plan {plan.id}"
+
+        _record_placement(deployment, hosts[best["host"]])
+
+    logger.info(
+        f"Deployment {deployment.id} placed on {best['host']} "
+        f"({PLACEMENT_STRATEGY}, leftover={best['leftover']}, fits={best['fits']})"
+    )
+    return best["host"], None
@@ -1,8 +1,12 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import DeploymentContainer, DeploymentContainerEnvVar
-from projects.models import EnvVarsTitle
+from .models import Deployment, DeploymentBackup, DeploymentContainer, DeploymentContainerEnvVar, DeploymentJob
+from .jobs import enqueue_job
+from .backup_store import release_snapshot
+from projects.models import EnvVarsTitle, AvailableProject
+from plans.models import Plan, Subscription
 
 @receiver(post_save, sender=DeploymentContainer)
 def create_deployment_env_vars(sender, instance, created, **kwargs):
@@ -18,3 +22,71 @@ def create_deployment_env_vars(sender, instance, created, **kwargs):
                     var=env_var,
                     defaults={"value": ""}  # ممكن تحط default من مكان آخر
                 )
+
+
+# ---------------- إبطال compose_hash ----------------
+# قالب المشروع جزء من get_compose_hash، فتغييره يُكتشف عند refresh بدون signal على AvailableProject
+def invalidate_compose(**filters):
+    """أي تغيير في مدخلات الـ compose يجبر refresh_compose_template على إعادة التوليد"""
+    Deployment.objects.filter(**filters).exclude(compose_hash=None).update(compose_hash=None)
+
+
+@receiver([post_save, post_delete], sender=DeploymentContainer)
+def invalidate_container_compose(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields and set(update_fields) <= {"status"}:
+        return  # الحالة لا تؤثر على الـ compose
+    invalidate_compose(id=instance.deployment_id)
+
+
+@receiver([post_save, post_delete], sender=DeploymentContainerEnvVar)
+def invalidate_env_var_compose(sender, instance, **kwargs):
+    invalidate_compose(containers__id=instance.container_id)
+
+
+@receiver(pre_save, sender=AvailableProject)
+def remember_project_template(sender, instance, update_fields=None, **kwargs):
+    """حفظ القالب المخزن قبل الحفظ لمعرفة هل تغير فعلاً (مثلاً عداد downloads لا يغيره)"""
+    if update_fields is not None and "docker_compose_template" not in update_fields:
+        instance._template_changed = False
+        return
+    previous = None
+    if instance.pk:
+        previous = (
+            AvailableProject.objects.filter(pk=instance.pk)
+            .values_list("docker_compose_template", flat=True)
+            .first()
+        )
+    instance._template_changed = previous != instance.docker_compose_template
+
+
+@receiver(post_save, sender=AvailableProject)
+def warm_project_images(sender, instance, **kwargs):
+    """سحب صور المشروع في الخلفية عند إضافته أو تعديل قالبه"""
+    if not instance.docker_compose_template or not getattr(instance, "_template_changed", True):
+        return
+    already_queued = DeploymentJob.objects.filter(
+        action="warm_images", status="queued", payload__project_id=instance.id
+    ).exists()
+    if not already_queued:
+        transaction.on_commit(lambda: enqueue_job("warm_images", payload={"project_id": instance.id}))
+
+
+@receiver(pre_delete, sender=DeploymentBackup)
+def release_backup_snapshot(sender, instance, **kwargs):
+    """
+    إنقاص refcount لـ chunks الـ snapshot عند أي حذف للصف (view، admin، حذف الـ Deployment بـ CASCADE)،
+    وإلا تبقى محجوزة ولا يحذفها collect_garbage أبداً
+    """
+    if instance.snapshot:
+        release_snapshot(instance.snapshot)
+
+
+@receiver(post_save, sender=Plan)
+def invalidate_plan_compose(sender, instance, **kwargs):
+    invalidate_compose(subscription__plan=instance)
+
+
+@receiver(post_save, sender=Subscription)
+def invalidate_subscription_compose(sender, instance, **kwargs):
+    invalidate_compose(id=instance.deployment_id)
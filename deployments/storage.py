@@ -0,0 +1,209 @@
+# deployments/storage.py
+"""
+حساب استهلاك التخزين لكل Deployment بدون `du -sb` في كل طلب.
+
+mount_dir مجلد عادي تُربط منه مجلدات الحاويات (صورة الـ loop يركّبها Docker volume driver في مكان آخر):
+1. mount_dir على XFS مع prjquota  -> xfs_quota project report (O(1))
+2. غير ذلك (مثلاً Windows أو ext4) -> du مع cache لمدة STORAGE_USAGE_CACHE_TTL
+"""
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+XFS_PROJECT_ID_OFFSET = getattr(settings, "XFS_PROJECT_ID_OFFSET", 100000)
+STORAGE_USAGE_CACHE_TTL = getattr(settings, "STORAGE_USAGE_CACHE_TTL", 300)  # ثواني
+
+_du_cache = {}  # path -> (expires_at, bytes)
+_du_lock = threading.Lock()
+
+
+def get_project_id(deployment_id):
+    """رقم XFS project الخاص بالـ Deployment"""
+    return XFS_PROJECT_ID_OFFSET + int(deployment_id)
+
+
+def find_mount_point(path):
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def get_mount_info(mount_point):
+    """(fstype, options) من /proc/mounts لنقطة التركيب"""
+    info = (None, set())
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 4 and parts[1] == mount_point:
+                    info = (parts[2], set(parts[3].split(",")))
+    except OSError:
+        pass
+    return info
+
+
+def has_project_quota(mount_point):
+    fstype, options = get_mount_info(mount_point)
+    return fstype == "xfs" and bool(options & {"prjquota", "pquota"})
+
+
+# ---------------- القراءة ----------------
+def xfs_project_usage(mount_point, project_id):
+    """(used, hard limit) بالبايت من XFS project quota أو None"""
+    try:
+        result = subprocess.run(
+            ["xfs_quota", "-x", "-c", f"quota -p -N -b {project_id}", mount_point],
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"xfs_quota failed for project {project_id} on {mount_point}: {e}")
+        return None
+
+    # Filesystem Blocks Quota Limit Warn/Time Mounted-on (blocks بوحدة 1K)
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 4 and parts[1].isdigit():
+            return int(parts[1]) * 1024, int(parts[3]) * 1024
+    return 0, 0
+
+
+def du_usage(path):
+    """du -sb مع cache (fallback فقط للأنظمة بدون XFS)"""
+    now = time.monotonic()
+    with _du_lock:
+        cached = _du_cache.get(path)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    try:
+        result = subprocess.run(["du", "-sb", path], capture_output=True, text=True, check=True)
+        size_bytes = int(result.stdout.split()[0])
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to get storage usage for {path}: {e}")
+        return cached[1] if cached else 0
+
+    with _du_lock:
+        _du_cache[path] = (now + STORAGE_USAGE_CACHE_TTL, size_bytes)
+    return size_bytes
+
+
+def get_path_usage(path, project_id=None):
+    """
+    ترجع (used_bytes, limit_bytes, source)
+    limit_bytes = None إذا لم يكن هناك حد مفروض من نظام الملفات
+    """
+    if not os.path.exists(path):
+        return 0, None, "missing"
+
+    if project_id is not None and hasattr(os, "statvfs"):
+        mount_point = find_mount_point(path)
+        if has_project_quota(mount_point):
+            usage = xfs_project_usage(mount_point, project_id)
+            if usage is not None:
+                used, limit = usage
+                return used, limit or None, "xfs_quota"
+
+    return du_usage(path), None, "du"
+
+
+# ---------------- فرض الحد ----------------
+def apply_project_quota(path, project_id, size_mb):
+    """
+    ربط path بـ XFS project وفرض حد صلب size_mb.
+    ترجع False إذا لم يكن نظام الملفات يدعم project quota.
+    """
+    if not hasattr(os, "statvfs") or not os.path.exists(path):
+        return False
+
+    mount_point = find_mount_point(path)
+    if not has_project_quota(mount_point):
+        logger.info(f"{mount_point} has no XFS project quota, storage limit for {path} not enforced by quota")
+        return False
+
+    try:
+        subprocess.run(
+            ["xfs_quota", "-x", "-c", f"project -s -p {path} {project_id}", mount_point],
+            capture_output=True, check=True,
+        )
+        subprocess.run(
+            ["xfs_quota", "-x", "-c", f"limit -p bhard={int(size_mb)}m {project_id}", mount_point],
+            capture_output=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Failed to apply XFS project quota on {path}: {e}")
+        return False
+
+    logger.info(f"XFS project quota {project_id} set to {size_mb} MB on {path}")
+    return True
+
+
+# ---------------- تكبير الصورة ----------------
+def find_loop_device(img_path):
+    """loop device المرتبط بالصورة (مثلاً /dev/loop3) أو None"""
+    try:
+        result = subprocess.run(["losetup", "-j", img_path], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    line = result.stdout.strip().splitlines()
+    return line[0].split(":", 1)[0] if line else None
+
+
+def find_device_mount(device):
+    """أول نقطة تركيب للـ device من /proc/mounts أو None"""
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == device:
+                    return parts[1]
+    except OSError:
+        pass
+    return None
+
+
+def grow_xfs_image(img_path, size_mb):
+    """
+    تكبير صورة XFS (loop) إلى size_mb بدون إيقاف الحاويات:
+    truncate -> losetup -c (تحديث حجم الـ loop device) -> xfs_growfs.
+    ترجع False إذا كانت الصورة بالحجم المطلوب أو أكبر (XFS لا يدعم التصغير).
+    """
+    target = int(size_mb) * 1024 * 1024
+    if not os.path.exists(img_path) or os.path.getsize(img_path) >= target:
+        return False
+
+    os.truncate(img_path, target)
+    logger.info(f"{img_path} extended to {size_mb} MB")
+
+    device = find_loop_device(img_path)
+    mount_point = find_device_mount(device) if device else None
+    if device:
+        subprocess.run(["losetup", "-c", device], check=True, capture_output=True)
+
+    if mount_point:
+        subprocess.run(["xfs_growfs", mount_point], check=True, capture_output=True)
+        logger.info(f"XFS filesystem on {mount_point} grown to {size_mb} MB")
+        return True
+
+    # غير مركّبة حالياً: تركيب مؤقت لتكبير نظام الملفات
+    tmp_mount = tempfile.mkdtemp(prefix="xfs-grow-")
+    try:
+        subprocess.run(["mount", "-o", "loop", img_path, tmp_mount], check=True, capture_output=True)
+        try:
+            subprocess.run(["xfs_growfs", tmp_mount], check=True, capture_output=True)
+        finally:
+            subprocess.run(["umount", tmp_mount], capture_output=True)
+    finally:
+        os.rmdir(tmp_mount)
+    logger.info(f"XFS filesystem in {img_path} grown to {size_mb} MB")
+    return True
@@ -1,3 +1,577 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import yaml
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from plans.models import Plan, Subscription
+from projects.models import AvailableProject
+from . import backup_scheduler, capacity, docker_client, images, jobs, placement
+from .models import (
+    BackupPolicy, BackupUpload, CachedImage, Deployment, DeploymentBackup, DeploymentContainer, DeploymentJob, DockerNode,
+    extract_backup_member,
+)
+from .transfers import UploadError, complete_upload, get_upload_checksum, parse_range, write_chunk
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_header_or_other_unit(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range("items=0-10", 1000))
+        self.assertIsNone(parse_range("bytes=-", 1000))
+
+    def test_closed_and_open_ranges(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=100-", 1000), (100, 999))
+        self.assertEqual(parse_range("bytes=0-999999", 1000), (0, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range("bytes=-10", 1000), (990, 999))
+        self.assertEqual(parse_range("bytes=-5000", 1000), (0, 999))
+
+    def test_multiple_ranges_send_full_file(self):
+        self.assertIsNone(parse_range("bytes=0-1,5-9", 1000))
+
+    def test_unsatisfiable(self):
+        for header in ["bytes=1000-", "bytes=-0", "bytes=5-2"]:
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+
+class ChunkedUploadTests(TestCase):
+    CHUNK = 8
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        user = User.objects.create(username="uploader")
+        project = AvailableProject.objects.create(name="test")
+        self.deployment = Deployment.objects.create(user=user, project=project)
+        self.data = bytes(range(20))  # 3 chunks: 8 + 8 + 4
+        self.upload = BackupUpload.objects.create(
+            deployment=self.deployment,
+            user=user,
+            filename="db.sql",
+            backup_type="db",
+            size=len(self.data),
+            chunk_size=self.CHUNK,
+            file_path=os.path.join(self.tmp_dir, "db.sql"),
+        )
+        open(self.upload.part_path, "wb").close()
+
+    def send(self, offset, digest=None):
+        chunk = self.data[offset:offset + self.CHUNK]
+        return write_chunk(self.upload, offset, io.BytesIO(chunk), len(chunk), digest)
+
+    def send_all(self):
+        for offset in range(0, len(self.data), self.CHUNK):
+            self.send(offset)
+
+    def test_write_chunk_advances_offset(self):
+        self.assertEqual(self.send(0), 8)
+        self.assertEqual(self.send(8), 16)
+        self.assertEqual(self.send(16), 20)
+        with open(self.upload.part_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_write_chunk_rejects_unexpected_offset(self):
+        self.send(0)
+        with self.assertRaises(UploadError) as ctx:
+            self.send(0)
+        self.assertEqual(ctx.exception.status, 409)
+        self.assertEqual(ctx.exception.offset, 8)
+
+    def test_upload_init_requires_deployment_owner(self):
+        self.client.force_login(User.objects.create(username="intruder"))
+        response = self.client.post(
+            reverse("deployment_backup_upload_init", args=[self.deployment.id]),
+            data='{"filename": "db.sql", "size": 20, "backup_type": "db"}',
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(BackupUpload.objects.count(), 1)
+
+    def test_write_chunk_rechecks_offset_after_reading(self):
+        upload = self.upload
+
+        class RacingStream(io.BytesIO):
+            """طلب آخر يؤكد نفس الـ chunk أثناء القراءة من العميل"""
+            def read(self, size=-1):
+                BackupUpload.objects.filter(id=upload.id).update(received=8)
+                return super().read(size)
+
+        with self.assertRaises(UploadError) as ctx:
+            write_chunk(upload, 0, RacingStream(self.data[:8]), 8)
+        self.assertEqual(ctx.exception.status, 409)
+        self.assertEqual(ctx.exception.offset, 8)
+        upload.refresh_from_db()
+        self.assertEqual(upload.chunk_digests, [])
+
+    def test_write_chunk_rejects_bad_digest_without_advancing(self):
+        with self.assertRaises(UploadError) as ctx:
+            self.send(0, digest="0" * 64)
+        self.assertEqual(ctx.exception.status, 422)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.received, 0)
+        self.assertEqual(self.send(0, hashlib.sha256(self.data[:8]).hexdigest()), 8)
+
+    def test_write_chunk_rejects_wrong_length_and_extra_chunks(self):
+        with self.assertRaises(UploadError):
+            write_chunk(self.upload, 0, io.BytesIO(b"abc"), 3)
+        self.send_all()
+        with self.assertRaises(UploadError):
+            write_chunk(self.upload, 20, io.BytesIO(b""), 0)
+
+    def test_complete_upload_creates_backup(self):
+        self.send_all()
+        self.upload.refresh_from_db()
+        backup = complete_upload(self.upload, get_upload_checksum(self.upload.chunk_digests))
+
+        self.assertEqual(backup.status, "completed")
+        self.assertEqual(backup.backup_type, "db")
+        self.assertEqual(DeploymentBackup.objects.count(), 1)
+        self.assertFalse(os.path.exists(self.upload.part_path))
+        with open(self.upload.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_complete_upload_before_last_chunk(self):
+        self.send(0)
+        with self.assertRaises(UploadError) as ctx:
+            complete_upload(self.upload)
+        self.assertEqual(ctx.exception.offset, 8)
+
+    def test_complete_upload_checksum_mismatch(self):
+        self.send_all()
+        with self.assertRaises(UploadError) as ctx:
+            complete_upload(self.upload, "0" * 64)
+        self.assertEqual(ctx.exception.status, 422)
+        self.assertFalse(DeploymentBackup.objects.exists())
+
+    def test_corrupted_chunk_rewinds_and_can_be_resent(self):
+        self.send_all()
+        with open(self.upload.part_path, "r+b") as f:
+            f.seek(10)
+            f.write(b"\xff")
+
+        with self.assertRaises(UploadError) as ctx:
+            complete_upload(self.upload)
+        self.assertEqual(ctx.exception.offset, 8)
+
+        # الرجوع محفوظ في القاعدة، فيُقبل إعادة الإرسال من بداية الـ chunk التالف
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.received, 8)
+        self.assertEqual(len(self.upload.chunk_digests), 1)
+        self.assertEqual(self.send(8), 16)
+        self.assertEqual(self.send(16), 20)
+
+        complete_upload(self.upload)
+        with open(self.upload.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+
+class FakeImage:
+    def __init__(self, reference):
+        self.id = "sha256:" + hashlib.sha256(reference.encode()).hexdigest()
+        self.attrs = {"RepoDigests": [], "Size": 100}
+
+
+class FakeImages:
+    def __init__(self):
+        self.pulled = {}
+
+    def pull(self, reference):
+        self.pulled[reference] = FakeImage(reference)
+        return self.pulled[reference]
+
+    def remove(self, reference):
+        self.pulled.pop(reference, None)
+
+
+class FakeContainers:
+    def list(self, all=False):
+        return []
+
+
+class FakeDockerClient:
+    """يُستخدم عبر DOCKER_CLIENT_FACTORY بدل dockerd حقيقي"""
+    def __init__(self, base_url=None, timeout=None, max_pool_size=None, tls=None):
+        self.base_url = base_url
+        self.closed = False
+        self.images = FakeImages()
+        self.containers = FakeContainers()
+
+    def ping(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+class FleetTestCase(TestCase):
+    """nodes وهمية بسعات ثابتة (CAPACITY_HOSTS) بدون أي اتصال بـ Docker"""
+    HOSTS = {
+        "local": {"cpu": 1, "ram": 1024, "storage": 1000},
+        "big": {"cpu": 4, "ram": 4096, "storage": 4000},
+        "small": {"cpu": 2, "ram": 2048, "storage": 2000},
+    }
+
+    def setUp(self):
+        for target, value in [
+            (capacity, {"CAPACITY_HOSTS": self.HOSTS,
+                        "CAPACITY_OVERCOMMIT": {"cpu": 1.0, "ram": 1.0, "storage": 1.0}}),
+            (placement, {"PLACEMENT_USE_LOCAL": False, "PLACEMENT_STRATEGY": "best_fit"}),
+        ]:
+            for name, patched in value.items():
+                patcher = mock.patch.object(target, name, patched)
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create(username="owner")
+        self.project = AvailableProject.objects.create(name="test")
+        self.plan = Plan.objects.create(name="basic", cpu=1, ram=1024, storage=1000)
+        self.big = DockerNode.objects.create(name="big", base_url="tcp://10.0.0.1:2376", shared_storage=True)
+        self.small = DockerNode.objects.create(name="small", base_url="tcp://10.0.0.2:2376", shared_storage=True)
+        self.remote = DockerNode.objects.create(name="remote", base_url="tcp://10.0.0.3:2376")
+
+    def create_deployment(self, plan=None, **fields):
+        deployment = Deployment.objects.create(user=self.user, project=self.project, **fields)
+        Subscription.objects.create(deployment=deployment, plan=plan or self.plan, duration="monthly")
+        return deployment
+
+
+class PlacementTests(FleetTestCase):
+    def test_rank_hosts_best_fit_and_spread(self):
+        deployment = self.create_deployment()
+        ranked = placement.rank_hosts(deployment)
+        self.assertEqual([item["host"] for item in ranked], ["small", "big"])
+        self.assertTrue(all(item["fits"] for item in ranked))
+
+        with mock.patch.object(placement, "PLACEMENT_STRATEGY", "spread"):
+            self.assertEqual(placement.rank_hosts(deployment)[0]["host"], "big")
+
+    def test_nodes_without_shared_storage_are_not_candidates(self):
+        self.assertNotIn("remote", placement.get_candidate_hosts())
+
+    def test_full_host_ranks_last(self):
+        full = Plan.objects.create(name="full", cpu=2, ram=2048, storage=2000)
+        self.create_deployment(plan=full, node=self.small, placed_at=timezone.now(), admitted_at=timezone.now())
+        ranked = placement.rank_hosts(self.create_deployment())
+        self.assertEqual(ranked[0]["host"], "big")
+        self.assertFalse(ranked[-1]["fits"])
+
+    def test_place_deployment_is_recorded_once(self):
+        deployment = self.create_deployment()
+        self.assertEqual(placement.place_deployment(deployment), ("small", None))
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.node, self.small)
+        self.assertIsNotNone(deployment.placed_at)
+
+        # بعد الوضع لا يتغير الـ host حتى لو أصبح غير مناسب
+        self.small.is_active = False
+        self.small.save()
+        self.assertEqual(placement.place_deployment(deployment), ("small", None))
+
+    def test_place_deployment_without_room(self):
+        huge = Plan.objects.create(name="huge", cpu=8, ram=8192, storage=8000)
+        deployment = self.create_deployment(plan=huge)
+        host, reason = placement.place_deployment(deployment)
+        self.assertIsNone(host)
+        self.assertIn("no Docker host has room", reason)
+        deployment.refresh_from_db()
+        self.assertIsNone(deployment.placed_at)
+
+        self.assertEqual(placement.place_deployment(deployment, require_fit=False)[0], "big")
+
+    def test_place_deployment_without_nodes_records_local(self):
+        DockerNode.objects.update(is_active=False)
+        deployment = self.create_deployment()
+        self.assertEqual(placement.place_deployment(deployment), ("local", None))
+        deployment.refresh_from_db()
+        self.assertIsNone(deployment.node)
+        self.assertIsNotNone(deployment.placed_at)
+
+
+class CapacityTests(FleetTestCase):
+    def place(self, node, plan=None, **fields):
+        now = timezone.now()
+        return self.create_deployment(plan=plan, node=node, placed_at=now, admitted_at=now, **fields)
+
+    def test_ledger_counts_admitted_deployments_only(self):
+        self.place(self.big, progress=4)
+        self.place(self.big, progress=5, status=3)  # restart فاشل: ما زال يحجز موارده
+        self.place(self.big, is_active=False)
+        self.create_deployment(node=self.big, placed_at=timezone.now())  # منتظر في الطابور
+
+        ledger = capacity.get_ledger("big")
+        self.assertEqual(ledger["deployments"], 2)
+        self.assertEqual(ledger["cpu"]["reserved"], 2.0)
+        self.assertEqual(ledger["ram"]["reserved"], 2048)
+        self.assertEqual(ledger["ram"]["free"], 2048)
+
+    def test_check_admission(self):
+        deployment = self.create_deployment(node=self.small, placed_at=timezone.now())
+        self.assertTrue(capacity.check_admission(deployment)[0])
+
+        self.place(self.small, progress=5)
+        self.place(self.small)
+        fits, reason, _ = capacity.check_admission(deployment)
+        self.assertFalse(fits)
+        self.assertIn("reservations on small", reason)
+
+    def test_admit_deployment_marks_admitted(self):
+        deployment = self.create_deployment()
+        job = jobs.enqueue_job("deploy", deployment=deployment)
+        self.assertTrue(jobs.admit_deployment(job))
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.node, self.small)
+        self.assertIsNotNone(deployment.admitted_at)
+        # إعادة المحاولة لا تعيد فحص السعة
+        self.assertTrue(jobs.admit_deployment(job))
+
+    def test_admit_deployment_queues_without_room(self):
+        huge = Plan.objects.create(name="huge", cpu=8, ram=8192, storage=8000)
+        deployment = self.create_deployment(plan=huge)
+        job = jobs.enqueue_job("deploy", deployment=deployment)
+
+        with mock.patch.object(jobs, "CAPACITY_ADMISSION", "queue"):
+            self.assertFalse(jobs.admit_deployment(job))
+        retry = DeploymentJob.objects.filter(deployment=deployment).exclude(id=job.id).get()
+        self.assertIn("waiting_since", retry.payload)
+        deployment.refresh_from_db()
+        self.assertIsNone(deployment.admitted_at)
+        self.assertNotEqual(deployment.progress, 5)
+
+    def test_admit_deployment_rejects(self):
+        huge = Plan.objects.create(name="huge", cpu=8, ram=8192, storage=8000)
+        deployment = self.create_deployment(plan=huge)
+        job = jobs.enqueue_job("deploy", deployment=deployment)
+
+        with mock.patch.object(jobs, "CAPACITY_ADMISSION", "reject"):
+            self.assertFalse(jobs.admit_deployment(job))
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.progress, 5)
+        self.assertTrue(deployment.notes.startswith("Rejected by admission control"))
+        self.assertFalse(DeploymentJob.objects.exclude(id=job.id).exists())
+
+    def test_queued_deployment_is_rejected_after_timeout(self):
+        huge = Plan.objects.create(name="huge", cpu=8, ram=8192, storage=8000)
+        deployment = self.create_deployment(plan=huge)
+        waiting_since = (timezone.now() - timedelta(seconds=jobs.CAPACITY_QUEUE_TIMEOUT + 1)).isoformat()
+        job = jobs.enqueue_job("deploy", deployment=deployment, payload={"waiting_since": waiting_since})
+
+        with mock.patch.object(jobs, "CAPACITY_ADMISSION", "queue"):
+            self.assertFalse(jobs.admit_deployment(job))
+        deployment.refresh_from_db()
+        self.assertEqual(deployment.progress, 5)
+
+
+class FakeDockerTestCase(FleetTestCase):
+    """كل العملاء (المحلي و DockerNodes) من FakeDockerClient"""
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(docker_client, "DOCKER_CLIENT_FACTORY", "deployments.tests.FakeDockerClient")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        docker_client.reset_docker_client()
+        self.addCleanup(docker_client.reset_docker_client)
+
+
+class ClientRoutingTests(FakeDockerTestCase):
+    def test_deployment_client_targets_its_node(self):
+        on_node = self.create_deployment(node=self.big, placed_at=timezone.now())
+        local = self.create_deployment(placed_at=timezone.now())
+
+        client = docker_client.get_deployment_client(on_node)
+        self.assertEqual(client.base_url, self.big.base_url)
+        self.assertIs(docker_client.get_deployment_client(on_node), client)
+        self.assertEqual(docker_client.get_deployment_client(local).base_url, docker_client.DOCKER_BASE_URL)
+        self.assertIsNot(docker_client.get_deployment_client(local), client)
+
+    def test_changed_base_url_reconnects(self):
+        deployment = self.create_deployment(node=self.big, placed_at=timezone.now())
+        old = docker_client.get_deployment_client(deployment)
+        self.big.base_url = "tcp://10.0.0.9:2376"
+        self.big.save()
+        deployment.refresh_from_db()
+        new = docker_client.get_deployment_client(deployment)
+        self.assertEqual(new.base_url, "tcp://10.0.0.9:2376")
+        self.assertTrue(old.closed)
+
+    def test_volume_on_node_without_shared_storage_is_refused(self):
+        deployment = self.create_deployment(node=self.remote, placed_at=timezone.now())
+        with self.assertRaises(RuntimeError):
+            deployment.create_xfs_volume()
+
+
+class InlineExecutor:
+    """بديل ThreadPoolExecutor: الـ threads لا ترى بيانات transaction الاختبار"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+class ImageCacheTests(FakeDockerTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, patched in [("ThreadPoolExecutor", InlineExecutor), ("close_old_connections", lambda: None)]:
+            patcher = mock.patch.object(images, name, patched)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_warm_pulls_on_every_candidate_host(self):
+        results = images.warm_images({"nginx:1.27"})
+        self.assertEqual(sorted(c.node.name for c in results), ["big", "small"])
+        self.assertTrue(all(c.status == "pulled" for c in results))
+        for node in (self.big, self.small):
+            self.assertIn("nginx:1.27", docker_client.get_docker_client(node).images.pulled)
+        self.assertFalse(CachedImage.objects.filter(node=self.remote).exists())
+
+    def test_touch_is_per_host(self):
+        images.warm_images({"nginx:1.27"})
+        images.touch_images({"nginx:1.27"}, self.big)
+        self.assertIsNotNone(CachedImage.objects.get(node=self.big).last_used_at)
+        self.assertIsNone(CachedImage.objects.get(node=self.small).last_used_at)
+
+    def test_budget_applies_per_host(self):
+        images.warm_images({"redis:7", "nginx:1.27"}, nodes=[self.big])
+        images.warm_images({"redis:7"}, nodes=[self.small])
+        images.touch_images({"nginx:1.27"}, self.big)
+
+        evicted = images.evict_images(budget=150)
+        self.assertEqual([(c.reference, c.node_id) for c in evicted], [("redis:7", self.big.id)])
+        self.assertNotIn("redis:7", docker_client.get_docker_client(self.big).images.pulled)
+        self.assertEqual(CachedImage.objects.get(reference="redis:7", node=self.small).status, "pulled")
+
+
+class BackupMemberTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        self.archive = io.BytesIO()
+        with tarfile.open(fileobj=self.archive, mode="w") as tar:
+            for name in ["files.tar.zst", "../escape"]:
+                info = tarfile.TarInfo(name)
+                info.size = 4
+                tar.addfile(info, io.BytesIO(b"data"))
+            link = tarfile.TarInfo("link")
+            link.type = tarfile.SYMTYPE
+            link.linkname = "/etc/passwd"
+            tar.addfile(link)
+
+    def open(self):
+        self.archive.seek(0)
+        return tarfile.open(fileobj=self.archive, mode="r:")
+
+    def test_plain_member_is_extracted(self):
+        with self.open() as tar:
+            path = extract_backup_member(tar, "files.tar.zst", self.tmp_dir)
+        self.assertEqual(path, os.path.join(self.tmp_dir, "files.tar.zst"))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"data")
+
+    def test_unsafe_members_are_rejected(self):
+        for name in ["../escape", "/etc/passwd", "a/b", "..", "", "link", "missing", 5]:
+            with self.open() as tar, self.assertRaises(RuntimeError):
+                extract_backup_member(tar, name, self.tmp_dir)
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+
+class BackupSchedulerTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="owner")
+        project = AvailableProject.objects.create(name="test")
+        self.deployment = Deployment.objects.create(user=user, project=project)
+        self.policy = BackupPolicy.objects.create(
+            deployment=self.deployment, next_run_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def create_backup(self, status, age):
+        backup = DeploymentBackup.objects.create(deployment=self.deployment, policy=self.policy, status=status)
+        created = timezone.now() - age
+        DeploymentBackup.objects.filter(id=backup.id).update(
+            created_at=created, started_at=created if status == "running" else None,
+        )
+        return backup
+
+    def test_backup_in_progress_skips_policy(self):
+        self.create_backup("running", timedelta(minutes=5))
+        self.assertEqual(backup_scheduler.schedule_due_backups(), 0)
+
+    def test_stale_backups_are_failed_and_do_not_block(self):
+        stale = timedelta(seconds=backup_scheduler.BACKUP_STALE_TIMEOUT + 60)
+        orphaned = self.create_backup("pending", stale)
+        crashed = self.create_backup("running", stale)
+
+        self.assertEqual(backup_scheduler.schedule_due_backups(), 1)
+        for backup in (orphaned, crashed):
+            backup.refresh_from_db()
+            self.assertEqual(backup.status, "failed")
+        self.assertEqual(self.policy.backups.filter(status="pending").count(), 1)
+
+
+class ComposeRenderQueryTests(TestCase):
+    """عدد الاستعلامات لكل render ثابت مهما كان عدد الـ services"""
+    RENDER_QUERIES = 3  # الحاويات (مع project_container)، الاشتراك (مع الخطة)، المشروع
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        patcher = mock.patch.object(
+            Deployment, "get_volume_storage_data", new_callable=mock.PropertyMock,
+            return_value={"volume_name": "vol_test", "img_path": "", "mount_dir": self.tmp_dir, "system": "Linux"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username="render")
+        self.plan = Plan.objects.create(name="basic", cpu=2, ram=2048, storage=1000)
+
+    def create_deployment(self, services):
+        template = {"services": {
+            f"s{i}": {
+                "image": "nginx:alpine",
+                "volumes": ["data:/data"],
+                "depends_on": [f"s{i - 1}"] if i else [],
+                "environment": {
+                    "PEER": "{container.s0.container_name}",
+                    "HOST": f"{{dc.s{i}.domain}}",
+                    "DEPLOYMENT": "{deployment.id}",
+                },
+            }
+            for i in range(services)
+        }}
+        project = AvailableProject.objects.create(name=f"p{services}", docker_compose_template=yaml.dump(template))
+        deployment = Deployment.objects.create(user=self.user, project=project, deployment_name=f"d{services}")
+        Subscription.objects.create(deployment=deployment, plan=self.plan, duration="monthly")
+        for i in range(services):
+            DeploymentContainer.objects.create(
+                deployment=deployment, service_name=f"s{i}", dc_name=f"d{services}_s{i}",
+                container_name=f"d{services}-s{i}", domain=f"s{i}.example.com",
+            )
+        return Deployment.objects.get(id=deployment.id)
+
+    def test_query_count_does_not_grow_with_services(self):
+        for services in (2, 8):
+            deployment = self.create_deployment(services)
+            with self.assertNumQueries(self.RENDER_QUERIES):
+                rendered = yaml.safe_load(deployment.render_docker_resolved_compose_template())
+            self.assertEqual(len(rendered["services"]), services)
+            last = rendered["services"][f"d{services}_s{services - 1}"]
+            self.assertEqual(last["environment"]["PEER"], f"d{services}-s0")
+            self.assertEqual(last["environment"]["HOST"], f"s{services - 1}.example.com")
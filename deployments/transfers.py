@@ -0,0 +1,286 @@
+# deployments/transfers.py
+"""
+تنزيل ورفع ملفات النسخ الاحتياطية الكبيرة.
+
+التنزيل:
+- HTTP Range (206 / 416) مع ETag و If-Range، فيكمل المتصفح أو curl -C التنزيل المنقطع.
+- خلف nginx / Apache: BACKUP_DOWNLOAD_OFFLOAD يعيد X-Accel-Redirect / X-Sendfile فقط،
+  والخادم يرسل الملف ويتعامل مع Range بنفسه بدون حجز عامل Django.
+
+الرفع (BackupUpload):
+- init ثم chunks بحجم ثابت تُكتب مباشرة في ملف .part داخل مجلد النسخ (بدون ملفات Django المؤقتة).
+- كل chunk يُكتب عند offset = received فقط، ويمكن إعادة إرساله بعد الانقطاع من آخر offset مؤكد.
+  القراءة من العميل و fsync تتم قبل قفل الصف، والقفل فقط للتحقق من offset وتقديم received.
+- sha256 لكل chunk يُحفظ، وعند complete يُعاد حساب الملف كاملاً ومقارنته قبل rename إلى الاسم النهائي.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from django.utils.text import get_valid_filename
+
+from .compression import codec_for_path
+from .models import BackupUpload, DeploymentBackup
+
+logger = logging.getLogger(__name__)
+
+BACKUP_ROOT = "/var/lib/containers/backups"
+BACKUP_DOWNLOAD_OFFLOAD = getattr(settings, "BACKUP_DOWNLOAD_OFFLOAD", None)  # None | "x-accel" | "x-sendfile"
+BACKUP_ACCEL_PREFIX = getattr(settings, "BACKUP_ACCEL_PREFIX", "/protected-backups/")  # location internal في nginx
+BACKUP_UPLOAD_CHUNK_SIZE = getattr(settings, "BACKUP_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+BACKUP_UPLOAD_EXPIRY = getattr(settings, "BACKUP_UPLOAD_EXPIRY", 24 * 3600)  # ثواني بدون أي chunk قبل الحذف
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadError(Exception):
+    """خطأ في بروتوكول الرفع، status هو كود HTTP المناسب"""
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+# ---------------- Download ----------------
+def get_etag(st):
+    return quote_etag(f"{st.st_size:x}-{st.st_mtime_ns:x}")
+
+
+def parse_range(header, size):
+    """
+    (start, end) شاملة لـ Range واحد، أو None لإرسال الملف كاملاً.
+    ترفع ValueError إذا كان الـ range خارج الملف (416).
+    عدة ranges غير مدعومة ويُرسل الملف كاملاً (مسموح في RFC 9110).
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: آخر N بايت
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def iter_file_range(path, start, end, block_size=STREAM_BLOCK_SIZE):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def backup_file_response(request, path, filename=None):
+    """FileResponse يدعم Range / If-Range، أو offload للـ proxy"""
+    filename = filename or os.path.basename(path)
+    st = os.stat(path)
+    etag = get_etag(st)
+
+    if BACKUP_DOWNLOAD_OFFLOAD:
+        response = HttpResponse(content_type="application/octet-stream")
+        if BACKUP_DOWNLOAD_OFFLOAD == "x-accel":
+            response["X-Accel-Redirect"] = BACKUP_ACCEL_PREFIX + os.path.relpath(path, BACKUP_ROOT)
+        else:
+            response["X-Sendfile"] = path
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["ETag"] = etag
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or if_range == etag or if_range == http_date(st.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), st.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file_range(path, start, end), status=206,
+                                         content_type="application/octet-stream")
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(st.st_mtime)
+    return response
+
+
+# ---------------- Upload ----------------
+def cleanup_stale_uploads():
+    """حذف الرفع غير المكتمل الذي لم يصله أي chunk منذ BACKUP_UPLOAD_EXPIRY"""
+    deadline = timezone.now() - timedelta(seconds=BACKUP_UPLOAD_EXPIRY)
+    for upload in BackupUpload.objects.filter(status="uploading", updated_at__lt=deadline):
+        if os.path.exists(upload.part_path):
+            os.remove(upload.part_path)
+        upload.status = "failed"
+        upload.save(update_fields=["status", "updated_at"])
+        logger.info(f"Stale backup upload {upload.upload_id} expired")
+
+
+def start_upload(deployment, user, filename, size, backup_type):
+    """
+    إنشاء BackupUpload جديد، أو إرجاع رفع غير مكتمل لنفس الملف (استكمال بعد إعادة تحميل الصفحة).
+    """
+    cleanup_stale_uploads()
+    if size <= 0:
+        raise UploadError("Empty file")
+    if backup_type not in dict(DeploymentBackup.BACKUP_TYPE_CHOICES) or backup_type == "snapshot":
+        raise UploadError(f"Invalid backup type {backup_type}")
+
+    name = get_valid_filename(os.path.basename(filename or "")) or "backup"
+    existing = BackupUpload.objects.filter(
+        deployment=deployment, user=user, filename=name, size=size, backup_type=backup_type, status="uploading",
+    ).order_by("-updated_at").first()
+    if existing is not None and os.path.exists(existing.part_path):
+        return existing
+
+    os.makedirs(BACKUP_ROOT, exist_ok=True)
+    if shutil.disk_usage(BACKUP_ROOT).free < size:
+        raise UploadError("Not enough disk space for this backup", status=507)
+
+    timestamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    upload = BackupUpload.objects.create(
+        deployment=deployment,
+        user=user,
+        filename=name,
+        backup_type=backup_type,
+        size=size,
+        chunk_size=BACKUP_UPLOAD_CHUNK_SIZE,
+        file_path=os.path.join(BACKUP_ROOT, f"{deployment.id}_{backup_type}_{timestamp}_{name}"),
+    )
+    open(upload.part_path, "wb").close()
+    return upload
+
+
+def check_chunk(upload, offset, length):
+    """offset يجب أن يساوي received (وإلا 409 مع الـ offset الصحيح للاستكمال) وطول الـ chunk ثابت"""
+    if upload.status != "uploading":
+        raise UploadError(f"Upload is {upload.status}", status=409, offset=upload.received)
+    if offset != upload.received or offset >= upload.size:
+        raise UploadError("Unexpected offset", status=409, offset=upload.received)
+    expected = min(upload.chunk_size, upload.size - offset)
+    if length != expected:
+        raise UploadError(f"Chunk must be {expected} bytes", offset=upload.received)
+
+
+def write_chunk(upload, offset, stream, length, digest=None):
+    """
+    كتابة chunk واحد من stream (request) مباشرة إلى ملف .part، ترجع received الجديد.
+    الـ chunk يُقرأ من العميل (قد يكون بطيئاً) ويُكتب بـ fsync بدون أي قفل،
+    ثم يُقفل الصف فقط لإعادة فحص offset وتقديم received.
+    كتابة متزامنة لنفس الـ offset لا تفسد الرفع: complete_upload يتحقق من sha256 كل chunk على القرص.
+    """
+    upload = BackupUpload.objects.get(id=upload.id)
+    check_chunk(upload, offset, length)
+
+    sha = hashlib.sha256()
+    written = 0
+    with open(upload.part_path, "r+b") as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+            if not data:
+                break
+            sha.update(data)
+            f.write(data)
+            written += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if written != length:
+        raise UploadError("Chunk truncated", offset=upload.received)
+    if digest and digest.lower() != sha.hexdigest():
+        raise UploadError("Chunk checksum mismatch", status=422, offset=upload.received)
+
+    with transaction.atomic():
+        upload = BackupUpload.objects.select_for_update().get(id=upload.id)
+        check_chunk(upload, offset, length)
+        upload.chunk_digests = upload.chunk_digests + [sha.hexdigest()]
+        upload.received = offset + written
+        upload.save(update_fields=["chunk_digests", "received", "updated_at"])
+    return upload.received
+
+
+def get_upload_checksum(chunk_digests):
+    """checksum الرفع كاملاً: sha256 لسلسلة sha256 الـ chunks (يحسبه المتصفح بدون قراءة الملف كاملاً)"""
+    return hashlib.sha256(b"".join(bytes.fromhex(d) for d in chunk_digests)).hexdigest()
+
+
+def find_corrupt_chunk(upload):
+    """index أول chunk في ملف .part لا يطابق sha256 المحفوظ له، أو None"""
+    with open(upload.part_path, "rb") as f:
+        for index, expected in enumerate(upload.chunk_digests):
+            if hashlib.sha256(f.read(upload.chunk_size)).hexdigest() != expected:
+                return index
+    return None
+
+
+def complete_upload(upload, checksum=None):
+    """
+    التحقق من الملف على القرص مقابل sha256 كل chunk (وchecksum العميل إن وجد)،
+    ثم rename إلى الاسم النهائي وإنشاء DeploymentBackup. ترجع الـ DeploymentBackup.
+    عند اكتشاف chunk تالف يرجع received إلى بدايته ليُعاد إرساله فقط.
+    """
+    with transaction.atomic():
+        upload = BackupUpload.objects.select_for_update().get(id=upload.id)
+        if upload.status != "uploading":
+            raise UploadError(f"Upload is {upload.status}", status=409, offset=upload.received)
+        if upload.received != upload.size:
+            raise UploadError("Upload is not finished", status=409, offset=upload.received)
+        if checksum and checksum.lower() != get_upload_checksum(upload.chunk_digests):
+            raise UploadError("Upload checksum mismatch", status=422, offset=upload.received)
+
+        corrupt = find_corrupt_chunk(upload)
+        if corrupt is not None:
+            # الرجوع يُحفظ ويُرفع الخطأ بعد commit (الخطأ داخل atomic يلغي الحفظ)
+            upload.chunk_digests = upload.chunk_digests[:corrupt]
+            upload.received = corrupt * upload.chunk_size
+            upload.save(update_fields=["chunk_digests", "received", "updated_at"])
+        else:
+            os.replace(upload.part_path, upload.file_path)
+            backup = DeploymentBackup.objects.create(
+                deployment=upload.deployment,
+                backup_type=upload.backup_type,
+                file_path=upload.file_path,
+                status="completed",
+                size_mb=int(upload.size / (1024 * 1024)),
+                compression=codec_for_path(upload.file_path).name,
+                backup_summary=f"Uploaded {upload.filename}",
+            )
+            upload.status = "completed"
+            upload.save(update_fields=["status", "updated_at"])
+
+    if corrupt is not None:
+        raise UploadError(f"Chunk {corrupt} is corrupted on disk", status=409, offset=upload.received)
+
+    logger.info(f"Backup upload {upload.upload_id} completed: {upload.file_path}")
+    return backup
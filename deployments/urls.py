@@ -9,12 +9,15 @@ urlpatterns = [
     path('reset-project-domain/<int:deployment_id>', views.reset_project_domain, name='reset_project_domain'),
     path('delete-deployment/<int:deployment_id>', views.delete_deployment, name='delete_deployment'),
     path('deployments/<int:deployment_id>/usage/', views.deployment_usage_api, name='deployment_usage_api'),
+    path('deployments/<int:deployment_id>/progress/', views.deployment_progress_api, name='deployment_progress_api'),
 
 
     path("deployment/<int:deployment_id>/hard-restart/", views.hard_restart_deployment, name="hard_restart_deployment"),
+    path("deployment/<int:deployment_id>/recreate/", views.recreate_deployment, name="recreate_deployment"),
     path("deployment/<int:deployment_id>/restart/", views.restart_deployment, name="restart_deployment"),
     path("deployment/<int:deployment_id>/stopstart/", views.stopstart_deployment, name="stopstart_deployment"),
     path("deployment/<int:deployment_id>/logs/", views.deployment_logs, name="deployment_logs"),
+    path("deployment/<int:deployment_id>/logs/stream/", views.deployment_logs_stream, name="deployment_logs_stream"),
 
     path('deployments/<int:deployment_id>/env-vars/update/', views.update_all_env_vars, name='update_all_env_vars'),
     path('env-settings/<int:deployment_id>/', views.env_settings, name='env_settings'),
@@ -26,6 +29,10 @@ urlpatterns = [
     path("deployments/backups/<int:backup_id>/delete/", views.delete_backup, name="deployment_backup_delete"),
     path("deployments/backups/<int:backup_id>/download/", views.download_backup, name="deployment_backup_download"),
     path("deployments/<int:deployment_id>/backups/upload/", views.upload_backup, name="deployment_backup_upload"),
+    path("deployments/<int:deployment_id>/backups/uploads/", views.upload_backup_init, name="deployment_backup_upload_init"),
+    path("backups/uploads/<uuid:upload_id>/", views.upload_backup_status, name="deployment_backup_upload_status"),
+    path("backups/uploads/<uuid:upload_id>/chunk/", views.upload_backup_chunk, name="deployment_backup_upload_chunk"),
+    path("backups/uploads/<uuid:upload_id>/complete/", views.upload_backup_complete, name="deployment_backup_upload_complete"),
 
 
 
@@ -2,6 +2,10 @@
 import docker
 from docker.errors import DockerException, APIError, ContainerError, NotFound
 from .models import Deployment, DeploymentContainerEnvVar, DeploymentContainer
+from .docker_client import get_deployment_client, get_docker_env
+from .storage import get_path_usage, get_project_id
+from .engine import ComposeEngine, UnsupportedComposeOption, config_hash
+from .limits import calculate_target_limits, to_compose_limits
 from projects.models import ProjectContainer
 from plans.models import Plan
 import socket
@@ -11,10 +15,15 @@ import time
 import subprocess
 import shutil
 import re
+import copy
+from functools import lru_cache
 
 from django.conf import settings
 BASE_DIR = settings.BASE_DIR
 
+# "api": تطبيق الـ compose عبر Docker Engine API داخل العملية، "cli": docker compose
+DEPLOYMENT_COMPOSE_BACKEND = getattr(settings, "DEPLOYMENT_COMPOSE_BACKEND", "api")
+
 logger = logging.getLogger(__name__)
 
 
@@ -62,34 +71,11 @@ def remove_container_if_exists(client, name):
 
 # ---------------- حساب تقسيم الموارد ----------------
 def calculate_resource_limits(deployment):
-    plan_ram_mb = float(getattr(deployment.plan, "ram", 512))
-    plan_cpu = float(getattr(deployment.plan, "cpu", 0.5))
-    containers = list(deployment.containers.all())
-    limits = {}
-
-    # تصنيف حسب النوع
-    backends = [c for c in containers if c.project_container.type in ("backend", "backfront")]
-    frontends = [c for c in containers if c.project_container.type == "frontend"]
-    redis_containers = [c for c in containers if c.project_container.type == "redis"]
-
-    total_weight = len(backends)*2 + len(frontends)*1 + len(redis_containers)*0.5
-
-    for c in containers:
-        if c.project_container.type in ("backend", "backfront"):
-            weight = 2
-        elif c.project_container.type == "frontend":
-            weight = 1
-        else:  # redis أو غيره
-            weight = 0.5
-
-        ram_for_container = int(plan_ram_mb * (weight/total_weight))
-        cpu_for_container = plan_cpu * (weight/total_weight)
-        limits[c.container_name] = {
-            "mem": f"{ram_for_container}m",
-            "cpu": int(cpu_for_container * 100000)
-        }
-
-    return limits
+    """{container_name: {"mem": "256m", "cpu": cpu_quota}} (أوزان limits.py)"""
+    return {
+        name: {"mem": to_compose_limits(target)["memory"], "cpu": int(target["nano_cpus"] / 10_000)}
+        for name, target in calculate_target_limits(deployment).items()
+    }
 
 def expand_env(value, fixed_env):
     """توسيع المتغيرات داخل string أو list أو dict بشكل recursive"""
@@ -108,7 +94,7 @@ def expand_env(value, fixed_env):
 
 # ---------------- Project containers ----------------
 def create_project_container(container):
-    client = docker.from_env()
+    client = get_deployment_client(container.deployment)
     pc = container.project_container
     container_name = container.container_name
 
@@ -170,6 +156,7 @@ def update_deployment(deployment, progress, status):
 
 
 
+@lru_cache(maxsize=None)
 def get_compose_bin():
     """إرجاع الأمر الصحيح لـ docker-compose (قديم أو جديد)."""
     if shutil.which("docker-compose"):
@@ -195,12 +182,13 @@ def get_compose_file_path(deployment, rewrite=True):
     compose_dir.mkdir(parents=True, exist_ok=True)
 
     if rewrite:
-        if compose_file_path.exists():
-            compose_file_path.unlink()
-            logger.info(f"Old compose file {compose_file_path} removed")
+        # لا نعيد كتابة الملف إذا لم يتغير محتواه
+        if compose_file_path.exists() and compose_file_path.read_text() == compose_yaml:
+            logger.debug(f"Compose file {compose_file_path} unchanged")
+            return compose_file_path
 
         compose_file_path.write_text(compose_yaml)
-        logger.info(f"Compose file {compose_file_path} created")
+        logger.info(f"Compose file {compose_file_path} written")
 
     return compose_file_path
 
@@ -213,10 +201,24 @@ def run_compose_command(deployment, command: list, success_status=None, fail_sta
         compose_file_path = get_compose_file_path(deployment, rewrite=rewrite)
         project_name = sanitize_project_name(deployment.deployment_name)
 
+        if DEPLOYMENT_COMPOSE_BACKEND == "api":
+            try:
+                client = get_deployment_client(deployment)
+                ComposeEngine(
+                    project_name, deployment.render_deployment_compose(),
+                    client=client, applied=deployment.applied_services,
+                ).run(command)
+                if success_status is not None:
+                    update_deployment(deployment, progress=4, status=success_status)
+                logger.info(f"Deployment {deployment.id} succeeded: {' '.join(command)} (engine api)")
+                return True
+            except UnsupportedComposeOption as e:
+                logger.info(f"Deployment {deployment.id}: {e}, falling back to compose CLI")
+
         full_cmd = get_compose_bin() + ["-f", str(compose_file_path), "-p", project_name] + command
         logger.debug(f"Running command: {' '.join(full_cmd)}")
 
-        result = subprocess.run(full_cmd, capture_output=True, text=True)
+        result = subprocess.run(full_cmd, capture_output=True, text=True, env=get_docker_env(deployment.node))
 
         if result.returncode == 0:
             if success_status is not None:
@@ -234,9 +236,72 @@ def run_compose_command(deployment, command: list, success_status=None, fail_sta
         return False
 
 
+def mark_services_applied(deployment, hashes=None):
+    """تسجيل إعدادات الـ services التي طُبقت (أو مسحها بعد down)"""
+    deployment.applied_services = deployment.get_service_hashes() if hashes is None else hashes
+    deployment.save(update_fields=["applied_services"])
+
+
+def strip_resource_limits(config):
+    """إعدادات الـ service بدون deploy.resources.limits (هذه تُطبق live بـ reconcile_limits)"""
+    config = copy.deepcopy(config)
+    resources = (config.get("deploy") or {}).get("resources") or {}
+    resources.pop("limits", None)
+    return config
+
+
+def mark_limits_applied(deployment, previous_services, live_containers):
+    """
+    تسجيل الـ services التي تغيرت حدود مواردها فقط وطُبقت live كمُطبقة (بعد refresh_compose_template).
+    previous_services: services الـ compose قبل الـ refresh، live_containers: الحاويات التي تحمل الحدود الجديدة.
+    أي تغيير آخر لم يصل Docker (env، domain...) أو حاوية فشل تحديثها يبقى لـ reconcile_docker.
+    """
+    applied = dict(deployment.applied_services or {})
+    marked = []
+    for name, config in (deployment.render_deployment_compose().get("services") or {}).items():
+        previous = previous_services.get(name)
+        if previous is None or applied.get(name) != config_hash(previous):
+            continue  # الـ compose السابق نفسه لم يُطبق بعد
+        if config.get("container_name") not in live_containers:
+            continue
+        if strip_resource_limits(previous) != strip_resource_limits(config):
+            continue
+        applied[name] = config_hash(config)
+        marked.append(name)
+    mark_services_applied(deployment, applied)
+    return marked
+
+
 # دوال مختصرة
 def run_docker(deployment):
-    return run_compose_command(deployment, ["up", "-d"], success_status=2, rewrite=True)
+    success = run_compose_command(deployment, ["up", "-d"], success_status=2, rewrite=True)
+    if success:
+        mark_services_applied(deployment)
+    return success
+
+def reconcile_docker(deployment):
+    """
+    إعادة إنشاء الـ services التي تغيرت إعداداتها فقط (up -d --no-deps <services>)،
+    الباقي (مثل قاعدة البيانات) يبقى يعمل بدون إعادة تشغيل.
+    """
+    if not deployment.applied_services:
+        return run_docker(deployment)
+
+    changed, removed = deployment.get_changed_services()
+    if not changed and not removed:
+        logger.info(f"Deployment {deployment.id} is already up to date")
+        return True
+
+    command = ["up", "-d", "--no-deps"]
+    if removed:
+        command.append("--remove-orphans")
+    command += changed
+
+    logger.info(f"Reconciling deployment {deployment.id}: changed={changed} removed={removed}")
+    success = run_compose_command(deployment, command, success_status=2, rewrite=True)
+    if success:
+        mark_services_applied(deployment)
+    return success
 
 def start_docker(deployment):
     return run_compose_command(deployment, ["start"], success_status=2)
@@ -248,10 +313,16 @@ def restart_docker(deployment):
     return run_compose_command(deployment, ["restart"], success_status=2)
 
 def delete_docker_compose(deployment):
-    return run_compose_command(deployment, ["down", "-v"], success_status=1)
+    success = run_compose_command(deployment, ["down", "-v"], success_status=1)
+    if success:
+        mark_services_applied(deployment, {})
+    return success
 
 def hard_stop_docker_compose(deployment):
-    return run_compose_command(deployment, ["down"], success_status=1)
+    success = run_compose_command(deployment, ["down"], success_status=1)
+    if success:
+        mark_services_applied(deployment, {})
+    return success
 
 def rebuild_docker(deployment):
     delete_docker_compose(deployment)
@@ -264,38 +335,58 @@ def hard_restart(deployment):
 
 
 import subprocess
-def get_container_usage(container_name, deployment=None):
-    client = docker.from_env()
+def calculate_cpu_percent(stats, prev=None):
+    """
+    نسبة CPU بين إطارين من docker stats.
+    prev: الإطار السابق في وضع الـ streaming، وإلا نستخدم precpu_stats من نفس الإطار.
+    """
+    precpu = (prev or {}).get("cpu_stats") or stats.get("precpu_stats") or {}
+    cpu_stats = stats.get("cpu_stats") or {}
+
+    cpu_delta = cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu_stats.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    cpu_percent = 0.0
+    if system_delta > 0.0 and cpu_delta > 0.0:
+        percpu_count = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+        cpu_percent = (cpu_delta / system_delta) * percpu_count * 100.0
+    return cpu_percent
+
+
+def parse_stats_frame(stats, prev=None):
+    """تحويل إطار docker stats (JSON كبير) إلى سجل مختصر"""
+    memory_stats = stats.get("memory_stats") or {}
+
+    # -------- Network / Block I/O (عدادات تراكمية) --------
+    networks = stats.get("networks") or {}
+    net_rx = sum(n.get("rx_bytes", 0) for n in networks.values())
+    net_tx = sum(n.get("tx_bytes", 0) for n in networks.values())
+
+    blk_read = blk_write = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = str(entry.get("op", "")).lower()
+        if op == "read":
+            blk_read += entry.get("value", 0)
+        elif op == "write":
+            blk_write += entry.get("value", 0)
+
+    return {
+        "used_ram": memory_stats.get("usage", 0),        # Bytes
+        "memory_limit": memory_stats.get("limit", 1),    # Bytes
+        "cpu_percent": round(calculate_cpu_percent(stats, prev), 1),  # النسبة الفعلية
+        "net_rx": net_rx,              # Bytes
+        "net_tx": net_tx,              # Bytes
+        "blk_read": blk_read,          # Bytes
+        "blk_write": blk_write,        # Bytes
+    }
+
 
-    def calculate_cpu_percent(stats):
-        cpu_delta = stats["cpu_stats"]["cpu_usage"]["total_usage"] - stats["precpu_stats"]["cpu_usage"]["total_usage"]
-        system_delta = stats["cpu_stats"].get("system_cpu_usage", 0) - stats["precpu_stats"].get("system_cpu_usage", 0)
-        cpu_percent = 0.0
-        if system_delta > 0.0 and cpu_delta > 0.0:
-            percpu_count = len(stats["cpu_stats"]["cpu_usage"].get("percpu_usage", [])) or 1
-            cpu_percent = (cpu_delta / system_delta) * percpu_count * 100.0
-        return cpu_percent
+def get_container_usage(container_name, deployment=None):
+    client = get_deployment_client(deployment)
 
     try:
         container = client.containers.get(container_name)
         stats = container.stats(stream=False)
-
-        # -------- RAM --------
-        mem_usage = stats["memory_stats"].get("usage", 0)
-        mem_limit = stats["memory_stats"].get("limit", 1)
-
-        # -------- CPU --------
-        cpu_percent = calculate_cpu_percent(stats)
-
-        # -------- Storage --------
-
-
-        return {
-            "used_ram": mem_usage,         # Bytes
-            "memory_limit": mem_limit,     # Bytes
-            "cpu_percent": round(cpu_percent, 1),  # النسبة الفعلية
-            
-        }
+        return parse_stats_frame(stats)
 
     except docker.errors.NotFound:
         return {"error": f"Container {container_name} not found"}
@@ -303,28 +394,26 @@ def get_container_usage(container_name, deployment=None):
         return {"error": str(e)}
     
 def get_storage_usage(deployment=None):
+    """
+    استهلاك التخزين بدون المرور على كل الملفات:
+    XFS project quota على mount_dir، و du مع cache كحل أخير.
+    """
     used_storage = 0
+    limit_storage = None
+    source = None
     if deployment:
         storage_data = deployment.get_volume_storage_data
         mount_dir = storage_data["mount_dir"]
 
         if os.path.exists(mount_dir):
             try:
-                result = subprocess.run(
-                    ["du", "-sb", mount_dir],  # <--- هنا mount_dir وليس path
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                size_bytes = int(result.stdout.split()[0])
-                used_storage = size_bytes
-
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Failed to get storage usage for {mount_dir}: {e}")
+                used_storage, limit_storage, source = get_path_usage(mount_dir, get_project_id(deployment.id))
             except Exception as e:
                 logger.exception(f"Unexpected error while calculating storage for {mount_dir}: {e}")
         else:
             logger.warning(f"Mount directory does not exist: {mount_dir}")
     return {
         "used_storage": used_storage,  # Bytes
+        "limit_storage": limit_storage,  # Bytes (None = لا يوجد حد من نظام الملفات)
+        "source": source,
         }
\ No newline at end of file
@@ -1,11 +1,17 @@
 from django.shortcuts import redirect, get_object_or_404, render
 from django.contrib.auth.decorators import login_required
-from .utils import run_docker, delete_docker_compose, restart_docker, get_container_usage, start_docker, stop_docker, rebuild_docker, hard_restart, get_storage_usage
+from .utils import run_docker, delete_docker_compose, restart_docker, start_docker, stop_docker, rebuild_docker, hard_restart, reconcile_docker
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse, FileResponse, Http404
-import docker, json
-from .models import DeploymentContainerEnvVar, Deployment, DeploymentBackup
+from django.http import JsonResponse, Http404, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+import json
+from .models import DeploymentContainerEnvVar, Deployment, DeploymentBackup, BackupUpload
+from .jobs import enqueue_backup, get_latest_job
+from .transfers import UploadError, backup_file_response, complete_upload, start_upload, write_chunk
+from .docker_client import get_deployment_client
+from .logstream import LogMultiplexer, asse_events, parse_log_timestamp, sse_events
+from monitoring.collector import get_usage_snapshot, summarize_usage
 from projects.models import EnvVarsTitle
 from django.utils.translation import gettext as _
 import logging, os
@@ -22,9 +28,7 @@ def rebuild_project(request, deployment_id):
     deployment.uuid_cache = {}
     deployment.save()
 
-    compose_yaml = deployment.render_docker_resolved_compose_template()
-    deployment.compose_template = compose_yaml
-    deployment.save()
+    deployment.refresh_compose_template()
 
     # استدعاء السكربت لإنشاء Docker container
     success = rebuild_docker(deployment)
@@ -97,51 +101,47 @@ def deployment_detail(request, deployment_id):
 
 @login_required
 def deployment_usage_api(request, deployment_id):
+    """
+    آخر snapshot لاستهلاك الموارد كما جمعه run_usage_collector
+    (لا يوجد أي استدعاء لـ Docker داخل الطلب)
+    """
     deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
-    plan = getattr(deployment, "plan", None)
 
-    total_mem_used = 0
-    total_mem_limit = 0
-    total_cpu_percent = 0
-    total_cpu_limit_percent = 0
-    total_storage_used = 0
+    data = get_usage_snapshot(deployment)
+    if data is None:
+        # الـ collector لم يجمع أي عينة بعد لهذا الـ Deployment
+        data = summarize_usage(getattr(deployment, "plan", None), {}, 0)
+        data["collected_at"] = None
+        data["stale"] = True
 
-    containers = deployment.containers.all()
-    if not containers.exists():
-        return JsonResponse({"error": "No containers found"}, status=400)
-    total_storage_used = get_storage_usage(deployment).get("used_storage", 0)
-    for dc in containers:
-        usage = get_container_usage(dc.container_name, deployment=deployment)
-        if "error" in usage:
-            continue
-
-        total_mem_used += usage.get("used_ram", 0)
-        total_mem_limit += usage.get("memory_limit", 0)
-        
+    return JsonResponse(data)
 
-        # -------- CPU --------
-        cpu_limit_cores = float(getattr(plan, "cpu", 1))  # تحويل Decimal إلى float
-        cpu_limit_percent = cpu_limit_cores * 100
-        total_cpu_percent += (usage.get("cpu_percent", 0) / 100) * cpu_limit_percent
-        total_cpu_limit_percent += cpu_limit_percent
 
-    # تحويل Bytes إلى MB
-    mem_used_mb = round(total_mem_used / (1024 * 1024), 2)
-    mem_limit_mb = round(total_mem_limit / (1024 * 1024), 2)
-    storage_used_mb = round(total_storage_used / (1024 * 1024), 2)
 
-    cpu_percent_final = round((total_cpu_percent / total_cpu_limit_percent) * 100, 1) if total_cpu_limit_percent else 0
+@login_required
+def deployment_progress_api(request, deployment_id):
+    """حالة النشر الحالية (Deployment.progress) + آخر مهمة في طابور النشر"""
+    deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
+    job = get_latest_job(deployment)
 
     data = {
-        "RAM": {"used": mem_used_mb, "limit": mem_limit_mb, "unit": "MB"},
-        "CPU": {"used": cpu_percent_final, "limit": 100, "unit": "%"},
-        "Storage": {"used": storage_used_mb, "limit": getattr(plan, "storage", 0), "unit": "MB"}
+        "progress": deployment.progress,
+        "progress_display": deployment.get_progress_display(),
+        "status": deployment.status,
+        "status_display": deployment.get_status_display(),
+        "job": None,
     }
-
+    if job:
+        data["job"] = {
+            "id": job.id,
+            "action": job.action,
+            "status": job.status,
+            "attempts": job.attempts,
+            "error": job.error_message,
+        }
     return JsonResponse(data)
 
 
-
 def delete_deployment(request, deployment_id):
     deployment = Deployment.objects.get(id=deployment_id)
     if deployment:
@@ -162,18 +162,34 @@ def restart_deployment(request, deployment_id):
 
 @csrf_exempt
 def hard_restart_deployment(request, deployment_id):
+    """تطبيق التغييرات المعلقة: إعادة إنشاء الـ services التي تغيرت فقط (قاعدة البيانات تبقى تعمل)"""
     deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
 
-    compose_yaml = deployment.render_docker_resolved_compose_template()
-    deployment.compose_template = compose_yaml
-    deployment.save()
+    deployment.refresh_compose_template()
 
     try:
-        hard_restart(deployment)
+        if not reconcile_docker(deployment):
+            return JsonResponse({"success": False, "message": "Failed to apply changes"})
         return JsonResponse({"success": True, "message": "Device restarted"})
     except Exception as e:
         return JsonResponse({"success": False, "message": str(e)})
 
+@csrf_exempt
+def recreate_deployment(request, deployment_id):
+    """إعادة إنشاء كل الحاويات (down ثم up)، إجراء صريح فقط"""
+    deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Invalid request"}, status=405)
+
+    deployment.refresh_compose_template()
+
+    try:
+        if not hard_restart(deployment):
+            return JsonResponse({"success": False, "message": "Failed to recreate containers"})
+        return JsonResponse({"success": True, "message": "All containers recreated"})
+    except Exception as e:
+        return JsonResponse({"success": False, "message": str(e)})
+
 @csrf_exempt
 def stopstart_deployment(request, deployment_id):
     deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
@@ -187,8 +203,8 @@ def stopstart_deployment(request, deployment_id):
         return JsonResponse({"success": False, "message": str(e)})
 
 def deployment_logs(request, deployment_id):
-    client = docker.from_env()
     deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
+    client = get_deployment_client(deployment)
     logs_data = []
 
     containers = deployment.containers.all()
@@ -209,6 +225,36 @@ def deployment_logs(request, deployment_id):
 
 
 
+@login_required
+def deployment_logs_stream(request, deployment_id):
+    """
+    متابعة سجلات جميع حاويات الـ Deployment عبر Server-Sent Events.
+    عند إعادة الاتصال يرسل المتصفح Last-Event-ID فنكمل من آخر سطر فقط.
+    """
+    deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
+
+    since = None
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("since")
+    if last_event_id:
+        since = parse_log_timestamp(last_event_id)
+        if since:
+            since += 0.000001  # since في Docker شامل: لا نعيد آخر سطر تم إرساله
+    try:
+        tail = max(0, min(int(request.GET.get("tail", 100)), 5000))
+    except ValueError:
+        tail = 100
+
+    container_names = list(deployment.containers.values_list("container_name", flat=True))
+    mux = LogMultiplexer(container_names, since=since, tail=tail, node=deployment.node)
+    # تحت ASGI نستخدم async iterator حتى لا يتم تجميع الـ stream في الذاكرة
+    events = asse_events(mux) if isinstance(request, ASGIRequest) else sse_events(mux)
+
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def env_settings(request, deployment_id):
     deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
     vars_titles = EnvVarsTitle.objects.filter()
@@ -254,6 +300,11 @@ def update_all_env_vars(request, deployment_id):
 
                     env_var.save()
 
+            # تطبيق القيم الجديدة على الـ services المتأثرة فقط (up -d --no-deps <changed>)
+            deployment.refresh_compose_template()
+            if not reconcile_docker(deployment):
+                return JsonResponse({'success': False, 'error': _("Failed to apply environment variables")})
+
             return JsonResponse({'success': True})
 
         except Exception as e:
@@ -285,7 +336,8 @@ def change_project_domain(request, deployment_id):
         # هنا يمكن إضافة أي تحقق إضافي للدومين (format / DNS / regex)
         container.domain = new_domain
         container.save()
-        hard_restart(deployment)
+        deployment.refresh_compose_template()
+        reconcile_docker(deployment)
         messages.success(request, _(f"Project domain updated to {new_domain}."))
         return redirect('deployment_detail', deployment_id)
 
@@ -313,7 +365,8 @@ def reset_project_domain(request, deployment_id):
     # هنا يمكن إضافة أي تحقق إضافي للدومين (format / DNS / regex)
     container.domain = new_domain
     container.save()
-    hard_restart(deployment)
+    deployment.refresh_compose_template()
+    reconcile_docker(deployment)
     
     messages.success(request, _(f"Project domain updated to {new_domain}."))
     return redirect('deployment_detail', deployment_id)
@@ -341,7 +394,8 @@ def deployment_backups(request, deployment_id):
 # -------------------------------
 def create_backup(request, deployment_id):
     """
-    إنشاء نسخة احتياطية للملفات، قاعدة البيانات أو النسخة الكاملة حسب اختيار المستخدم
+    إنشاء نسخة احتياطية للملفات، قاعدة البيانات أو النسخة الكاملة حسب اختيار المستخدم.
+    النسخ يتم في عمّال الطابور ضمن حدود التزامن (deployments.backup_scheduler)
     """
     deployment = get_object_or_404(Deployment, id=deployment_id)
 
@@ -362,19 +416,13 @@ def create_backup(request, deployment_id):
                 backup_type = "files"
                 logger.warning(f"DB config missing: creating files-only backup for deployment {deployment.id}")
 
-        backup = DeploymentBackup.objects.create(
-            deployment=deployment,
-            backup_type=backup_type
-        )
-
         try:
-            backup_file = backup.create_backup()
-            summary_msg = backup.backup_summary or _(f"Backup ({backup_type}) created successfully.")
-            messages.success(request, summary_msg)
-            logger.info(f"Backup created successfully: {backup_file}")
+            backup = enqueue_backup(deployment, backup_type)
+            messages.success(request, _(f"Backup ({backup_type}) queued, it will start shortly."))
+            logger.info(f"Backup {backup.id} queued for deployment {deployment.id}")
         except Exception as e:
             messages.error(request, _(f"Failed to create backup: {e}"))
-            logger.error(f"Failed to create backup for deployment {deployment.id}: {e}", exc_info=True)
+            logger.error(f"Failed to queue backup for deployment {deployment.id}: {e}", exc_info=True)
 
     return redirect("deployment_backups", deployment_id=deployment.id)
 
@@ -407,10 +455,7 @@ def delete_backup(request, backup_id):
         deployment_id = backup.deployment.id
         try:
             # احذف الملف من النظام إذا موجود
-            if backup.file_path and os.path.exists(backup.file_path):
-                os.remove(backup.file_path)
-                logger.info(f"Backup file deleted: {backup.file_path}")
-
+            backup.remove_files()
             backup.delete()
             messages.success(request, _("Backup deleted successfully."))
             logger.info(f"Backup record deleted: {backup_id}")
@@ -425,19 +470,19 @@ def delete_backup(request, backup_id):
 
 @login_required
 def download_backup(request, backup_id):
-    backup = get_object_or_404(DeploymentBackup, id=backup_id)
+    backup = get_object_or_404(DeploymentBackup, id=backup_id, deployment__user=request.user)
 
-    if not backup.file_path or not os.path.exists(backup.file_path):
+    # snapshot تزايدي: الملف هو manifest فقط والبيانات في مستودع الـ chunks
+    if backup.snapshot or not backup.file_path or not os.path.exists(backup.file_path):
         raise Http404("Backup file not found.")
 
-    filename = os.path.basename(backup.file_path)
-    response = FileResponse(open(backup.file_path, "rb"), as_attachment=True, filename=filename)
-    return response
+    # Range للاستكمال، أو X-Accel-Redirect / X-Sendfile خلف الـ proxy
+    return backup_file_response(request, backup.file_path)
 
 
 @login_required
 def upload_backup(request, deployment_id):
-    deployment = get_object_or_404(Deployment, id=deployment_id)
+    deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
 
     if request.method == "POST":
         backup_file = request.FILES.get("backup_file")
@@ -467,3 +512,83 @@ def upload_backup(request, deployment_id):
         logger.info(f"Backup uploaded: {save_path}")
 
     return redirect("deployment_backups", deployment_id=deployment.id)
+
+
+# -------------------------------
+# رفع على أجزاء قابل للاستكمال
+# -------------------------------
+def _upload_state(upload):
+    return {
+        "success": True,
+        "upload_id": str(upload.upload_id),
+        "offset": upload.received,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "status": upload.status,
+    }
+
+
+def _upload_error(e):
+    return JsonResponse({"success": False, "error": str(e), "offset": e.offset}, status=e.status)
+
+
+@login_required
+def upload_backup_init(request, deployment_id):
+    """بدء رفع جديد أو استكمال رفع غير مكتمل لنفس الملف"""
+    deployment = get_object_or_404(Deployment, id=deployment_id, user=request.user)
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid request"}, status=405)
+    try:
+        data = json.loads(request.body or "{}")
+        upload = start_upload(
+            deployment, request.user, data.get("filename"), int(data.get("size") or 0), data.get("backup_type", "full"),
+        )
+    except (ValueError, TypeError) as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_state(upload))
+
+
+@login_required
+def upload_backup_chunk(request, upload_id):
+    """
+    body = بايتات الـ chunk كما هي، الهيدرز:
+    X-Upload-Offset (إلزامي) و X-Chunk-Sha256 (اختياري للتحقق من الـ chunk)
+    """
+    upload = get_object_or_404(BackupUpload, upload_id=upload_id, user=request.user)
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid request"}, status=405)
+    try:
+        offset = int(request.headers.get("X-Upload-Offset", ""))
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Missing X-Upload-Offset", "offset": upload.received}, status=400)
+    try:
+        received = write_chunk(upload, offset, request, length, request.headers.get("X-Chunk-Sha256"))
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({"success": True, "offset": received})
+
+
+@login_required
+def upload_backup_status(request, upload_id):
+    upload = get_object_or_404(BackupUpload, upload_id=upload_id, user=request.user)
+    return JsonResponse(_upload_state(upload))
+
+
+@login_required
+def upload_backup_complete(request, upload_id):
+    """التحقق من sha256 ونقل الملف إلى مكانه النهائي وإنشاء DeploymentBackup"""
+    upload = get_object_or_404(BackupUpload, upload_id=upload_id, user=request.user)
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid request"}, status=405)
+    try:
+        data = json.loads(request.body or "{}")
+        backup = complete_upload(upload, data.get("sha256"))
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+    except UploadError as e:
+        return _upload_error(e)
+    messages.success(request, _("Backup uploaded successfully."))
+    return JsonResponse({"success": True, "backup_id": backup.id})
@@ -0,0 +1,125 @@
+# deployments/volume_pool.py
+"""
+مخزون (pool) من صور XFS مُهيأة مسبقاً لكل حجم تخزين في الخطط.
+
+truncate + mkfs.xfs يتمان في الخلفية (run_deployment_workers / refill_volume_pool)،
+وعند الشراء يكفي os.rename ذري لصورة جاهزة إلى img_path الخاص بالـ Deployment.
+
+الصور قيد التهيئة تحمل اللاحقة .tmp ولا تُسحب إلا بعد rename إلى .img.
+"""
+import logging
+import os
+import subprocess
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# يجب أن يكون على نفس نظام الملفات مع /var/lib/containers/data حتى يكون rename ذرياً
+VOLUME_POOL_DIR = getattr(settings, "VOLUME_POOL_DIR", "/var/lib/containers/pool")
+VOLUME_POOL_TARGET = getattr(settings, "VOLUME_POOL_TARGET", 3)  # عدد الصور الجاهزة لكل حجم
+VOLUME_POOL_STALE_TMP = 3600  # ثواني: ملف .tmp أقدم من هذا بقي من عامل توقف أثناء التهيئة
+
+
+def get_size_dir(size_mb):
+    return os.path.join(VOLUME_POOL_DIR, f"{int(size_mb)}m")
+
+
+def get_pool_sizes():
+    """أحجام التخزين المختلفة في جميع الخطط"""
+    from plans.models import Plan
+    return sorted(set(Plan.objects.values_list("storage", flat=True)))
+
+
+def list_ready(size_mb):
+    size_dir = get_size_dir(size_mb)
+    try:
+        return sorted(f for f in os.listdir(size_dir) if f.endswith(".img"))
+    except FileNotFoundError:
+        return []
+
+
+def claim_image(size_mb, dest_path):
+    """
+    نقل صورة جاهزة إلى dest_path بـ rename ذري.
+    ترجع False إذا كان الـ pool فارغاً (يتم الإنشاء المباشر كالسابق).
+    """
+    if os.path.exists(dest_path):
+        return False
+
+    size_dir = get_size_dir(size_mb)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    for name in list_ready(size_mb):
+        try:
+            os.rename(os.path.join(size_dir, name), dest_path)
+        except FileNotFoundError:
+            continue  # عامل آخر سحب نفس الصورة
+        except OSError as e:
+            logger.warning(f"Could not claim pooled volume {name}: {e}")
+            return False
+        logger.info(f"Pooled XFS image {name} ({size_mb} MB) claimed as {dest_path}")
+        return True
+
+    logger.info(f"Volume pool for {size_mb} MB is empty")
+    return False
+
+
+def create_image(size_mb):
+    """تهيئة صورة XFS جديدة في الـ pool"""
+    size_dir = get_size_dir(size_mb)
+    os.makedirs(size_dir, exist_ok=True)
+    name = uuid.uuid4().hex
+    tmp_path = os.path.join(size_dir, f"{name}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.truncate(int(size_mb) * 1024 * 1024)
+        subprocess.run(["mkfs.xfs", "-f", "-q", tmp_path], check=True, capture_output=True)
+        os.rename(tmp_path, os.path.join(size_dir, f"{name}.img"))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+def remove_stale_tmp(size_mb):
+    size_dir = get_size_dir(size_mb)
+    try:
+        names = [f for f in os.listdir(size_dir) if f.endswith(".tmp")]
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(size_dir, name)
+        try:
+            if time.time() - os.path.getmtime(path) > VOLUME_POOL_STALE_TMP:
+                os.remove(path)
+                logger.info(f"Stale pool file {path} removed")
+        except FileNotFoundError:
+            pass
+
+
+def fill_pool(size_mb, target=VOLUME_POOL_TARGET):
+    """إكمال عدد الصور الجاهزة لحجم واحد حتى target، ترجع عدد الصور المضافة"""
+    remove_stale_tmp(size_mb)
+    created = 0
+    for _ in range(max(0, target - len(list_ready(size_mb)))):
+        try:
+            create_image(size_mb)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.error(f"Failed to pre-format XFS image of {size_mb} MB: {e}")
+            break
+        created += 1
+    if created:
+        logger.info(f"{created} XFS images of {size_mb} MB added to the pool")
+    return created
+
+
+def refill_pools(sizes=None, target=VOLUME_POOL_TARGET):
+    """إكمال الـ pool لكل أحجام الخطط، ترجع {size_mb: added}"""
+    return {size: fill_pool(size, target) for size in (sizes or get_pool_sizes())}
+
+
+def pool_status(sizes=None):
+    return {size: len(list_ready(size)) for size in (sizes or get_pool_sizes())}
@@ -0,0 +1,216 @@
+# monitoring/collector.py
+"""
+جامع استهلاك الموارد (Usage Collector).
+
+يأخذ عينة من جميع الحاويات مرة كل interval ويخزن آخر snapshot لكل Deployment
+في DeploymentUsageSnapshot، بحيث لا يلمس deployment_usage_api الـ Docker إطلاقاً.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from deployments.models import Deployment
+from deployments.utils import get_container_usage, get_storage_usage
+from plans.models import Subscription
+from .models import DeploymentUsageSnapshot
+from .metrics import make_sample, record_samples, run_maintenance
+from .streams import StatsStreamer
+from .rebalance import ADAPTIVE_LIMITS_INTERVAL, rebalance_all
+
+logger = logging.getLogger(__name__)
+
+MONITORING_INTERVAL = getattr(settings, "MONITORING_INTERVAL", 5)  # ثواني
+MONITORING_WORKERS = getattr(settings, "MONITORING_WORKERS", 16)
+MONITORING_MAINTENANCE_INTERVAL = getattr(settings, "MONITORING_MAINTENANCE_INTERVAL", 60)  # ثواني
+MONITORING_STATS_MODE = getattr(settings, "MONITORING_STATS_MODE", "stream")  # stream | oneshot
+
+
+def summarize_usage(plan, containers_usage, storage_used):
+    """
+    تجميع استهلاك حاويات Deployment واحد بنفس صيغة deployment_usage_api
+    containers_usage: {container_name: usage dict من get_container_usage}
+    """
+    total_mem_used = 0
+    total_mem_limit = 0
+    total_cpu_percent = 0
+    total_cpu_limit_percent = 0
+
+    for usage in containers_usage.values():
+        if "error" in usage:
+            continue
+
+        total_mem_used += usage.get("used_ram", 0)
+        total_mem_limit += usage.get("memory_limit", 0)
+
+        # -------- CPU --------
+        cpu_limit_cores = float(getattr(plan, "cpu", 1))  # تحويل Decimal إلى float
+        cpu_limit_percent = cpu_limit_cores * 100
+        total_cpu_percent += (usage.get("cpu_percent", 0) / 100) * cpu_limit_percent
+        total_cpu_limit_percent += cpu_limit_percent
+
+    # تحويل Bytes إلى MB
+    mem_used_mb = round(total_mem_used / (1024 * 1024), 2)
+    mem_limit_mb = round(total_mem_limit / (1024 * 1024), 2)
+    storage_used_mb = round(storage_used / (1024 * 1024), 2)
+
+    cpu_percent_final = round((total_cpu_percent / total_cpu_limit_percent) * 100, 1) if total_cpu_limit_percent else 0
+
+    return {
+        "RAM": {"used": mem_used_mb, "limit": mem_limit_mb, "unit": "MB"},
+        "CPU": {"used": cpu_percent_final, "limit": 100, "unit": "%"},
+        "Storage": {"used": storage_used_mb, "limit": getattr(plan, "storage", 0), "unit": "MB"}
+    }
+
+
+class UsageCollector:
+    """يجمع عينات جميع الحاويات بالتوازي (stats(stream=False) يحجب 1-2 ثانية لكل حاوية)"""
+
+    def __init__(self, interval=MONITORING_INTERVAL, workers=MONITORING_WORKERS, mode=MONITORING_STATS_MODE):
+        self.interval = interval
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="usage-collector")
+        self.streamer = StatsStreamer() if mode == "stream" else None
+        self.last_maintenance = 0.0
+        self.last_rebalance = time.monotonic()  # ننتظر فترة كاملة من العينات قبل أول توزيع
+
+    def get_deployments(self):
+        return list(
+            Deployment.objects.filter(is_active=True, containers__isnull=False)
+            .distinct()
+            .select_related("node")
+            .prefetch_related("containers")
+        )
+
+    def sample_containers(self, owners):
+        """
+        {container_name: usage} لجميع الحاويات دفعة واحدة.
+        owners: {container_name: Deployment} لقراءة كل حاوية من الـ node الخاص بها
+        """
+        container_names = list(owners)
+
+        def oneshot_usage(name):
+            return get_container_usage(name, owners[name])
+
+        if self.streamer is None:
+            results = self.executor.map(oneshot_usage, container_names)
+            return dict(zip(container_names, results))
+
+        # الـ streams على الـ daemon المحلي فقط، حاويات الـ nodes الأخرى تُقرأ عبر عميل الـ node
+        local_names = [name for name in container_names if owners[name].node_id is None]
+        streamed = self.streamer.sync(local_names)
+        usage = self.streamer.snapshot(local_names)
+
+        # حاويات بدون stream (متوقفة، تجاوزت الحد أو على node آخر) تُقرأ بالطريقة القديمة
+        oneshot = [name for name in container_names if name not in streamed]
+        usage.update(zip(oneshot, self.executor.map(oneshot_usage, oneshot)))
+
+        for name in container_names:
+            usage.setdefault(name, {"error": "Waiting for first stats frame"})
+        return usage
+
+    def sample_storage(self, deployments):
+        """{deployment_id: used bytes}"""
+        results = self.executor.map(lambda d: get_storage_usage(d).get("used_storage", 0), deployments)
+        return dict(zip([d.id for d in deployments], results))
+
+    def collect_once(self):
+        started = time.monotonic()
+        deployments = self.get_deployments()
+        if not deployments:
+            return 0
+
+        plans = {
+            sub.deployment_id: sub.plan
+            for sub in Subscription.objects.filter(deployment__in=deployments).select_related("plan")
+        }
+        owners = {dc.container_name: d for d in deployments for dc in d.containers.all()}
+        usage = self.sample_containers(owners)
+        storage = self.sample_storage(deployments)
+
+        now = timezone.now()
+        samples = []
+        for deployment in deployments:
+            containers_usage = {
+                dc.container_name: usage.get(dc.container_name, {"error": "not sampled"})
+                for dc in deployment.containers.all()
+            }
+            samples += [
+                make_sample(dc.id, containers_usage[dc.container_name], ts=now)
+                for dc in deployment.containers.all()
+                if "error" not in containers_usage[dc.container_name]
+            ]
+            data = summarize_usage(plans.get(deployment.id), containers_usage, storage.get(deployment.id, 0))
+            data["containers"] = containers_usage
+
+            DeploymentUsageSnapshot.objects.update_or_create(
+                deployment=deployment,
+                defaults={"data": data, "collected_at": now},
+            )
+
+        record_samples(samples)
+        self.maybe_run_maintenance()
+        self.maybe_rebalance()
+
+        logger.info(
+            f"Usage collected for {len(deployments)} deployments / {len(owners)} containers "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return len(deployments)
+
+    def maybe_run_maintenance(self):
+        """rollup + حذف البيانات المنتهية مرة كل MONITORING_MAINTENANCE_INTERVAL"""
+        if time.monotonic() - self.last_maintenance < MONITORING_MAINTENANCE_INTERVAL:
+            return
+        self.last_maintenance = time.monotonic()
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.exception(f"Metrics maintenance failed: {e}")
+
+    def maybe_rebalance(self):
+        """إعادة توزيع الحدود التكيفية مرة كل ADAPTIVE_LIMITS_INTERVAL"""
+        if time.monotonic() - self.last_rebalance < ADAPTIVE_LIMITS_INTERVAL:
+            return
+        self.last_rebalance = time.monotonic()
+        try:
+            rebalance_all()
+        except Exception as e:
+            logger.exception(f"Adaptive rebalance failed: {e}")
+
+    def run_forever(self, stop_event=None):
+        logger.info(f"Usage collector started (interval={self.interval}s, workers={self.workers})")
+        while not (stop_event and stop_event.is_set()):
+            started = time.monotonic()
+            close_old_connections()
+            try:
+                self.collect_once()
+            except Exception as e:
+                logger.exception(f"Usage collection failed: {e}")
+            delay = max(0, self.interval - (time.monotonic() - started))
+            if stop_event:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+    def close(self):
+        if self.streamer:
+            self.streamer.close()
+        self.executor.shutdown(wait=False)
+
+
+def get_usage_snapshot(deployment):
+    """قراءة آخر snapshot (O(1) - صف واحد بالـ primary key)"""
+    snapshot = DeploymentUsageSnapshot.objects.filter(deployment=deployment).first()
+    if snapshot is None:
+        return None
+
+    data = dict(snapshot.data)
+    data.pop("containers", None)
+    age = (timezone.now() - snapshot.collected_at).total_seconds()
+    data["collected_at"] = snapshot.collected_at.isoformat()
+    data["stale"] = age > MONITORING_INTERVAL * 3
+    return data
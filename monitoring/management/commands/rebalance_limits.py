@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from deployments.models import Deployment
+from monitoring.rebalance import calculate_adaptive_limits, rebalance_all, rebalance_deployment
+
+
+class Command(BaseCommand):
+    help = "إعادة توزيع موارد الخطة بين حاويات الـ Deployments حسب الاستهلاك الفعلي"
+
+    def add_arguments(self, parser):
+        parser.add_argument("deployment_ids", nargs="*", type=int)
+        parser.add_argument("--dry-run", action="store_true", help="عرض الحدود المقترحة بدون تطبيق")
+
+    def handle(self, *args, **options):
+        if not options["deployment_ids"]:
+            if options["dry_run"]:
+                raise CommandError("--dry-run needs deployment ids")
+            updated = rebalance_all()
+            self.stdout.write(self.style.SUCCESS(f"Adaptive limits updated on {updated} containers"))
+            return
+
+        for deployment in Deployment.objects.filter(id__in=options["deployment_ids"]).order_by("id"):
+            if options["dry_run"]:
+                for name, target in calculate_adaptive_limits(deployment).items():
+                    self.stdout.write(
+                        f"{deployment.id:>6} {name:<40} cpu={target['nano_cpus'] / 1e9:.3f} "
+                        f"mem={target['memory'] // (1024 * 1024)}MB"
+                    )
+                continue
+            result = rebalance_deployment(deployment)
+            self.stdout.write(f"{deployment.id:>6} updated={len(result['updated'])} unchanged={len(result['unchanged'])}")
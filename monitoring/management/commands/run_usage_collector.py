@@ -0,0 +1,33 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from monitoring.collector import UsageCollector, MONITORING_INTERVAL, MONITORING_WORKERS, MONITORING_STATS_MODE
+
+
+class Command(BaseCommand):
+    help = "تشغيل جامع استهلاك الموارد وتخزين آخر snapshot لكل Deployment"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=MONITORING_INTERVAL, help="ثواني بين كل جولة")
+        parser.add_argument("--workers", type=int, default=MONITORING_WORKERS, help="عدد threads لأخذ العينات")
+        parser.add_argument("--mode", choices=["stream", "oneshot"], default=MONITORING_STATS_MODE, help="طريقة قراءة docker stats")
+        parser.add_argument("--once", action="store_true", help="جولة واحدة فقط ثم الخروج")
+
+    def handle(self, *args, **options):
+        # جولة واحدة لا تستفيد من الـ streaming (يحتاج إطارين على الأقل)
+        mode = "oneshot" if options["once"] else options["mode"]
+        collector = UsageCollector(interval=options["interval"], workers=options["workers"], mode=mode)
+        try:
+            if options["once"]:
+                count = collector.collect_once()
+                self.stdout.write(self.style.SUCCESS(f"Usage collected for {count} deployments"))
+                return
+
+            stop_event = threading.Event()
+            signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            collector.run_forever(stop_event)
+        finally:
+            collector.close()
@@ -0,0 +1,261 @@
+# monitoring/metrics.py
+"""
+مخزن السلاسل الزمنية لاستهلاك الحاويات.
+
+raw samples -> 1 دقيقة -> 1 ساعة -> 1 يوم
+كل مستوى له مدة احتفاظ (MONITORING_RETENTION) حتى لا تكبر الجداول بلا حدود.
+"""
+import logging
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Avg, Count, F, FloatField, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import ContainerMetricRollup, ContainerMetricSample
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = [60, 3600, 86400]
+
+# مدة الاحتفاظ بالثواني لكل مستوى
+MONITORING_RETENTION = getattr(settings, "MONITORING_RETENTION", {
+    "raw": 6 * 3600,
+    60: 2 * 86400,
+    3600: 30 * 86400,
+    86400: 365 * 86400,
+})
+MONITORING_SAMPLE_INTERVAL = getattr(settings, "MONITORING_INTERVAL", 5)
+MONITORING_BATCH_SIZE = getattr(settings, "MONITORING_BATCH_SIZE", 1000)
+
+_TRUNC = {60: TruncMinute, 3600: TruncHour, 86400: TruncDay}
+# كل مستوى يُبنى من المستوى الأدق منه
+_SOURCE = {60: "raw", 3600: 60, 86400: 3600}
+
+COUNTER_FIELDS = ["net_rx_bytes", "net_tx_bytes", "blk_read_bytes", "blk_write_bytes"]
+ROLLUP_FIELDS = ["samples", "cpu_avg", "cpu_max", "mem_avg", "mem_max"] + COUNTER_FIELDS
+
+
+def _floor(dt, resolution):
+    """بداية الـ bucket (UTC) الذي يحتوي dt"""
+    epoch = int(dt.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % resolution, tz=dt_timezone.utc)
+
+
+# ---------------- Write ----------------
+def make_sample(container_id, usage, ts=None):
+    """تحويل usage dict (من get_container_usage) إلى ContainerMetricSample"""
+    return ContainerMetricSample(
+        container_id=container_id,
+        ts=ts or timezone.now(),
+        cpu_percent=usage.get("cpu_percent", 0),
+        mem_bytes=usage.get("used_ram", 0),
+        net_rx_bytes=usage.get("net_rx", 0),
+        net_tx_bytes=usage.get("net_tx", 0),
+        blk_read_bytes=usage.get("blk_read", 0),
+        blk_write_bytes=usage.get("blk_write", 0),
+    )
+
+
+def record_samples(samples):
+    """إدخال العينات دفعة واحدة (batch insert)"""
+    if not samples:
+        return 0
+    ContainerMetricSample.objects.bulk_create(samples, batch_size=MONITORING_BATCH_SIZE)
+    return len(samples)
+
+
+# ---------------- Rollup ----------------
+def _source_rows(resolution, since, until):
+    source = _SOURCE[resolution]
+    bucket = _TRUNC[resolution]("ts", tzinfo=dt_timezone.utc)
+    counters = {field: Max(field) for field in COUNTER_FIELDS}
+
+    if source == "raw":
+        qs = ContainerMetricSample.objects.all()
+        aggregates = {
+            "samples": Count("id"),
+            "cpu_avg": Avg("cpu_percent"),
+            "cpu_max": Max("cpu_percent"),
+            "mem_avg": Avg("mem_bytes"),
+            "mem_max": Max("mem_bytes"),
+        }
+    else:
+        qs = ContainerMetricRollup.objects.filter(resolution=source)
+        # متوسط موزون بعدد العينات في كل bucket أدق
+        aggregates = {
+            "samples": Sum("samples"),
+            "cpu_weighted": Sum(F("cpu_avg") * F("samples"), output_field=FloatField()),
+            "cpu_max": Max("cpu_max"),
+            "mem_weighted": Sum(F("mem_avg") * F("samples"), output_field=FloatField()),
+            "mem_max": Max("mem_max"),
+        }
+
+    if since:
+        qs = qs.filter(ts__gte=since)
+    return (
+        qs.filter(ts__lt=until)
+        .annotate(bucket=bucket)
+        .values("container_id", "bucket")
+        .annotate(**aggregates, **counters)
+        .order_by()
+    )
+
+
+def rollup(resolution, now=None):
+    """تجميع الـ buckets المكتملة فقط منذ آخر تجميع لهذا المستوى"""
+    now = now or timezone.now()
+    until = _floor(now, resolution)
+    last = ContainerMetricRollup.objects.filter(resolution=resolution).aggregate(last=Max("ts"))["last"]
+    since = last + timedelta(seconds=resolution) if last else None
+    if since and since >= until:
+        return 0
+
+    objs = []
+    for row in _source_rows(resolution, since, until).iterator():
+        samples = row["samples"] or 0
+        if not samples:
+            continue
+        if "cpu_weighted" in row:
+            cpu_avg = (row["cpu_weighted"] or 0) / samples
+            mem_avg = (row["mem_weighted"] or 0) / samples
+        else:
+            cpu_avg = row["cpu_avg"] or 0
+            mem_avg = row["mem_avg"] or 0
+
+        objs.append(ContainerMetricRollup(
+            container_id=row["container_id"],
+            resolution=resolution,
+            ts=row["bucket"],
+            samples=samples,
+            cpu_avg=round(cpu_avg, 2),
+            cpu_max=row["cpu_max"] or 0,
+            mem_avg=int(mem_avg),
+            mem_max=row["mem_max"] or 0,
+            **{field: row[field] or 0 for field in COUNTER_FIELDS},
+        ))
+
+    ContainerMetricRollup.objects.bulk_create(
+        objs,
+        batch_size=MONITORING_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["container", "resolution", "ts"],
+        update_fields=ROLLUP_FIELDS,
+    )
+    if objs:
+        logger.info(f"{len(objs)} metric buckets rolled up at {resolution}s resolution")
+    return len(objs)
+
+
+# ---------------- Retention ----------------
+def _rolled_until(resolution):
+    """نهاية آخر bucket تم تجميعه في هذا المستوى (لا نحذف بيانات لم تُجمّع بعد)"""
+    last = ContainerMetricRollup.objects.filter(resolution=resolution).aggregate(last=Max("ts"))["last"]
+    return last + timedelta(seconds=resolution) if last else None
+
+
+def evict(now=None):
+    """حذف ما تجاوز مدة الاحتفاظ في كل مستوى"""
+    now = now or timezone.now()
+    deleted = 0
+
+    levels = ["raw"] + RESOLUTIONS
+    for index, level in enumerate(levels):
+        cutoff = now - timedelta(seconds=MONITORING_RETENTION[level])
+        if index + 1 < len(levels):
+            rolled = _rolled_until(levels[index + 1])
+            if rolled is None:
+                continue
+            cutoff = min(cutoff, rolled)
+
+        if level == "raw":
+            count, _ = ContainerMetricSample.objects.filter(ts__lt=cutoff).delete()
+        else:
+            count, _ = ContainerMetricRollup.objects.filter(resolution=level, ts__lt=cutoff).delete()
+        deleted += count
+
+    if deleted:
+        logger.info(f"{deleted} expired metric rows evicted")
+    return deleted
+
+
+def run_maintenance(now=None):
+    now = now or timezone.now()
+    for resolution in RESOLUTIONS:
+        rollup(resolution, now)
+    evict(now)
+
+
+# ---------------- Query ----------------
+def _choose_level(start, end, max_points, now):
+    span = max((end - start).total_seconds(), 1)
+    steps = [("raw", MONITORING_SAMPLE_INTERVAL)] + [(res, res) for res in RESOLUTIONS]
+    for level, step in steps:
+        if start < now - timedelta(seconds=MONITORING_RETENTION[level]):
+            continue  # بيانات هذا المستوى حُذفت لهذه الفترة
+        if span / step <= max_points:
+            return level
+    return RESOLUTIONS[-1]
+
+
+def _fetch_points(container_id, level, start, end):
+    if level == "raw":
+        rows = (
+            ContainerMetricSample.objects.filter(container_id=container_id, ts__gte=start, ts__lte=end)
+            .order_by("ts")
+            .values_list("ts", "cpu_percent", "mem_bytes", *COUNTER_FIELDS)
+        )
+        return [
+            {"ts": ts, "cpu": cpu, "cpu_max": cpu, "mem": mem, "mem_max": mem,
+             "net_rx": rx, "net_tx": tx, "blk_read": br, "blk_write": bw}
+            for ts, cpu, mem, rx, tx, br, bw in rows
+        ]
+
+    rows = (
+        ContainerMetricRollup.objects.filter(container_id=container_id, resolution=level, ts__gte=start, ts__lte=end)
+        .order_by("ts")
+        .values_list("ts", "cpu_avg", "cpu_max", "mem_avg", "mem_max", *COUNTER_FIELDS)
+    )
+    return [
+        {"ts": ts, "cpu": cpu, "cpu_max": cpu_max, "mem": mem, "mem_max": mem_max,
+         "net_rx": rx, "net_tx": tx, "blk_read": br, "blk_write": bw}
+        for ts, cpu, cpu_max, mem, mem_max, rx, tx, br, bw in rows
+    ]
+
+
+def downsample(points, max_points):
+    """دمج كل n نقاط متتالية في نقطة واحدة حتى لا يتجاوز العدد max_points"""
+    if max_points <= 0 or len(points) <= max_points:
+        return points
+
+    size = math.ceil(len(points) / max_points)
+    result = []
+    for i in range(0, len(points), size):
+        group = points[i:i + size]
+        last = group[-1]
+        result.append({
+            "ts": group[0]["ts"],
+            "cpu": sum(p["cpu"] for p in group) / len(group),
+            "cpu_max": max(p["cpu_max"] for p in group),
+            "mem": int(sum(p["mem"] for p in group) / len(group)),
+            "mem_max": max(p["mem_max"] for p in group),
+            "net_rx": last["net_rx"],
+            "net_tx": last["net_tx"],
+            "blk_read": last["blk_read"],
+            "blk_write": last["blk_write"],
+        })
+    return result
+
+
+def query_range(container_id, start, end=None, max_points=300):
+    """
+    سلسلة استهلاك حاوية بين start و end بعدد نقاط لا يتجاوز max_points.
+    يختار أدق مستوى ما زال محتفظاً بالفترة المطلوبة.
+    """
+    now = timezone.now()
+    end = end or now
+    level = _choose_level(start, end, max_points, now)
+    points = downsample(_fetch_points(container_id, level, start, end), max_points)
+    return {"resolution": level, "points": points}
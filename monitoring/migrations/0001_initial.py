@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('deployments', '0015_deploymentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentUsageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('collected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('deployment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage_snapshot', to='deployments.deployment')),
+            ],
+        ),
+    ]
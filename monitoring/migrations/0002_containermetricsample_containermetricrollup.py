@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deployments', '0015_deploymentjob'),
+        ('monitoring', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContainerMetricSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ts', models.DateTimeField()),
+                ('cpu_percent', models.FloatField(default=0)),
+                ('mem_bytes', models.BigIntegerField(default=0)),
+                ('net_rx_bytes', models.BigIntegerField(default=0)),
+                ('net_tx_bytes', models.BigIntegerField(default=0)),
+                ('blk_read_bytes', models.BigIntegerField(default=0)),
+                ('blk_write_bytes', models.BigIntegerField(default=0)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_samples', to='deployments.deploymentcontainer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['container', 'ts'], name='monitoring__contain_1a17d7_idx'), models.Index(fields=['ts'], name='monitoring__ts_87669f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContainerMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(60, '1 minute'), (3600, '1 hour'), (86400, '1 day')])),
+                ('ts', models.DateTimeField(help_text='بداية الـ bucket')),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('cpu_avg', models.FloatField(default=0)),
+                ('cpu_max', models.FloatField(default=0)),
+                ('mem_avg', models.BigIntegerField(default=0)),
+                ('mem_max', models.BigIntegerField(default=0)),
+                ('net_rx_bytes', models.BigIntegerField(default=0)),
+                ('net_tx_bytes', models.BigIntegerField(default=0)),
+                ('blk_read_bytes', models.BigIntegerField(default=0)),
+                ('blk_write_bytes', models.BigIntegerField(default=0)),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_rollups', to='deployments.deploymentcontainer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'ts'], name='monitoring__resolut_acb654_idx')],
+                'unique_together': {('container', 'resolution', 'ts')},
+            },
+        ),
+    ]
@@ -1,3 +1,69 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class DeploymentUsageSnapshot(models.Model):
+    """
+    آخر قراءة لاستهلاك موارد Deployment يكتبها الـ collector (run_usage_collector).
+    deployment_usage_api يقرأ هذا الصف فقط بدون أي استدعاء لـ Docker.
+    """
+    deployment = models.OneToOneField("deployments.Deployment", on_delete=models.CASCADE, related_name="usage_snapshot")
+    data = models.JSONField(default=dict, blank=True)
+    collected_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Usage snapshot for {self.deployment_id} at {self.collected_at}"
+
+
+class ContainerMetricSample(models.Model):
+    """عينة خام واحدة لحاوية (تُدمج لاحقاً في ContainerMetricRollup وتُحذف بعد مدة الاحتفاظ)"""
+    container = models.ForeignKey("deployments.DeploymentContainer", on_delete=models.CASCADE, related_name="metric_samples")
+    ts = models.DateTimeField()
+    cpu_percent = models.FloatField(default=0)
+    mem_bytes = models.BigIntegerField(default=0)
+    # عدادات تراكمية كما يرجعها docker stats
+    net_rx_bytes = models.BigIntegerField(default=0)
+    net_tx_bytes = models.BigIntegerField(default=0)
+    blk_read_bytes = models.BigIntegerField(default=0)
+    blk_write_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["container", "ts"]),
+            models.Index(fields=["ts"]),
+        ]
+
+    def __str__(self):
+        return f"{self.container_id} @ {self.ts}"
+
+
+class ContainerMetricRollup(models.Model):
+    """تجميع العينات في buckets بدقة دقيقة / ساعة / يوم"""
+    RESOLUTION_CHOICES = [
+        (60, "1 minute"),
+        (3600, "1 hour"),
+        (86400, "1 day"),
+    ]
+
+    container = models.ForeignKey("deployments.DeploymentContainer", on_delete=models.CASCADE, related_name="metric_rollups")
+    resolution = models.PositiveIntegerField(choices=RESOLUTION_CHOICES)
+    ts = models.DateTimeField(help_text="بداية الـ bucket")
+    samples = models.PositiveIntegerField(default=0)
+    cpu_avg = models.FloatField(default=0)
+    cpu_max = models.FloatField(default=0)
+    mem_avg = models.BigIntegerField(default=0)
+    mem_max = models.BigIntegerField(default=0)
+    # آخر قيمة للعدادات التراكمية داخل الـ bucket
+    net_rx_bytes = models.BigIntegerField(default=0)
+    net_tx_bytes = models.BigIntegerField(default=0)
+    blk_read_bytes = models.BigIntegerField(default=0)
+    blk_write_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("container", "resolution", "ts")
+        indexes = [
+            models.Index(fields=["resolution", "ts"]),
+        ]
+
+    def __str__(self):
+        return f"{self.container_id} [{self.resolution}s] @ {self.ts}"
@@ -0,0 +1,174 @@
+# monitoring/rebalance.py
+"""
+إعادة توزيع ميزانية الخطة بين حاويات Deployment حسب الاستهلاك الفعلي (adaptive limits).
+
+الأوزان الثابتة في deployments.limits (backend 2، frontend 1، الباقي 0.5) تعطي مثلاً
+قاعدة البيانات 0.5 فقط حتى لو كانت تستهلك أغلب الذاكرة. في الوضع التكيفي
+(Deployment.adaptive_limits) نحسب نصيب كل حاوية من استهلاكها في آخر
+ADAPTIVE_LIMITS_WINDOW ثانية، ضمن حد أدنى / أعلى، ونطبقه live بـ reconcile_limits.
+
+compose يبقى على الأوزان الثابتة (مخرجات ثابتة قابلة للـ cache)، والـ collector
+يعيد تطبيق النسب التكيفية دورياً.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from deployments.limits import calculate_target_limits, get_container_weight, reconcile_limits, split_plan
+from deployments.models import Deployment
+from .models import ContainerMetricRollup, ContainerMetricSample
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_LIMITS_INTERVAL = getattr(settings, "ADAPTIVE_LIMITS_INTERVAL", 300)  # ثواني بين كل إعادة توزيع
+ADAPTIVE_LIMITS_WINDOW = getattr(settings, "ADAPTIVE_LIMITS_WINDOW", 3600)  # ثواني من الاستهلاك السابق
+ADAPTIVE_MIN_SHARE = getattr(settings, "ADAPTIVE_MIN_SHARE", 0.1)  # أقل نسبة من الخطة لأي حاوية
+ADAPTIVE_MAX_SHARE = getattr(settings, "ADAPTIVE_MAX_SHARE", 0.8)  # أعلى نسبة من الخطة لأي حاوية
+ADAPTIVE_HEADROOM = getattr(settings, "ADAPTIVE_HEADROOM", 1.25)  # هامش فوق الاستهلاك المرصود
+ADAPTIVE_MIN_SAMPLES = getattr(settings, "ADAPTIVE_MIN_SAMPLES", 10)
+
+
+def get_recent_usage(containers, window=ADAPTIVE_LIMITS_WINDOW, now=None):
+    """
+    {container_id: {"cpu": متوسط CPU%, "mem": أعلى ذاكرة بالبايت, "samples": n}}
+    من rollups الدقيقة، أو العينات الخام إذا لم تُجمع بعد.
+    """
+    since = (now or timezone.now()) - timedelta(seconds=window)
+    ids = [dc.id for dc in containers]
+
+    rows = (
+        ContainerMetricRollup.objects.filter(container_id__in=ids, resolution=60, ts__gte=since)
+        .values("container_id")
+        .annotate(cpu=Avg("cpu_avg"), mem=Max("mem_max"), samples=Sum("samples"))
+        .order_by()
+    )
+    usage = {row["container_id"]: row for row in rows}
+
+    missing = [i for i in ids if i not in usage]
+    if missing:
+        rows = (
+            ContainerMetricSample.objects.filter(container_id__in=missing, ts__gte=since)
+            .values("container_id")
+            .annotate(cpu=Avg("cpu_percent"), mem=Max("mem_bytes"), samples=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            usage[row["container_id"]] = row
+    return usage
+
+
+def clamp_shares(shares, floor=ADAPTIVE_MIN_SHARE, ceiling=ADAPTIVE_MAX_SHARE, minimums=None):
+    """
+    تطبيع النسب إلى مجموع 1 مع floor <= share <= ceiling (water-filling):
+    share = clip(level * demand, floor, ceiling) و level يُحسب بالتنصيف حتى يصبح المجموع 1.
+    minimums: حد أدنى خاص لكل حاوية (مثلاً أعلى ذاكرة مرصودة) يرفع floor و ceiling الخاصين بها.
+    إذا تجاوز مجموع minimums الخطة تُرجع minimums كما هي (المجموع > 1).
+    """
+    count = len(shares)
+    if not count:
+        return {}
+    floor = min(floor, 1 / count)
+    ceiling = max(ceiling, 1 / count)
+    minimums = minimums or {}
+    lows = {name: max(floor, minimums.get(name, 0)) for name in shares}
+    if sum(lows.values()) >= 1:
+        return lows
+    highs = {name: max(ceiling, lows[name]) for name in shares}
+
+    def fill(level):
+        return {name: min(highs[name], max(lows[name], level * value)) for name, value in shares.items()}
+
+    # المجموع يزيد مع level: من sum(lows) < 1 عند 0 حتى highs (أو lows للطلب 0)
+    low, high = 0.0, 1.0
+    while sum(fill(high).values()) < 1 and high < 1e12:
+        high *= 2
+    for _ in range(100):
+        level = (low + high) / 2
+        if sum(fill(level).values()) < 1:
+            low = level
+        else:
+            high = level
+    result = fill(high)
+
+    # تصحيح الفرق المتبقي: الحاويات بطلب 0 لا ترتفع مع level فتأخذ الباقي حتى highs،
+    # وفرق التقريب السالب يُخصم من المساحة فوق lows
+    diff = 1 - sum(result.values())
+    if diff > 0:
+        room = {name: highs[name] - value for name, value in result.items()}
+    else:
+        room = {name: value - lows[name] for name, value in result.items()}
+    total_room = sum(room.values())
+    if total_room > 0:
+        for name, value in room.items():
+            result[name] += diff * value / total_room
+    return result
+
+
+def calculate_adaptive_limits(deployment, plan=None, now=None):
+    """
+    {container_name: {"nano_cpus", "memory"}} حسب الاستهلاك الفعلي.
+    الحاويات بدون عينات كافية تأخذ طلباً يساوي نصيبها بالأوزان الثابتة.
+    """
+    plan = plan or deployment.plan
+    containers = list(deployment.containers.select_related("project_container"))
+    usage = get_recent_usage(containers, now=now)
+
+    weights = {dc.container_name: get_container_weight(dc) for dc in containers}
+    total_weight = sum(weights.values()) or 1
+    plan_cpu_percent = float(plan.cpu) * 100
+    plan_memory = int(plan.ram) * 1024 * 1024
+
+    cpu_demand, mem_demand, mem_peak = {}, {}, {}
+    for dc in containers:
+        static_share = weights[dc.container_name] / total_weight
+        row = usage.get(dc.id)
+        if row and row["mem"]:
+            # لا ننزل حد الذاكرة تحت أعلى استهلاك مرصود (OOM kill فوري)
+            mem_peak[dc.container_name] = int(row["mem"])
+        if not row or (row["samples"] or 0) < ADAPTIVE_MIN_SAMPLES:
+            cpu_demand[dc.container_name] = static_share
+            mem_demand[dc.container_name] = static_share
+            continue
+        cpu_demand[dc.container_name] = (row["cpu"] or 0) * ADAPTIVE_HEADROOM / plan_cpu_percent if plan_cpu_percent else 0
+        mem_demand[dc.container_name] = (row["mem"] or 0) * ADAPTIVE_HEADROOM / plan_memory if plan_memory else 0
+
+    mem_minimums = {name: peak / plan_memory for name, peak in mem_peak.items()} if plan_memory else {}
+    targets = split_plan(plan, clamp_shares(cpu_demand), clamp_shares(mem_demand, minimums=mem_minimums))
+
+    for name, peak in mem_peak.items():
+        # split_plan يقرب إلى MB للأسفل
+        peak_mb = -(-peak // (1024 * 1024))
+        targets[name]["memory"] = max(targets[name]["memory"], peak_mb * 1024 * 1024)
+    total_memory = sum(target["memory"] for target in targets.values())
+    if plan_memory and total_memory > plan_memory:
+        logger.warning(
+            f"Observed memory peaks of deployment {deployment.id} exceed the plan "
+            f"({total_memory // (1024 * 1024)} MB > {plan.ram} MB)"
+        )
+    return targets
+
+
+def rebalance_deployment(deployment, plan=None, now=None):
+    """تطبيق الحدود التكيفية live (أو الثابتة إذا أُلغي الوضع التكيفي)"""
+    if deployment.adaptive_limits:
+        targets = calculate_adaptive_limits(deployment, plan=plan, now=now)
+    else:
+        targets = calculate_target_limits(deployment, plan)
+    return reconcile_limits(deployment, targets)
+
+
+def rebalance_all(now=None):
+    """إعادة توزيع حدود جميع الـ Deployments التي فعّلت الوضع التكيفي"""
+    deployments = Deployment.objects.filter(is_active=True, adaptive_limits=True, subscription__isnull=False)
+    updated = 0
+    for deployment in deployments:
+        try:
+            updated += len(rebalance_deployment(deployment, now=now)["updated"])
+        except Exception as e:
+            logger.exception(f"Adaptive rebalance failed for deployment {deployment.id}: {e}")
+    if updated:
+        logger.info(f"Adaptive limits updated on {updated} containers")
+    return updated
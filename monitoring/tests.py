@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .rebalance import clamp_shares
+
+
+class ClampSharesTests(SimpleTestCase):
+    def assertShares(self, result, expected):
+        self.assertEqual(set(result), set(expected))
+        for name, value in expected.items():
+            self.assertAlmostEqual(result[name], value, places=6)
+
+    def test_empty(self):
+        self.assertEqual(clamp_shares({}), {})
+
+    def test_within_bounds_is_normalized(self):
+        self.assertShares(clamp_shares({"a": 2, "b": 1, "c": 1}), {"a": 0.5, "b": 0.25, "c": 0.25})
+
+    def test_floor_and_ceiling_in_same_pass_sum_to_one(self):
+        result = clamp_shares({"db": 1.125, "fe": 0.0625}, floor=0.1, ceiling=0.8)
+        self.assertShares(result, {"db": 0.8, "fe": 0.2})
+
+    def test_ceiling_redistributes_to_others(self):
+        result = clamp_shares({"a": 0.5, "b": 0.5, "c": 0, "d": 0}, floor=0.1, ceiling=0.45)
+        self.assertAlmostEqual(sum(result.values()), 1)
+        self.assertShares(result, {"a": 0.4, "b": 0.4, "c": 0.1, "d": 0.1})
+
+    def test_zero_demand_takes_remainder(self):
+        result = clamp_shares({"a": 1, "b": 0, "c": 0}, floor=0.1, ceiling=0.5)
+        self.assertShares(result, {"a": 0.5, "b": 0.25, "c": 0.25})
+
+    def test_all_zero_is_equal_split(self):
+        self.assertShares(clamp_shares({"a": 0, "b": 0}), {"a": 0.5, "b": 0.5})
+
+    def test_bounds_relax_for_few_containers(self):
+        # ceiling أقل من 1/count: كل حاوية تأخذ نصيباً متساوياً
+        self.assertShares(clamp_shares({"a": 5, "b": 1}, floor=0.1, ceiling=0.3), {"a": 0.5, "b": 0.5})
+        self.assertShares(clamp_shares({"a": 1}), {"a": 1.0})
+
+    def test_minimums_raise_floor_above_ceiling(self):
+        result = clamp_shares({"db": 1.125, "fe": 0.0625}, floor=0.1, ceiling=0.8, minimums={"db": 0.85})
+        self.assertGreaterEqual(result["db"], 0.85)
+        self.assertAlmostEqual(sum(result.values()), 1)
+
+    def test_minimums_over_plan_are_kept(self):
+        result = clamp_shares({"a": 1, "b": 1}, minimums={"a": 0.7, "b": 0.5})
+        self.assertShares(result, {"a": 0.7, "b": 0.5})
+
+    def test_sum_and_bounds_hold_for_mixed_demands(self):
+        demands = [
+            {"a": 10, "b": 0.01, "c": 0.01},
+            {"a": 0.3, "b": 0, "c": 7, "d": 0.2, "e": 1},
+            {"a": 1e-6, "b": 1e-6, "c": 3},
+        ]
+        for shares in demands:
+            result = clamp_shares(shares, floor=0.1, ceiling=0.6)
+            self.assertAlmostEqual(sum(result.values()), 1)
+            for value in result.values():
+                self.assertGreaterEqual(value, 0.1 - 1e-9)
+                self.assertLessEqual(value, 0.6 + 1e-9)
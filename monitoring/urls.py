@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('containers/<int:container_id>/history/', views.container_usage_history, name='container_usage_history'),
+]
@@ -1,3 +1,30 @@
-from django.shortcuts import render
+from datetime import timedelta
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from deployments.models import DeploymentContainer
+from .metrics import query_range
+
+
+@login_required
+def container_usage_history(request, container_id):
+    """
+    سجل استهلاك حاوية لرسم الـ graphs.
+    ?minutes=60&max_points=300
+    """
+    container = get_object_or_404(DeploymentContainer, id=container_id, deployment__user=request.user)
+
+    try:
+        minutes = max(1, int(request.GET.get("minutes", 60)))
+        max_points = min(2000, max(1, int(request.GET.get("max_points", 300))))
+    except ValueError:
+        return JsonResponse({"error": "Invalid parameters"}, status=400)
+
+    end = timezone.now()
+    data = query_range(container.id, end - timedelta(minutes=minutes), end, max_points=max_points)
+    data["container_name"] = container.container_name
+    data["points"] = [{**p, "ts": p["ts"].isoformat()} for p in data["points"]]
+    return JsonResponse(data)
@@ -2,7 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from .models import Plan, Subscription
 from projects.models import AvailableProject
 from deployments.models import Deployment, DeploymentContainer, DeploymentContainerEnvVar
-from deployments.views import run_docker
+from deployments.jobs import enqueue_job
 from django.contrib.auth.decorators import login_required
 from billing.models import ServicePaymentOrderModel
 from django.contrib import messages
@@ -83,23 +83,11 @@ def ApplySubscription(request, order_id):
                 container.update_default_env_vars()
             logger.info(f"Default env vars updated for deployment {deployment.id}")
 
-            deployment.create_xfs_volume(plan.storage)
-            # تشغيل الـ Docker containers
-            compose_yaml = deployment.render_docker_resolved_compose_template()
-            deployment.compose_template = compose_yaml
-            deployment.save()
-            success = run_docker(deployment)
-            if success:
-                deployment.project.installs += 1
-                deployment.project.save()
-                install_time_minutes = deployment.project.install_time_minutes
-                messages.success(request, _(f"The service has been successfully purchased. Please wait {install_time_minutes} minutes for the installation to complete."))
-                logger.info(f"Docker containers for deployment {deployment.id} started successfully")
-            else:
-                deployment.progress = 5  # Failed
-                deployment.save()
-                messages.error(request, _("Failed to start the app"))
-                logger.error(f"app for deployment {deployment.id} failed to start")
+            # إنشاء الـ volume وتشغيل الحاويات يتم في عمّال طابور النشر
+            enqueue_job("deploy", deployment=deployment)
+
+        install_time_minutes = deployment.project.install_time_minutes
+        messages.success(request, _(f"The service has been successfully purchased. Please wait {install_time_minutes} minutes for the installation to complete."))
 
     except Exception as e:
         logger.exception(f"Error applying subscription for order {order_id}: {e}")
@@ -122,6 +110,9 @@ def ApplyUpgradePlan(request, order_id):
         duration=duration,
     )
 
+    # تكبير التخزين وتحديث حدود الحاويات في الخلفية بدون إعادة تشغيلها
+    enqueue_job("upgrade_plan", deployment=deployment)
+
     # تحديث حالة الطلب
     order.progress = '3'
     order.save()
@@ -4,7 +4,7 @@ from django.http import JsonResponse
 from .models import Action
 from deployments.models import DeploymentContainer
 from projects.models import AvailableProject, ProjectReview
-import docker
+from deployments.docker_client import get_deployment_client
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from .forms import ProjectFilterForm
@@ -120,7 +120,7 @@ def run_action(request, container_id, action_id):
 
         # تشغيل الأمر داخل الحاوية
         try:
-            client = docker.from_env()
+            client = get_deployment_client(container.deployment)
             container = client.containers.get(container.container_name)
 
             exec_log = container.exec_run(command)
@@ -215,5 +215,5 @@ def project_autocomplete(request):
 def get_project_source_code(request, project_id):
     project = get_object_or_404(AvailableProject, id=project_id)
     project.downloads += 1
-    project.save()
+    project.save(update_fields=["downloads"])
     return redirect(project.source_code_url)
\ No newline at end of file
@@ -49,6 +49,7 @@ urlpatterns = [
     path('dashboard/', include('dashboard.urls')),
     path('projects/', include('projects.urls')),
     path('deployments/', include('deployments.urls')),
+    path('monitoring/', include('monitoring.urls')),
     path('plans/', include('plans.urls')),
     path('billing/', include('billing.urls')),
     path('paypal/', include("paypal.standard.ipn.urls")),